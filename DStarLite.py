@@ -0,0 +1,281 @@
+"""
+Incremental path planning with D* Lite (Koenig and Likhachev, 2002).
+"""
+
+import heapq
+
+from pathfinding import ORTHOGONAL_MOVES, DIAGONAL_MOVES
+
+INFINITY = float('inf')
+
+class DStarLite (object):
+    """
+    One mob's plan for walking to a goal tile, repaired as the zone changes
+    around it instead of searched again from scratch.
+
+    The search runs backward from the goal, so what it has found stays valid
+    as the mob walks. The planner remembers the cost of every tile it has
+    looked at, and when some change (walls, via Zone.TERRAIN_CHANGE, or the
+    mobs near the walker) only the part of the search which depended on
+    them is redone before the next step is picked. Those changes are
+    nearly always close to the walker, where a backward search has little
+    to redo.
+
+    Walls can't be walked through. Tiles with another mob in them can, at an
+    extra cost (OCCUPIED_COST), so the plan walks around a crowd when there's
+    a short way around and otherwise queues up behind it. Only mobs within
+    AVOID_RADIUS count; ones further along will have moved on by the time
+    the walker gets there, and only make the plan churn.
+
+    close() the planner when done with it.
+    """
+
+    # Extra cost of stepping into a tile another mob is in. Roughly how many
+    # tiles of detour are worth taking instead of waiting.
+    OCCUPIED_COST = 8.0
+
+    # How far away, in tiles along x or y, other mobs are steered around
+    AVOID_RADIUS = 8
+
+    def __init__(self, mob, goal, diagonal=False):
+        """
+        :param mob: The mob to plan for. Its own tiles never count as occupied.
+        :param goal: The tile to reach
+        :param diagonal: Allow diagonal moves. Corners can't be cut, i.e.
+                         neither tile beside a diagonal move may be a wall.
+        """
+        self.mob = mob
+        self.goal = goal
+        self.diagonal = diagonal
+        self.zone = goal.zone
+
+        # Nodes taken off the open list, over the planner's lifetime
+        self.expansions = 0
+
+        self._goal = goal.coords
+        self._start = self._last = mob.tile.coords
+        self._moves = ORTHOGONAL_MOVES + (DIAGONAL_MOVES if diagonal else ())
+        self._diagonal_cost = 1.5 if diagonal else 2.0
+        # Added to the keys of nodes queued before the mob last moved, so
+        # that they needn't be re-keyed (the "k_m" of the paper)
+        self._km = 0.0
+
+        # Costs from each node to the goal: g as of the node's last
+        # expansion, and rhs as its neighbours currently suggest. Missing
+        # entries are infinite.
+        self._g = {}
+        self._rhs = {self._goal: 0.0}
+        # Nodes whose g and rhs differ, with their keys, and a heap of
+        # (key, node) entries. Heap entries whose key no longer matches are
+        # stale and skipped.
+        self._open = {}
+        self._open_list = []
+        self._queue(self._goal)
+
+        # Costs of stepping into each tile the search has looked at, and
+        # which of them have changed
+        self._costs = {}
+        self._changed = set()
+        # Tiles of the mobs being steered around
+        self._crowded = set()
+
+        self._terrain_handle = self.zone.observe(self.zone.TERRAIN_CHANGE, self._on_terrain_change)
+
+    def close(self):
+        """Stops watching the zone"""
+        self._terrain_handle.cancel()
+
+    def next_step(self):
+        """Brings the plan up to date and picks the mob's next step
+        :return: x/y coordinates of the tile to step into, which may be
+                 occupied, or None if the mob is at the goal or can't get there
+        """
+        here = self.mob.tile.coords
+        if here == self._goal:
+            return None
+
+        if here != self._last:
+            self._start = here
+            self._km += self._heuristic(self._last, here)
+            self._last = here
+        self._look_around()
+        if self._changed:
+            self._apply_changes()
+        self._compute()
+
+        best = None
+        best_cost = INFINITY
+        g = self._g
+        for (neighbour, move_cost) in self._edges(here):
+            cost = move_cost + self._cost(neighbour) + g.get(neighbour, INFINITY)
+            if cost < best_cost:
+                (best, best_cost) = (neighbour, cost)
+        return best
+
+    def _heuristic(self, a, b):
+        """util.distance(), as in pathfinding.astar()"""
+        dx = abs(a[0] - b[0])
+        dy = abs(a[1] - b[1])
+        return (dx if dx < dy else dy) * (self._diagonal_cost - 1.0) + (dx if dx > dy else dy)
+
+    def _key(self, node):
+        cost = min(self._g.get(node, INFINITY), self._rhs.get(node, INFINITY))
+        return cost + self._heuristic(self._start, node) + self._km, cost
+
+    def _queue(self, node):
+        """Puts a node on the open list if it's inconsistent, and takes it
+        off otherwise (the "UpdateVertex" of the paper)"""
+        if self._g.get(node, INFINITY) != self._rhs.get(node, INFINITY):
+            key = self._key(node)
+            self._open[node] = key
+            heapq.heappush(self._open_list, key + (node,))
+        else:
+            self._open.pop(node, None)
+
+    def _compute(self):
+        """Expands nodes until the mob's tile is consistent (the
+        "ComputeShortestPath" of the paper)"""
+        g = self._g
+        rhs = self._rhs
+        open_keys = self._open
+        open_list = self._open_list
+        start = self._start
+        goal = self._goal
+        costs = self._costs
+        cost = self._cost
+        moves = self._moves
+        heuristic = self._heuristic
+        km = self._km
+
+        while open_list:
+            (k1, k2, node) = open_list[0]
+            if open_keys.get(node) != (k1, k2):
+                heapq.heappop(open_list)
+                continue
+            g_start = g.get(start, INFINITY)
+            rhs_start = rhs.get(start, INFINITY)
+            start_cost = min(g_start, rhs_start)
+            if (k1, k2) >= (start_cost + km, start_cost) and rhs_start <= g_start:
+                break
+
+            heapq.heappop(open_list)
+            key = self._key(node)
+            if (k1, k2) < key:
+                open_keys[node] = key
+                heapq.heappush(open_list, key + (node,))
+                continue
+            del open_keys[node]
+            self.expansions += 1
+
+            node_cost = cost(node)
+            node_rhs = rhs.get(node, INFINITY)
+            if g.get(node, INFINITY) > node_rhs:
+                # Got cheaper: offer the new cost to the neighbours. This is
+                # most of the work of a first plan, so _edges() and
+                # _queue() are inlined.
+                g[node] = node_rhs
+                (x, y) = node
+                for (dx, dy, move_cost) in moves:
+                    neighbour = (x + dx, y + dy)
+                    neighbour_cost = costs.get(neighbour)
+                    if neighbour_cost is None:
+                        neighbour_cost = cost(neighbour)
+                    if neighbour_cost == INFINITY or neighbour == goal:
+                        continue
+                    if dx and dy and (cost((x + dx, y)) == INFINITY or cost((x, y + dy)) == INFINITY):
+                        continue
+                    offer = move_cost + node_cost + node_rhs
+                    if offer < rhs.get(neighbour, INFINITY):
+                        rhs[neighbour] = offer
+                        if g.get(neighbour, INFINITY) != offer:
+                            key = (min(g.get(neighbour, INFINITY), offer) + heuristic(start, neighbour) + km,
+                                   min(g.get(neighbour, INFINITY), offer))
+                            open_keys[neighbour] = key
+                            heapq.heappush(open_list, key + (neighbour,))
+                        else:
+                            open_keys.pop(neighbour, None)
+            else:
+                # Got dearer: neighbours which went through it need to look again
+                old_g = g.pop(node)
+                for (neighbour, move_cost) in self._edges(node):
+                    if neighbour != goal and rhs.get(neighbour, INFINITY) == move_cost + node_cost + old_g:
+                        rhs[neighbour] = self._best_rhs(neighbour)
+                        self._queue(neighbour)
+                if node != goal:
+                    rhs[node] = self._best_rhs(node)
+                self._queue(node)
+
+    def _best_rhs(self, node):
+        """Cost to the goal through the node's cheapest neighbour"""
+        if self._cost(node) == INFINITY:
+            return INFINITY
+        g = self._g
+        best = INFINITY
+        for (neighbour, move_cost) in self._edges(node):
+            cost = move_cost + self._cost(neighbour) + g.get(neighbour, INFINITY)
+            if cost < best:
+                best = cost
+        return best
+
+    def _edges(self, node):
+        """Yields (neighbour, cost of the move) for each move to or from a
+        node which doesn't cut the corner of a wall"""
+        (x, y) = node
+        cost = self._cost
+        for (dx, dy, move_cost) in self._moves:
+            if dx and dy and (cost((x + dx, y)) == INFINITY or cost((x, y + dy)) == INFINITY):
+                continue
+            yield (x + dx, y + dy), move_cost
+
+    def _cost(self, coords):
+        """Extra cost of stepping into a tile: 0, OCCUPIED_COST, or infinite
+        for walls and tiles outside the zone"""
+        cost = self._costs.get(coords)
+        if cost is None:
+            cost = self._costs[coords] = self._tile_cost(coords)
+        return cost
+
+    def _tile_cost(self, coords):
+        (width, height) = self.zone.dimensions
+        if not (0 <= coords[0] < width and 0 <= coords[1] < height):
+            return INFINITY
+        if not self.zone.tiles[coords].walkable:
+            return INFINITY
+        return DStarLite.OCCUPIED_COST if coords in self._crowded else 0.0
+
+    def _look_around(self):
+        """Finds the mobs near the walker, and notes the tiles of any which
+        have come, gone or moved as changed"""
+        (x, y) = self._start
+        radius = DStarLite.AVOID_RADIUS
+        crowded = {
+            mob.tile.coords
+            for mob in self.zone.mob_index.in_rect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1)
+            if mob is not self.mob and mob.tile is not None
+        }
+        if crowded != self._crowded:
+            costs = self._costs
+            self._changed.update(coords for coords in crowded ^ self._crowded if coords in costs)
+            self._crowded = crowded
+
+    def _apply_changes(self):
+        """Updates the costs of changed tiles, and the rhs of every node
+        with a move into, out of or around them"""
+        (changed, self._changed) = (self._changed, set())
+        affected = set()
+        for (x, y) in changed:
+            cost = self._tile_cost((x, y))
+            if cost != self._costs[(x, y)]:
+                self._costs[(x, y)] = cost
+                affected.add((x, y))
+                affected.update((x + dx, y + dy) for (dx, dy, _) in self._moves)
+
+        rhs = self._rhs
+        for node in affected:
+            if node != self._goal:
+                rhs[node] = self._best_rhs(node)
+            self._queue(node)
+
+    def _on_terrain_change(self, tile):
+        if tile.coords in self._costs:
+            self._changed.add(tile.coords)
@@ -0,0 +1,102 @@
+from __future__ import print_function
+
+import collections
+import sys
+
+class EventProfiler (object):
+    """
+    Collects statistics about Observable event broadcasts: how often each
+    event type fires, how long its observers take, how deeply events cascade
+    into other events, and which observers are the most expensive.
+
+    Install one with Observable.set_event_profiler(). Times are inclusive, so
+    an observer's time includes any events it fires in turn.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget everything collected so far"""
+        # By event type
+        self.event_counts = collections.Counter()
+        self.event_times = collections.Counter()
+        self.event_max_depths = collections.Counter()
+
+        # By (source class, event type, callback owner class, callback function)
+        self.callback_counts = collections.Counter()
+        self.callback_times = collections.Counter()
+
+        # Number of broadcasts made at each cascade depth, where 1 means
+        # nothing else was being broadcast at the time
+        self.depth_counts = collections.Counter()
+        self._depth = 0
+
+    def begin_event(self, event_type):
+        """Called when a broadcast starts"""
+        self._depth += 1
+        self.depth_counts[self._depth] += 1
+        if self._depth > self.event_max_depths[event_type]:
+            self.event_max_depths[event_type] = self._depth
+
+    def end_event(self, event_type, seconds):
+        """Called when a broadcast has finished
+        :param seconds: Time spent calling the observers
+        """
+        self._depth -= 1
+        self.event_counts[event_type] += 1
+        self.event_times[event_type] += seconds
+
+    def record_callback(self, source_class, event_type, callback, seconds):
+        """Called after each observer callback returns"""
+        key = (source_class, event_type, getattr(callback, 'im_class', None), getattr(callback, 'im_func', callback))
+        self.callback_counts[key] += 1
+        self.callback_times[key] += seconds
+
+    @property
+    def max_depth(self):
+        return max(self.depth_counts) if self.depth_counts else 0
+
+    def hottest(self, n=10):
+        """The most expensive observers
+        :return: Up to n (source class, event type, callback name, calls, seconds)
+                 tuples, most total time first
+        """
+        return [
+            (source_class, event_type, _callback_name(owner_class, function),
+             self.callback_counts[key], seconds)
+            for key, seconds in self.callback_times.most_common(n)
+            for (source_class, event_type, owner_class, function) in [key]
+        ]
+
+    def dump(self, out=None, n=20):
+        """Print a report of everything collected so far
+        :param out: File to write to. Defaults to stdout.
+        :param n: Number of hottest observers to list
+        """
+        out = out if out is not None else sys.stdout
+
+        print('Events by total time', file=out)
+        print('{:>10} {:>10} {:>10} {:>6}  {}'.format('count', 'total ms', 'mean us', 'depth', 'event type'), file=out)
+        for event_type, seconds in self.event_times.most_common():
+            count = self.event_counts[event_type]
+            print('{:>10} {:>10.1f} {:>10.1f} {:>6}  {}'.format(
+                count, seconds * 1e3, seconds / count * 1e6, self.event_max_depths[event_type], event_type,
+            ), file=out)
+
+        print('', file=out)
+        print('Cascade depth histogram', file=out)
+        for depth in sorted(self.depth_counts):
+            print('{:>10} {:>10}'.format(depth, self.depth_counts[depth]), file=out)
+
+        print('', file=out)
+        print('Hottest observers', file=out)
+        print('{:>10} {:>10}  {}'.format('calls', 'total ms', 'source / event type / callback'), file=out)
+        for source_class, event_type, callback_name, calls, seconds in self.hottest(n):
+            print('{:>10} {:>10.1f}  {} / {} / {}'.format(
+                calls, seconds * 1e3, source_class.__name__, event_type, callback_name,
+            ), file=out)
+
+def _callback_name(owner_class, function):
+    name = getattr(function, '__name__', repr(function))
+    return name if owner_class is None else '{}.{}'.format(owner_class.__name__, name)
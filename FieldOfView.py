@@ -0,0 +1,249 @@
+"""
+Line of sight and fields of view over a zone's opaque tiles, computed with
+NumPy for many observers at once.
+"""
+
+import collections
+
+import numpy
+
+def _rounded(numerator, denominator):
+    """The integers nearest numerator / denominator, as (low, high) arrays.
+    They're equal unless it's exactly halfway between two."""
+    return -((denominator - 2 * numerator) // (2 * denominator)), (2 * numerator + denominator) // (2 * denominator)
+
+def _line_steps(dx, dy, length):
+    """Offsets of the tiles a line passes between its ends, for lines from
+    (0, 0) to each (dx, dy). The line passes through one tile per column (or
+    row, if it's steeper), or between two where it's exactly halfway.
+    :param dx: x offsets of the lines' far ends
+    :param dy: y offsets of the lines' far ends
+    :param length: Most steps to list; longer lines are cut short
+    :return: (x_low, y_low, x_high, y_high, valid) arrays, one row per line
+             and one column per step. Past each line's far end valid is False.
+    """
+    n = numpy.maximum(numpy.abs(dx), numpy.abs(dy))[:, None]
+    k = numpy.arange(1, length + 1)[None, :]
+    valid = k < n
+    # Lines of zero length would divide by zero, and have no steps anyway
+    n = numpy.maximum(n, 1)
+    (x_low, x_high) = _rounded(dx[:, None] * k, n)
+    (y_low, y_high) = _rounded(dy[:, None] * k, n)
+    return x_low, y_low, x_high, y_high, valid
+
+class View (object):
+    """
+    The tiles visible from a point, as a boolean mask over the square around
+    it. Tiles outside the zone are never visible.
+    """
+    def __init__(self, origin, radius, x, y, mask):
+        """
+        :param origin: x/y coordinates of the observer
+        :param radius: How far the observer can see
+        :param x: x coordinate of the mask's left column
+        :param y: y coordinate of the mask's top row
+        :param mask: Boolean array, indexed [y, x], of the visible tiles
+        """
+        self.origin = origin
+        self.radius = radius
+        self.x = x
+        self.y = y
+        self.mask = mask
+
+    def __contains__(self, coords):
+        (x, y) = (coords[0] - self.x, coords[1] - self.y)
+        (height, width) = self.mask.shape
+        return 0 <= x < width and 0 <= y < height and bool(self.mask[y, x])
+
+    def __len__(self):
+        return int(numpy.count_nonzero(self.mask))
+
+    def coords_array(self):
+        """Coordinates of the visible tiles, as an N x 2 NumPy array of x/y pairs"""
+        (ys, xs) = numpy.nonzero(self.mask)
+        return numpy.column_stack((xs + self.x, ys + self.y))
+
+class FieldOfView (object):
+    """
+    What can be seen from where in a zone.
+
+    A tile can be seen from another if the straight line between their
+    centres doesn't pass through any opaque (non-transparent) tile. Where
+    the line runs exactly between two tiles, it's only blocked if both are
+    opaque, so sight is the same both ways. Opaque tiles themselves can be
+    seen; it's what's behind them that's hidden. Mobs don't block sight.
+
+    Views are cached by observer position and radius, so mobs standing
+    still cost nothing. A cached view is only dropped when a tile within its
+    radius changes opacity, or when it's the least recently used of more
+    than `max_views`.
+
+    Get the zone's one from Zone.field_of_view.
+    """
+
+    # Views to keep per zone
+    MAX_VIEWS = 4096
+
+    # Most observers to work on at once, to bound the size of the arrays
+    BATCH_SIZE = 64
+
+    def __init__(self, zone, max_views=MAX_VIEWS):
+        self.zone = zone
+        self._max_views = max_views
+        # Opacity of every tile, indexed [y, x], loaded when first needed
+        self._opaque = None
+        self._views = collections.OrderedDict()
+        # Offsets and line steps of the tiles within each radius
+        self._rays = {}
+        zone.observe(zone.TERRAIN_CHANGE, self._on_terrain_change)
+
+    def __len__(self):
+        """Number of cached views"""
+        return len(self._views)
+
+    def view(self, observer, radius):
+        """What an observer can see
+        :param observer: A mob, tile or x/y coordinates to look from
+        :param radius: How far the observer can see, in tiles
+        :return: A View
+        """
+        return self.views([observer], radius)[0]
+
+    def views(self, observers, radius):
+        """What each of several observers can see. Views which aren't cached
+        are worked out together, which is much quicker than one at a time.
+        :param observers: Mobs, tiles or x/y coordinates to look from
+        :param radius: How far the observers can see, in tiles
+        :return: A View for each observer
+        """
+        keys = [(FieldOfView._coords(observer), radius) for observer in observers]
+        missing = []
+        for key in keys:
+            if key in self._views:
+                self._views[key] = self._views.pop(key)
+            elif key not in missing:
+                missing.append(key)
+
+        for i in range(0, len(missing), FieldOfView.BATCH_SIZE):
+            batch = [origin for (origin, _) in missing[i:i + FieldOfView.BATCH_SIZE]]
+            for (origin, view) in zip(batch, self._compute(batch, radius)):
+                self._views[(origin, radius)] = view
+
+        result = [self._views[key] for key in keys]
+        while len(self._views) > self._max_views:
+            self._views.popitem(last=False)
+        return result
+
+    def can_see(self, observer, target, radius=None):
+        """Whether there's a line of sight from one tile to another
+        :param observer: A mob, tile or x/y coordinates to look from
+        :param target: A mob, tile or x/y coordinates to look at
+        :param radius: Optional distance beyond which nothing can be seen
+        """
+        return bool(self.lines_of_sight([observer], [target], radius)[0])
+
+    def lines_of_sight(self, observers, targets, radius=None):
+        """Checks lines of sight between pairs of tiles all at once, e.g. from
+        every guard to the PC
+        :param observers: Mobs, tiles or x/y coordinates to look from
+        :param targets: Mobs, tiles or x/y coordinates to look at, one per
+                        observer
+        :param radius: Optional distance beyond which nothing can be seen
+        :return: Boolean NumPy array, True where the observer can see the
+                 target
+        """
+        origins = numpy.array([FieldOfView._coords(observer) for observer in observers], dtype=int).reshape(-1, 2)
+        ends = numpy.array([FieldOfView._coords(target) for target in targets], dtype=int).reshape(-1, 2)
+        offsets = ends - origins
+        if radius is None:
+            visible = numpy.ones(len(origins), dtype=bool)
+        else:
+            visible = (offsets * offsets).sum(axis=1) <= radius * radius
+
+        # Only lines which are in range and longer than a step can be blocked
+        lengths = numpy.abs(offsets).max(axis=1) if len(origins) else numpy.zeros(0, dtype=int)
+        checked = numpy.flatnonzero(visible & (lengths > 1))
+        if not len(checked):
+            return visible
+        opaque = self._opacity()
+        (x0, y0) = (origins[checked, 0:1], origins[checked, 1:2])
+        (x_low, y_low, x_high, y_high, valid) = _line_steps(
+            offsets[checked, 0], offsets[checked, 1], int(lengths[checked].max()) - 1)
+        # Steps past the ends of the lines are clamped onto the origins
+        blocked = opaque[numpy.where(valid, y0 + y_low, y0), numpy.where(valid, x0 + x_low, x0)] \
+            & opaque[numpy.where(valid, y0 + y_high, y0), numpy.where(valid, x0 + x_high, x0)] \
+            & valid
+        visible[checked] = ~blocked.any(axis=1)
+        return visible
+
+    def clear(self):
+        """Drops every cached view"""
+        self._views.clear()
+
+    @staticmethod
+    def _coords(observer):
+        tile = getattr(observer, 'tile', observer)
+        return tuple(getattr(tile, 'coords', tile))
+
+    def _opacity(self):
+        if self._opaque is None:
+            self._opaque = ~self.zone.tile_storage.transparent_mask()
+        return self._opaque
+
+    def _ray_table(self, radius):
+        """Offsets of the tiles within a radius, and the flat indices into
+        the surrounding square of the tiles each one's line from the centre
+        passes between. Steps past the end of a line index a sentinel just
+        past the square, which is never opaque."""
+        if radius not in self._rays:
+            side = 2 * radius + 1
+            (dy, dx) = numpy.mgrid[-radius:radius + 1, -radius:radius + 1]
+            within = dx * dx + dy * dy <= radius * radius
+            (dx, dy) = (dx[within], dy[within])
+            (x_low, y_low, x_high, y_high, valid) = _line_steps(dx, dy, max(radius - 1, 0))
+            sentinel = side * side
+            low = numpy.where(valid, (y_low + radius) * side + x_low + radius, sentinel)
+            high = numpy.where(valid, (y_high + radius) * side + x_high + radius, sentinel)
+            self._rays[radius] = (dx, dy, low, high)
+        return self._rays[radius]
+
+    def _compute(self, origins, radius):
+        opaque = self._opacity()
+        (height, width) = opaque.shape
+        (dx, dy, low, high) = self._ray_table(radius)
+        side = 2 * radius + 1
+
+        # The square around each observer, with everything outside the zone
+        # opaque, plus the sentinel
+        squares = numpy.ones((len(origins), side * side + 1), dtype=bool)
+        squares[:, -1] = False
+        for (i, (x, y)) in enumerate(origins):
+            (x0, y0, x1, y1) = (max(x - radius, 0), max(y - radius, 0),
+                                min(x + radius + 1, width), min(y + radius + 1, height))
+            square = squares[i, :-1].reshape(side, side)
+            square[y0 - y + radius:y1 - y + radius, x0 - x + radius:x1 - x + radius] = opaque[y0:y1, x0:x1]
+
+        visible = ~(squares[:, low] & squares[:, high]).any(axis=2)
+
+        views = []
+        for (i, (x, y)) in enumerate(origins):
+            mask = numpy.zeros((side, side), dtype=bool)
+            mask[dy + radius, dx + radius] = visible[i]
+            (x0, y0, x1, y1) = (max(x - radius, 0), max(y - radius, 0),
+                                min(x + radius + 1, width), min(y + radius + 1, height))
+            views.append(View((x, y), radius, x0, y0,
+                              mask[y0 - y + radius:y1 - y + radius, x0 - x + radius:x1 - x + radius]))
+        return views
+
+    def _on_terrain_change(self, tile):
+        if self._opaque is None:
+            return
+        (x, y) = tile.coords
+        opaque = not tile.transparent
+        if self._opaque[y, x] == opaque:
+            # Only its walkability changed
+            return
+        self._opaque[y, x] = opaque
+        for key in [key for key in self._views
+                    if max(abs(key[0][0] - x), abs(key[0][1] - y)) <= key[1]]:
+            del self._views[key]
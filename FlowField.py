@@ -0,0 +1,444 @@
+"""
+Flow fields (a.k.a. Dijkstra maps): the distance from every tile of a zone
+to one goal tile, and the best step toward it, computed once and shared by
+any number of mobs heading for the same place.
+"""
+
+import collections
+import heapq
+
+import numpy
+
+from pathfinding import ORTHOGONAL_MOVES, DIAGONAL_MOVES
+
+# Stand-in for "can't get there" while relaxing. It has to be finite for the
+# segment trick in _sweep(), so it's scaled to the grid.
+def _unreached(shape):
+    return 2.0 * (1.5 * shape[0] * shape[1] + shape[0] + shape[1]) + 1.0
+
+def _line_indices(height, width, axis):
+    """Flat indices of the cells along each line of a grid, in order. Lines
+    are rows for axis 'x', columns for 'y', and the two diagonals for 'xy'
+    (down-right) and '-xy' (down-left). Short lines are padded with
+    height * width, which is a sentinel cell.
+    :return: The indices, one line per row, and the line each cell is on
+    """
+    (ys, xs) = numpy.mgrid[0:height, 0:width]
+    if axis == 'x':
+        return numpy.arange(height * width).reshape(height, width), ys.ravel()
+    elif axis == 'y':
+        return numpy.arange(height * width).reshape(height, width).T.copy(), xs.ravel()
+    elif axis == 'xy':
+        lines = xs - ys + height - 1
+        starts = numpy.maximum(0, height - 1 - lines)
+    else:
+        lines = xs + ys
+        starts = numpy.maximum(0, lines - (width - 1))
+    indices = numpy.full((height + width - 1, min(height, width)), height * width, dtype=numpy.intp)
+    indices[lines, ys - starts] = ys * width + xs
+    return indices, lines.ravel()
+
+class _Axis (object):
+    """One direction of relaxation sweeps over a grid: its lines of cells,
+    where moves along them are blocked, and which lines need sweeping"""
+    __slots__ = ('lines', 'line_of', 'dirty', 'forward_offsets', 'backward_offsets', 'steps')
+
+    def __init__(self, lines, line_of, open_cells, corners, cost, big):
+        """
+        :param lines: Cells of each line; see _line_indices()
+        :param line_of: Line each cell is on
+        :param open_cells: Flat boolean array of open cells, plus the sentinel
+        :param corners: Flat index offsets of the two cells beside a move
+                        along the line, which must be open too, or None
+        :param cost: Cost of one move along the line
+        :param big: Offset between segments; see _sweep()
+        """
+        self.lines = lines
+        self.line_of = line_of
+        self.dirty = numpy.zeros(len(lines), dtype=bool)
+
+        # A move between neighbouring cells of a line breaks it into segments
+        # if either end (or either corner) is blocked
+        (before, after) = (lines[:, :-1], lines[:, 1:])
+        passable = open_cells[before] & open_cells[after]
+        if corners is not None:
+            size = len(open_cells) - 1
+            for offset in corners:
+                passable &= open_cells[numpy.where(after < size, before + offset, size)]
+        breaks = numpy.ones(lines.shape, dtype=numpy.int32)
+        breaks[:, 1:] = ~passable
+        self.forward_offsets = numpy.cumsum(breaks, axis=1) * big
+        breaks[:, 1:] = breaks[:, :0:-1].copy()
+        self.backward_offsets = numpy.cumsum(breaks, axis=1) * big
+        self.steps = cost * numpy.arange(lines.shape[1])
+
+def _sweep(distances, axis):
+    """Relaxes the dirty lines of one axis in both directions, in place, for
+    each of a batch of fields. Within a segment, the distance at i is
+    min(d[k] + cost * |i - k|), which is a running minimum of d[k] - cost * k.
+    Each segment is offset by a big number so that the running minimum
+    can't carry across into the next one.
+    :param distances: Flat distances of each field, one field per row
+    :return: Flat indices of the cells whose distances got shorter in any field
+    """
+    active = axis.dirty.nonzero()[0]
+    axis.dirty[:] = False
+    lines = axis.lines[active]
+    values = distances[:, lines]
+
+    offsets = axis.forward_offsets[active]
+    shifted = values - axis.steps - offsets
+    numpy.minimum.accumulate(shifted, axis=2, out=shifted)
+    relaxed = shifted + offsets + axis.steps
+
+    offsets = axis.backward_offsets[active]
+    shifted = relaxed[:, :, ::-1] - axis.steps - offsets
+    numpy.minimum.accumulate(shifted, axis=2, out=shifted)
+    relaxed = (shifted + offsets + axis.steps)[:, :, ::-1]
+
+    changed = (relaxed < values).any(axis=0)
+    sentinel = distances[:, -1].copy()
+    distances[:, lines] = relaxed
+    distances[:, -1] = sentinel
+    return lines[changed]
+
+def distance_field(blocked, goal, diagonal=False):
+    """Distance from every cell of a grid to a goal cell, along the cheapest
+    path, with the same moves and costs as pathfinding.astar()
+
+    It's found by sweeping rows, columns (and diagonals) back and forth, with
+    vectorized running minimums, until nothing changes. Only lines crossing
+    cells which got closer in the last sweep of another direction are swept
+    again. Each round settles paths with one more turn in them, so open
+    ground takes a couple of rounds and a twisty maze takes many.
+
+    :param blocked: Boolean NumPy array, indexed [y, x], of impassable cells.
+                    The goal is never considered blocked.
+    :param goal: x/y coordinates of the goal
+    :param diagonal: Allow diagonal moves, without cutting corners
+    :return: Float NumPy array, indexed [y, x], with numpy.inf where the goal
+             can't be reached
+    """
+    return distance_fields(blocked, [goal], diagonal)[0]
+
+def distance_fields(blocked, goals, diagonal=False):
+    """distance_field() for each of several goals on the same grid, computed
+    together, which is much quicker for small grids
+    :param goals: List of x/y coordinates. None of them are considered
+                  blocked, for any of the fields.
+    :return: Float NumPy array, indexed [goal, y, x]
+    """
+    (height, width) = blocked.shape
+    unreached = _unreached(blocked.shape)
+    big = 2.0 * unreached
+    distances = numpy.full((len(goals), height * width + 1), unreached)
+    open_cells = numpy.append(~blocked.ravel(), False)
+    goal_cells = []
+    for (index, (x, y)) in enumerate(goals):
+        if 0 <= x < width and 0 <= y < height:
+            goal_cells.append(y * width + x)
+            distances[index, y * width + x] = 0.0
+            open_cells[y * width + x] = True
+
+    directions = [('x', None, 1.0), ('y', None, 1.0)]
+    if diagonal:
+        diagonal_cost = DIAGONAL_MOVES[0][2]
+        directions += [('xy', (1, width), diagonal_cost), ('-xy', (-1, width), diagonal_cost)]
+    axes = []
+    for (direction, corners, cost) in directions:
+        (lines, line_of) = _line_indices(height, width, direction)
+        axes.append(_Axis(lines, line_of, open_cells, corners, cost, big))
+
+    for axis in axes:
+        axis.dirty[axis.line_of[goal_cells]] = True
+    while any(axis.dirty.any() for axis in axes):
+        for axis in axes:
+            if axis.dirty.any():
+                changed = _sweep(distances, axis)
+                for other in axes:
+                    if other is not axis:
+                        other.dirty[other.line_of[changed]] = True
+
+    distances = distances[:, :-1].reshape(len(goals), height, width)
+    distances[distances >= unreached] = numpy.inf
+    return distances
+
+class FlowField (object):
+    """
+    The distance from every tile of a zone to a goal tile, and the next step
+    toward it, so any number of mobs can look up where to go in O(1).
+
+    Terrain and tiles held by mobs are obstacles, except for mobs which are
+    following this field themselves (see FlowFieldDirective), since they
+    move with the flow. The field watches the zone's occupancy stream:
+    freed tiles are repaired right away, with a small search outward from
+    the tile, and so are newly occupied tiles which no route depends on.
+    Anything else marks the field stale, and it's recomputed the next time
+    it's asked for a step.
+
+    Fields are usually got from Zone.flow_fields, which caches them.
+    """
+
+    def __init__(self, zone, goal, diagonal=False):
+        """
+        :param zone: The zone
+        :param goal: x/y coordinates of the goal tile
+        :param diagonal: Allow diagonal steps
+        """
+        self.zone = zone
+        self.goal = tuple(goal)
+        self.diagonal = diagonal
+        self.moves = ORTHOGONAL_MOVES + (DIAGONAL_MOVES if diagonal else ())
+
+        # Statistics
+        self.builds = 0
+        self.repairs = 0
+
+        self._stale = True
+        # Tiles visited by repairs since the field was last built. Once
+        # that's more than the whole zone, rebuilding is cheaper.
+        self._repair_work = 0
+        self._blocked = None
+        self._distances = None
+        # Index into self.moves of the best step from each tile, or -1
+        self._steps = None
+        self._subscription = zone.occupancy.subscribe(self._on_occupancy_change)
+
+    @property
+    def key(self):
+        """Key the zone caches the field by"""
+        return self.goal, self.diagonal
+
+    def close(self):
+        """Stops watching the zone"""
+        self._subscription.cancel()
+
+    def invalidate(self):
+        """Rebuilds the field the next time it's used, e.g. after walls change"""
+        self._stale = True
+
+    def is_follower(self, mob):
+        """Whether a mob is walking along this field"""
+        return getattr(mob.walk_directive, 'flow_key', None) == self.key
+
+    def follow(self, mob):
+        """Stops counting a mob's tiles as obstacles, for when it has
+        started following the field"""
+        if not self._stale and mob.tile is not None and mob.tile.zone is self.zone:
+            self._unblock(mob.tile.coords)
+
+    def distance(self, coords):
+        """Distance from a tile to the goal, or inf if it can't be reached"""
+        self._refresh()
+        return self._distances[coords[1], coords[0]]
+
+    def next_step(self, coords):
+        """Coordinates of the best tile to step to from a tile, or None if
+        the tile is the goal or the goal can't be reached from it"""
+        self._refresh()
+        (x, y) = coords
+        step = self._steps[y, x]
+        if step >= 0:
+            (dx, dy, _) = self.moves[step]
+            return x + dx, y + dy
+        elif self._blocked[y, x]:
+            # Whoever is standing here was in the way when the field was
+            # built; go by the neighbours instead
+            steps = self.steps(coords)
+            return steps[0] if steps else None
+        else:
+            return None
+
+    def steps(self, coords):
+        """Coordinates of every tile next to a tile which is closer to the
+        goal, best first"""
+        self._refresh()
+        (x, y) = coords
+        here = self._distances[y, x]
+        candidates = []
+        for (dx, dy, cost) in self.moves:
+            if self._passable(x, y, dx, dy):
+                there = self._distances[y + dy, x + dx]
+                if there < here and there != numpy.inf:
+                    candidates.append((there + cost, (x + dx, y + dy)))
+        return [step for (_, step) in sorted(candidates)]
+
+    def _refresh(self):
+        if not self._stale:
+            return
+
+        (width, height) = self.zone.dimensions
+        self._blocked = ~self.zone.tile_storage.walkable_mask()
+        for (mob, tiles) in self.zone.occupied_tiles():
+            if not self.is_follower(mob):
+                for tile in tiles:
+                    self._blocked[tile.coords[1], tile.coords[0]] = True
+        if 0 <= self.goal[0] < width and 0 <= self.goal[1] < height:
+            self._blocked[self.goal[1], self.goal[0]] = False
+
+        self._distances = distance_field(self._blocked, self.goal, self.diagonal)
+        self._steps = self._best_steps()
+        self._stale = False
+        self._repair_work = 0
+        self.builds += 1
+
+    def _best_steps(self):
+        """Index into self.moves of the cheapest step from each tile"""
+        (height, width) = self._distances.shape
+        distances = numpy.full((height + 2, width + 2), numpy.inf)
+        distances[1:-1, 1:-1] = self._distances
+        open_cells = numpy.zeros((height + 2, width + 2), dtype=bool)
+        open_cells[1:-1, 1:-1] = ~self._blocked
+
+        best = numpy.full((height, width), numpy.inf)
+        steps = numpy.full((height, width), -1, dtype=numpy.int8)
+        for (index, (dx, dy, cost)) in enumerate(self.moves):
+            candidate = distances[1 + dy:height + 1 + dy, 1 + dx:width + 1 + dx] + cost
+            if dx and dy:
+                corners = open_cells[1:-1, 1 + dx:width + 1 + dx] & open_cells[1 + dy:height + 1 + dy, 1:-1]
+                candidate[~corners] = numpy.inf
+            better = candidate < best
+            best[better] = candidate[better]
+            steps[better] = index
+
+        steps[self._blocked | (self._distances == numpy.inf)] = -1
+        steps[self.goal[1], self.goal[0]] = -1
+        return steps
+
+    def _passable(self, x, y, dx, dy):
+        """Whether a step from (x, y) to (x + dx, y + dy) is possible. It's
+        the same both ways."""
+        (height, width) = self._blocked.shape
+        if not (0 <= x + dx < width and 0 <= y + dy < height) or self._blocked[y + dy, x + dx]:
+            return False
+        return not (dx and dy) or not (self._blocked[y, x + dx] or self._blocked[y + dy, x])
+
+    def _on_occupancy_change(self, mob, old_tile, new_tile):
+        if self._stale:
+            return
+        if old_tile is not None and old_tile.occupant is None:
+            self._unblock(old_tile.coords)
+        if new_tile is not None and not self.is_follower(mob):
+            self._block(new_tile.coords)
+
+    def _unblock(self, coords):
+        """Repairs the field around a tile which is no longer an obstacle.
+        Distances can only get shorter, so it's a search outward from the tile
+        (and its neighbours, whose diagonals it may have been in the way of)
+        which stops wherever nothing improves."""
+        (x, y) = coords
+        if not self._blocked[y, x] or not self.zone.tiles[coords].walkable:
+            return
+        self._blocked[y, x] = False
+        self.repairs += 1
+
+        distances = self._distances
+        steps = self._steps
+        for (index, (dx, dy, cost)) in enumerate(self.moves):
+            if self._passable(x, y, dx, dy) and distances[y + dy, x + dx] + cost < distances[y, x]:
+                distances[y, x] = distances[y + dy, x + dx] + cost
+                steps[y, x] = index
+
+        # Without diagonal steps, the tile can't have been in the way of any
+        # step but those onto it
+        seeds = [(0, 0)] + [(dx, dy) for (dx, dy, _) in self.moves] if self.diagonal else [(0, 0)]
+        queue = [
+            (distances[y + dy, x + dx], (x + dx, y + dy))
+            for (dx, dy) in seeds
+            if (dx, dy) == (0, 0) or self._passable(x, y, dx, dy)
+        ]
+        queue = [(distance, cell) for (distance, cell) in queue if distance != numpy.inf]
+        heapq.heapify(queue)
+        blocked = self._blocked
+        (height, width) = blocked.shape
+        while queue:
+            (distance, (cx, cy)) = heapq.heappop(queue)
+            if distance > distances[cy, cx]:
+                continue
+            self._repair_work += 1
+            for (index, (dx, dy, cost)) in enumerate(self.moves):
+                # The step from (nx, ny) to here is move `index`. This is
+                # _passable(), inlined, after the cheaper distance check.
+                (nx, ny) = (cx - dx, cy - dy)
+                if 0 <= nx < width and 0 <= ny < height \
+                        and distance + cost < distances[ny, nx] \
+                        and not blocked[ny, nx] \
+                        and not (dx and dy and (blocked[cy, nx] or blocked[ny, cx])):
+                    distances[ny, nx] = distance + cost
+                    steps[ny, nx] = index
+                    heapq.heappush(queue, (distance + cost, (nx, ny)))
+
+        if self._repair_work > self._blocked.size:
+            self._stale = True
+
+    def _block(self, coords):
+        """Updates the field for a tile which has become an obstacle. If no
+        route passes through it, only the tile itself changes; otherwise the
+        field has to be rebuilt."""
+        (x, y) = coords
+        if coords == self.goal or self._blocked[y, x]:
+            return
+
+        if self._distances[y, x] != numpy.inf:
+            (height, width) = self._blocked.shape
+            for (dx, dy, _) in self.moves:
+                (nx, ny) = (x + dx, y + dy)
+                if not (0 <= nx < width and 0 <= ny < height) or self._steps[ny, nx] < 0:
+                    continue
+                (sx, sy, _) = self.moves[self._steps[ny, nx]]
+                # Stepping onto the tile, or diagonally past its corner
+                if (nx + sx, ny + sy) == (x, y) \
+                        or (sx and sy and ((nx + sx, ny) == (x, y) or (nx, ny + sy) == (x, y))):
+                    self._stale = True
+                    return
+
+        self._blocked[y, x] = True
+        self._distances[y, x] = numpy.inf
+        self._steps[y, x] = -1
+        self.repairs += 1
+
+class FlowFields (object):
+    """
+    A zone's cache of flow fields, keyed by goal tile and whether diagonal
+    steps are allowed. The least recently used fields are dropped once
+    there are more than `max_fields`, and every field is rebuilt when the
+    zone's terrain changes.
+    """
+
+    # Fields to keep per zone. Each one costs about 10 bytes per tile.
+    MAX_FIELDS = 16
+
+    def __init__(self, zone, max_fields=MAX_FIELDS):
+        self._zone = zone
+        self._max_fields = max_fields
+        self._fields = collections.OrderedDict()
+        zone.observe(zone.TERRAIN_CHANGE, self._on_terrain_change)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def field(self, goal, diagonal=False):
+        """Gets the flow field toward a tile, making it if necessary
+        :param goal: The goal tile, or its x/y coordinates
+        :param diagonal: Allow diagonal steps
+        """
+        key = (tuple(getattr(goal, 'coords', goal)), diagonal)
+        field = self._fields.pop(key, None)
+        if field is None:
+            field = FlowField(self._zone, key[0], diagonal)
+        self._fields[key] = field
+
+        while len(self._fields) > self._max_fields:
+            (_, evicted) = self._fields.popitem(last=False)
+            evicted.close()
+        return field
+
+    def clear(self):
+        """Drops every cached field"""
+        for field in self._fields.itervalues():
+            field.close()
+        self._fields.clear()
+
+    def _on_terrain_change(self, tile):
+        for field in self._fields.itervalues():
+            field.invalidate()
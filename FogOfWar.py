@@ -0,0 +1,134 @@
+"""
+Which tiles of a zone each faction has seen, and which it can see now, kept
+as packed bits.
+"""
+
+import numpy
+
+class FogOfWar (object):
+    """
+    A zone's seen and visible layers, one of each per faction (e.g. the
+    player's). Each is a bitset with one bit per tile, packed eight tiles to
+    a byte along each row, so even a 1000x1000 zone takes 125 KB per layer
+    and FieldOfView results can be merged in a few NumPy operations.
+
+    Factions are any hashable keys. Their layers are made when they're first
+    updated.
+
+    Pickling keeps just the zone's dimensions and the packed seen layers;
+    the visible ones are worked out again on the next update(). The zone
+    isn't pickled with it, so an unpickled FogOfWar has no zone until it's
+    given to one with Zone.fog_of_war.
+
+    Get the zone's one from Zone.fog_of_war.
+    """
+
+    def __init__(self, zone):
+        self.zone = zone
+        self._dimensions = tuple(zone.dimensions)
+        # Packed layers by faction, indexed [y, x // 8]
+        self._seen = {}
+        self._visible = {}
+
+    def __getstate__(self):
+        return {'dimensions': self._dimensions, 'seen': self._seen}
+
+    def __setstate__(self, state):
+        self.zone = None
+        self._dimensions = state['dimensions']
+        self._seen = state['seen']
+        self._visible = {}
+
+    @property
+    def dimensions(self):
+        return self._dimensions
+
+    @property
+    def factions(self):
+        return sorted(self._seen)
+
+    def update(self, faction, views):
+        """Sets what a faction can see now, and adds it to what it has seen
+        :param faction: The faction
+        :param views: FieldOfView.View of each of the faction's observers
+        """
+        visible = self._visible[faction] = self._empty()
+        self._merge(visible, views)
+        seen = self._seen.setdefault(faction, self._empty())
+        seen |= visible
+
+    def reveal(self, faction, views):
+        """Adds to what a faction has seen, without changing what it can see
+        now, e.g. from a map
+        :param faction: The faction
+        :param views: FieldOfView.View of what's revealed
+        """
+        self._merge(self._seen.setdefault(faction, self._empty()), views)
+
+    def forget(self, faction):
+        """Drops everything a faction has seen"""
+        self._seen.pop(faction, None)
+        self._visible.pop(faction, None)
+
+    def is_seen(self, faction, coords):
+        """Whether a faction has ever seen a tile"""
+        return FogOfWar._bit(self._seen.get(faction), coords)
+
+    def is_visible(self, faction, coords):
+        """Whether a faction can see a tile now"""
+        return FogOfWar._bit(self._visible.get(faction), coords)
+
+    def seen_mask(self, faction, x, y, width, height):
+        """Boolean array, indexed [y, x], of the tiles in a rectangle which a
+        faction has ever seen. Tiles outside the zone haven't been."""
+        return self._unpack(self._seen.get(faction), x, y, width, height)
+
+    def visible_mask(self, faction, x, y, width, height):
+        """Boolean array, indexed [y, x], of the tiles in a rectangle which a
+        faction can see now. Tiles outside the zone can't be seen."""
+        return self._unpack(self._visible.get(faction), x, y, width, height)
+
+    def _empty(self):
+        (width, height) = self._dimensions
+        return numpy.zeros((height, (width + 7) // 8), dtype=numpy.uint8)
+
+    def _merge(self, layer, views):
+        """ORs views into a layer, all at once within their bounding box"""
+        views = [view for view in views if view.mask.size]
+        if not views:
+            return
+        # Widen the box to whole bytes, so it can be packed in place
+        x0 = min(view.x for view in views) // 8 * 8
+        y0 = min(view.y for view in views)
+        x1 = max(view.x + view.mask.shape[1] for view in views)
+        y1 = max(view.y + view.mask.shape[0] for view in views)
+        box = numpy.zeros((y1 - y0, (x1 - x0 + 7) // 8 * 8), dtype=bool)
+        for view in views:
+            (height, width) = view.mask.shape
+            box[view.y - y0:view.y - y0 + height, view.x - x0:view.x - x0 + width] |= view.mask
+        packed = numpy.packbits(box, axis=1)
+        layer[y0:y1, x0 // 8:x0 // 8 + packed.shape[1]] |= packed[:, :layer.shape[1] - x0 // 8]
+
+    def _unpack(self, layer, x, y, width, height):
+        mask = numpy.zeros((max(height, 0), max(width, 0)), dtype=bool)
+        if layer is None:
+            return mask
+        (x0, y0) = (max(x, 0), max(y, 0))
+        clipped_width = min(x + width, self._dimensions[0]) - x0
+        clipped_height = min(y + height, self._dimensions[1]) - y0
+        if clipped_width <= 0 or clipped_height <= 0:
+            return mask
+        bits = numpy.unpackbits(layer[y0:y0 + clipped_height, x0 // 8:(x0 + clipped_width + 7) // 8], axis=1)
+        mask[y0 - y:y0 - y + clipped_height, x0 - x:x0 - x + clipped_width] = \
+            bits[:, x0 % 8:x0 % 8 + clipped_width].astype(bool)
+        return mask
+
+    @staticmethod
+    def _bit(layer, coords):
+        if layer is None:
+            return False
+        (x, y) = coords
+        (height, columns) = layer.shape
+        if not (0 <= y < height and 0 <= x < columns * 8):
+            return False
+        return bool(layer[y, x // 8] & (0x80 >> (x % 8)))
@@ -1,3 +1,5 @@
+import timeit
+
 from pygame.time import Clock
 
 from Observable import Observable, EventType
@@ -19,7 +21,26 @@ class GameClock (Observable):
         :param dt: Amount of real time that elapsed, in milliseconds
         """
 
-    def __init__(self, framerate, multiplier=1.0):
+    @EventType
+    def INTERPOLATE(dt):
+        """Game time has accumulated that hasn't been simulated yet
+        :param dt: Amount of game time between the last simulation step and
+                   the present, in "seconds". Renderers may use it to draw
+                   moving things between steps.
+        """
+
+    def __init__(self, framerate, multiplier=1.0, step=None, max_steps=10):
+        """
+        :param framerate: Limit on update() calls (i.e. frames) per second
+        :param multiplier: Game seconds per real second
+        :param step: If given, game time advances in fixed steps of this many
+                     game seconds, no matter how long each frame takes.
+                     Otherwise it advances by however long the frame took.
+        :param max_steps: Most fixed steps to simulate in one update(). When
+                          the simulation can't keep up, the backlog beyond
+                          this is dropped and the game runs slower instead of
+                          falling further and further behind.
+        """
         super(GameClock, self).__init__()
 
         self.clock = Clock()
@@ -27,6 +48,22 @@ class GameClock (Observable):
         self.framerate = framerate
         self.isPaused = False
 
+        self.step = step
+        self.max_steps = max_steps
+        self._accumulator = 0.0
+
+        # Total game time thrown away to stop the simulation falling behind
+        self.dropped_time = 0.0
+
+        # Optional object with a time_to_next_event() method, returning the
+        # game time until the next thing happens if it's safe to jump straight
+        # to it (e.g. nothing visible is moving), or None otherwise
+        self.event_skipper = None
+        # Most real time per frame to spend jumping between events, in milliseconds
+        self.skip_budget = 10
+        # Total game time jumped over by event skipping
+        self.skipped_time = 0.0
+
     @property
     def multiplier(self):
         """Get the real/game time ratio"""
@@ -48,7 +85,50 @@ class GameClock (Observable):
         real_dt = self.clock.tick(self.framerate)
         #self.notify(GameClock.REAL_TIME_ADVANCE, real_dt)
         game_dt = real_dt * self.multiplier / 1000.0
-        self.notify(GameClock.GAME_TIME_ADVANCE, game_dt)
+
+        if self.step is None:
+            self.notify(GameClock.GAME_TIME_ADVANCE, game_dt)
+        else:
+            self._advance_fixed_steps(game_dt)
+
+        if self.event_skipper is not None and self.multiplier:
+            self._skip_idle_time()
+
+    def _skip_idle_time(self):
+        """Fast-forward from event to event for as long as the event skipper allows
+
+        This is discrete-event simulation: while nothing needs drawing, there's
+        no point advancing time in frame-sized slices. It stops as soon as the
+        skipper objects, or when the frame's skip budget runs out so that
+        input still gets handled.
+        """
+        deadline = timeit.default_timer() + self.skip_budget / 1000.0
+
+        while timeit.default_timer() < deadline:
+            dt = self.event_skipper.time_to_next_event()
+            if dt is None:
+                break
+            self.skipped_time += dt
+            self.notify(GameClock.GAME_TIME_ADVANCE, dt)
+
+    def _advance_fixed_steps(self, game_dt):
+        self._accumulator += game_dt
+
+        steps = 0
+        while self._accumulator >= self.step:
+            if steps == self.max_steps:
+                # Spiral-of-death protection: simulating the backlog would
+                # make the next frame even slower, so drop it
+                backlog = self._accumulator - self._accumulator % self.step
+                self.dropped_time += backlog
+                self._accumulator -= backlog
+                break
+
+            self.notify(GameClock.GAME_TIME_ADVANCE, self.step)
+            self._accumulator -= self.step
+            steps += 1
+
+        self.notify(GameClock.INTERPOLATE, self._accumulator)
 
     def zero(self):
         """Drain any time off the internal clock without calling any updaters"""
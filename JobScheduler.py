@@ -0,0 +1,134 @@
+"""
+Long-running work, e.g. big searches or catching up dormant zones, split
+into slices and run a few at a time each frame within a budget.
+"""
+
+import heapq
+import itertools
+import timeit
+
+class JobScheduler (object):
+    """
+    Runs long jobs a slice at a time, within a budget of real time per frame.
+
+    A job is an iterator, usually a generator, which does a bit of its work
+    each time it's advanced and stops when it's finished. Each frame,
+    run_frame() advances the most urgent jobs, one slice at a time, until the
+    budget is spent. Jobs of the same priority take turns. A job passed over
+    for a frame counts as one priority level more urgent for the next, until
+    it gets a turn, and wins ties against jobs which haven't waited as long.
+    So a BACKGROUND job gets a turn at least every third frame however busy
+    the URGENT ones keep the scheduler.
+
+    At least one slice runs every frame, however small the budget, so a frame
+    may overrun it by as much as a slice takes. Overruns are counted, so
+    jobs can be sliced more finely if they happen too often.
+    """
+
+    # Priorities. Lower numbers run first. Waiting a frame makes a job one
+    # level more urgent, so these are consecutive.
+    URGENT = 0      # e.g. the PC's path
+    NORMAL = 1
+    BACKGROUND = 2  # e.g. idle guards' paths
+
+    class Job (object):
+        """Handle for a job added to the scheduler"""
+        def __init__(self, scheduler, iterator, priority, on_complete):
+            self._scheduler = scheduler
+            self._iterator = iterator
+            self.priority = priority
+            self.on_complete = on_complete
+            # Frames passed over since the job last ran
+            self.waited = 0
+            # Slices run so far
+            self.slices = 0
+            self.is_done = False
+
+        def cancel(self):
+            """Stops running the job. on_complete isn't called."""
+            if not self.is_done:
+                self.is_done = True
+                self._scheduler._jobs.remove(self)
+
+    def __init__(self, budget=4.0):
+        """
+        :param budget: Real time to spend on jobs per frame, in milliseconds
+        """
+        self.budget = budget
+        self._jobs = []
+        self._turns = itertools.count()
+
+        # Frames which ran any jobs, and how many of them went over budget
+        self.frames = 0
+        self.overruns = 0
+        # Real seconds spent on jobs in total, past the budget in total, and
+        # in the longest frame
+        self.busy_time = 0.0
+        self.overrun_time = 0.0
+        self.longest_frame = 0.0
+
+    def __len__(self):
+        """Number of jobs not finished yet"""
+        return len(self._jobs)
+
+    def add(self, job, priority=NORMAL, on_complete=None):
+        """Adds a job, to be started on the next frame
+        :param job: Iterator doing a slice of the work each time it's advanced
+        :param priority: How urgent the job is, e.g. JobScheduler.URGENT
+        :param on_complete: Optional function called with no arguments once
+                            the job has finished
+        :return: A JobScheduler.Job, which may be cancel()'ed
+        """
+        job = JobScheduler.Job(self, iter(job), priority, on_complete)
+        self._jobs.append(job)
+        return job
+
+    def run_frame(self):
+        """Runs jobs for up to a frame's budget. Called once per frame."""
+        if not self._jobs:
+            return
+
+        start = timeit.default_timer()
+        deadline = start + self.budget / 1000.0
+
+        # Ties go to whichever job has waited longest for a turn
+        queue = [(job.priority - job.waited, -job.waited, next(self._turns), job) for job in self._jobs]
+        heapq.heapify(queue)
+        ran = set()
+        try:
+            while queue:
+                (urgency, _, _, job) = heapq.heappop(queue)
+                if job.is_done:
+                    continue
+                ran.add(job)
+                self._run_slice(job)
+                if timeit.default_timer() >= deadline:
+                    break
+                if not job.is_done:
+                    heapq.heappush(queue, (urgency, 0, next(self._turns), job))
+        finally:
+            # Even if a job failed, the frame happened
+            for job in self._jobs:
+                job.waited = 0 if job in ran else job.waited + 1
+
+            elapsed = timeit.default_timer() - start
+            self.frames += 1
+            self.busy_time += elapsed
+            self.longest_frame = max(self.longest_frame, elapsed)
+            if elapsed > self.budget / 1000.0:
+                self.overruns += 1
+                self.overrun_time += elapsed - self.budget / 1000.0
+
+    def _run_slice(self, job):
+        try:
+            next(job._iterator)
+        except StopIteration:
+            job.cancel()
+            if job.on_complete is not None:
+                job.on_complete()
+        except Exception:
+            # A failed job is dropped, and the error passed on to the caller
+            job.cancel()
+            raise
+        else:
+            job.slices += 1
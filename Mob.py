@@ -1,26 +1,33 @@
 # -*- coding: utf-8 -*-
 
 from Observable import Observable, \
-    EventType
+    EventType, \
+    CoalescingEventType
 from walking import \
     WalkToAdjacentTileAction, \
     WalkToAdjacentTileDirective, \
     WalkToDestinationDirective, \
-    PatrolDestinationsDirective
+    PatrolDestinationsDirective, \
+    FlowFieldDirective
 
 class Mob (Observable):
     """
     A Movable entity that occupies tiles
     """
 
-    @EventType
+    @CoalescingEventType
     def POSITION_CHANGE(mob, old_tile):
         """Mob moved
         :param mob: The mob that moved (i.e. self)
-        :param old_tile: The previous tile
+        :param old_tile: The tile it moved from. When events are queued (see
+                         Observable.EventQueue), only the last of a frame's
+                         moves is delivered, so this is the tile before that
+                         move, not where the mob started the frame. Listeners
+                         should go by mob.tile, as Zone does, and not rely on
+                         old_tile.
         """
 
-    @EventType
+    @CoalescingEventType
     def SPEED_CHANGE(mob):
         """Mob's speed changed"""
 
@@ -36,6 +43,10 @@ class Mob (Observable):
         self._tile = None
         self._walk_action = None
         self._walk_directive = None
+        # Outstanding PathService.Request from walk_to(), and the
+        # (tile, diagonal) it's for
+        self._path_request = None
+        self._path_request_args = None
 
         # Static/public properties
         self.sprite = sprite
@@ -73,6 +84,24 @@ class Mob (Observable):
             if self._walk_action is None \
             else self._walk_action.current_position
 
+    def position_at(self, time):
+        """Where the mob will be at a given zone time, if nothing interrupts it
+        :param time: Absolute zone time, no earlier than the current time
+        """
+        return self.tile.coords \
+            if self._walk_action is None \
+            else self._walk_action.position_at(time)
+
+    @property
+    def is_moving(self):
+        """Whether the mob is in the middle of walking somewhere"""
+        return self._walk_action is not None
+
+    @property
+    def destination(self):
+        """The tile the mob is walking to, or None if it isn't walking"""
+        return None if self._walk_action is None else self._walk_action.dest_tile
+
     @property
     def speed(self):
         return self._speed
@@ -89,16 +118,28 @@ class Mob (Observable):
     @walk_directive.setter
     def walk_directive(self, walk_directive):
         """
-        :param walk_directive: Should be an iterator
+        :param walk_directive: Should be an iterator. If the directive it
+                               replaces has a close() method, it's called.
+                               A new directive supersedes a path walk_to()
+                               is still waiting for; None, e.g. when the
+                               last one runs out, doesn't.
         """
+        if walk_directive is not None and self._path_request is not None:
+            # Superseded
+            self._path_request.cancel()
+            self._path_request = None
+
+        previous = self._walk_directive
         self._walk_directive = walk_directive
+        if previous is not None and previous is not walk_directive and hasattr(previous, 'close'):
+            previous.close()
 
         if self.walk_directive is not None:
             try:
                 next_tile = self.walk_directive.next()
             except StopIteration as e:
                 # New directive says we're already there
-                if self._walk_action.state.is_cancelable:
+                if self._walk_action is not None and self._walk_action.state.is_cancelable:
                     self._walk_action.cancel()
             else:
                 if self._walk_action is None:
@@ -119,20 +160,56 @@ class Mob (Observable):
         """
         self.walk_directive = WalkToAdjacentTileDirective(mob=self, direction=direction)
 
-    def walk_to(self, tile):
-        """Navigate to an arbitrary tile on the map
+    def walk_to(self, tile, diagonal=False):
+        """Navigate to an arbitrary tile on the map. If the zone has a path
+        service (see Zone.start_path_service()), the path is found by that,
+        and the mob carries on with what it was doing until it is. If
+        there's no way there, the mob stops.
         :param tile: Tile to move to
+        :param diagonal: Allow diagonal steps
         """
-        self.walk_directive = WalkToDestinationDirective(mob=self, tile=tile)
+        service = self.tile.zone.path_service
+        if service is None:
+            self.walk_directive = WalkToDestinationDirective(mob=self, tile=tile, diagonal=diagonal)
+        else:
+            if self._path_request is not None:
+                self._path_request.cancel()
+            self._path_request = service.request(self.tile, tile, diagonal, self._on_path_found)
+            self._path_request_args = (tile, diagonal)
     
-    def patrol(self, tile_list):
+    def flow_to(self, tile, diagonal=False):
+        """Navigate to an arbitrary tile on the map along the zone's shared
+        flow field toward it. Cheaper than walk_to() when many mobs are
+        heading for the same tile.
+        :param tile: Tile to move to
+        :param diagonal: Allow diagonal steps
+        """
+        self.walk_directive = FlowFieldDirective(mob=self, tile=tile, diagonal=diagonal)
+
+    def patrol(self, tile_list, diagonal=False):
         """Patrol a circuit of tiles ad infinitum
         :param tile_list: List of tiles to patrol
+        :param diagonal: Allow diagonal steps
         """
-        self.walk_directive = PatrolDestinationsDirective(mob=self, tile_list=tile_list)
+        self.walk_directive = PatrolDestinationsDirective(mob=self, tile_list=tile_list, diagonal=diagonal)
 
     # Handlers
 
+    def _on_path_found(self, path):
+        """Callback for the path service finding the way for walk_to()"""
+        (tile, diagonal) = self._path_request_args
+        self._path_request = self._path_request_args = None
+        if self.tile is None or self.tile.zone is not tile.zone:
+            return
+        if path is None:
+            # No way there. Give up, as the directive would have, rather than
+            # have it search again here on the main thread.
+            self.walk_directive = None
+            if self._walk_action is None:
+                self.notify(Mob.STOP_MOVING, self)
+        else:
+            self.walk_directive = WalkToDestinationDirective(mob=self, tile=tile, diagonal=diagonal, path=path)
+
     def _on_walk_action_done(self, success=None):
         """Callback for when the current walk action has completed"""
         self._walk_action = None
@@ -152,5 +229,8 @@ class Mob (Observable):
                 self._walk_action.observe(WalkToAdjacentTileAction.DONE,
                                           self._on_walk_action_done,
                                           limit=1)
+        else:
+            # The directive was dropped mid-step
+            self.notify(Mob.STOP_MOVING, self)
 
 
@@ -0,0 +1,160 @@
+from util import distance
+
+class MobIndex (object):
+    """
+    Spatial index of the mobs in a zone, for "who is near here" questions.
+
+    Mobs are bucketed on a uniform grid by the coordinates of the tile they
+    occupy (i.e. mob.tile), so a query only has to look at the mobs in the
+    buckets it overlaps instead of every mob in the zone. A walking mob is
+    indexed at its mob.tile, not its interpolated position, so queries which
+    care about drawing (like ZoneView's culling) should pad their
+    rectangles by a tile.
+
+    The zone keeps its index up to date; see Zone.mob_index.
+    """
+
+    # Width and height, in tiles, of each bucket
+    BUCKET_SIZE = 8
+
+    def __init__(self, bucket_size=BUCKET_SIZE):
+        """
+        :param bucket_size: Width and height, in tiles, of each bucket. Should
+                            be about the size of a typical query.
+        """
+        self._bucket_size = bucket_size
+        self._buckets = {}
+        self._coords = {}
+
+    def __len__(self):
+        return len(self._coords)
+
+    def __iter__(self):
+        return iter(self._coords)
+
+    def __contains__(self, mob):
+        return mob in self._coords
+
+    def coords_of(self, mob):
+        """Tile coordinates the mob is indexed at"""
+        return self._coords[mob]
+
+    def place(self, mob, coords):
+        """Adds a mob to the index, or moves it if it's already there"""
+        coords = tuple(coords)
+        old_coords = self._coords.get(mob)
+        if old_coords == coords:
+            return
+
+        bucket = self._bucket_of(coords)
+        if old_coords is not None:
+            old_bucket = self._bucket_of(old_coords)
+            if old_bucket != bucket:
+                self._remove_from_bucket(mob, old_bucket)
+                self._buckets.setdefault(bucket, set()).add(mob)
+        else:
+            self._buckets.setdefault(bucket, set()).add(mob)
+
+        self._coords[mob] = coords
+
+    def remove(self, mob):
+        """Removes a mob from the index, if it's there"""
+        coords = self._coords.pop(mob, None)
+        if coords is not None:
+            self._remove_from_bucket(mob, self._bucket_of(coords))
+
+    def in_rect(self, x, y, width, height):
+        """Lists the mobs whose tile is inside an (x, y, width, height) rectangle"""
+        size = self._bucket_size
+        found = []
+        for bx in xrange(x // size, (x + width - 1) // size + 1):
+            for by in xrange(y // size, (y + height - 1) // size + 1):
+                for mob in self._buckets.get((bx, by), ()):
+                    (mob_x, mob_y) = self._coords[mob]
+                    if x <= mob_x < x + width and y <= mob_y < y + height:
+                        found.append(mob)
+        return found
+
+    def within(self, coords, radius):
+        """Lists the mobs no more than `radius` away from a tile, as measured
+        by util.distance()"""
+        (x, y) = coords
+        # distance() is never less than the larger of |dx| and |dy|, so the
+        # square of side 2 * radius + 1 holds every candidate
+        reach = int(radius)
+        return [
+            mob
+            for mob in self.in_rect(x - reach, y - reach, 2 * reach + 1, 2 * reach + 1)
+            if distance(coords, self._coords[mob]) <= radius
+        ]
+
+    def nearest(self, coords, k=1, max_radius=None, exclude=None):
+        """Lists up to k mobs closest to a tile, nearest first, by util.distance()
+        :param coords: Tile coordinates to search from
+        :param k: Maximum number of mobs to return
+        :param max_radius: Optionally ignore mobs further away than this
+        :param exclude: Optional mob to leave out, e.g. the one searching
+        :return: A list of (distance, mob) tuples
+        """
+        if k <= 0:
+            return []
+
+        (x, y) = coords
+        size = self._bucket_size
+        (center_bx, center_by) = self._bucket_of(coords)
+        candidates = []
+        examined = 0
+        ring = 0
+
+        # Search outward one ring of buckets at a time
+        while examined < len(self._coords):
+            for bucket in self._ring(center_bx, center_by, ring):
+                for mob in self._buckets.get(bucket, ()):
+                    examined += 1
+                    if mob is exclude:
+                        continue
+                    mob_distance = distance(coords, self._coords[mob])
+                    if max_radius is None or mob_distance <= max_radius:
+                        candidates.append((mob_distance, mob))
+
+            # Every tile outside the searched square is at least this far
+            # away, because distance() is never less than the larger of |dx|
+            # and |dy|
+            unsearched_distance = 1 + min(
+                x - (center_bx - ring) * size,
+                (center_bx + ring + 1) * size - 1 - x,
+                y - (center_by - ring) * size,
+                (center_by + ring + 1) * size - 1 - y,
+            )
+            if max_radius is not None and unsearched_distance > max_radius:
+                break
+            if len(candidates) >= k:
+                candidates.sort(key=lambda candidate: candidate[0])
+                del candidates[k:]
+                if candidates[-1][0] <= unsearched_distance:
+                    break
+            ring += 1
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        return candidates[:k]
+
+    def _bucket_of(self, coords):
+        return coords[0] // self._bucket_size, coords[1] // self._bucket_size
+
+    def _remove_from_bucket(self, mob, bucket):
+        mobs = self._buckets[bucket]
+        mobs.discard(mob)
+        if not mobs:
+            del self._buckets[bucket]
+
+    @staticmethod
+    def _ring(center_bx, center_by, ring):
+        """Buckets exactly `ring` buckets away from the center one"""
+        if ring == 0:
+            return [(center_bx, center_by)]
+        left, right = center_bx - ring, center_bx + ring
+        top, bottom = center_by - ring, center_by + ring
+        return [(bx, top) for bx in xrange(left, right + 1)] + \
+               [(bx, bottom) for bx in xrange(left, right + 1)] + \
+               [(left, by) for by in xrange(top + 1, bottom)] + \
+               [(right, by) for by in xrange(top + 1, bottom)]
@@ -1,8 +1,10 @@
 from __future__ import print_function
 
+import collections
+import gc
+import timeit
 import types
-
-debug_events = False
+import weakref
 
 class EventType (object):
     """
@@ -67,110 +69,381 @@ class EventType (object):
         return (has_args or (not self.prototype_has_args and self.prototype_argcount <= argcount)) \
             and (has_kwargs or not self.prototype_has_kwargs)
 
+def _find_event_types(clazz):
+    return frozenset(
+        attr_value
+        for attr_name in dir(clazz)
+        for attr_value in [getattr(clazz, attr_name)]
+        if isinstance(attr_value, EventType)
+    )
+
+class ObservableType (type):
+    """Metaclass for Observables
+
+    Finds a class's EventTypes once, when the class is created, instead of
+    every time an instance is constructed. All instances of the class share
+    the resulting frozenset.
+    """
+    def __init__(cls, name, bases, namespace):
+        super(ObservableType, cls).__init__(name, bases, namespace)
+        cls._class_event_types = _find_event_types(cls)
+
 class Observable (object):
     """Data structure useful for implementing the Observable pattern"""
 
+    __metaclass__ = ObservableType
+
+    # Event types supported by this particular instance on top of its
+    # class's, if any were passed to __init__()
+    _extra_event_types = frozenset()
+
+    # Observer handles, by event type. Most Observables (e.g. Tiles) are never
+    # observed, so the dict is only allocated by the first observe().
+    # The handles are kept in tuples which are replaced rather than modified
+    # (copy-on-write), so notify() can iterate over them without copying even
+    # if a callback adds or cancels observers.
+    _observer_handles = None
+
     class Handle (object):
         """Utility class for Observable objects"""
         def __init__(self, callback, event_type, limit, manager):
-            #TODO might need to use weak references
             self._callback = callback
             self._event_type = event_type
-            self._limit = limit
+            # Immortal handles don't count down at all
+            self._limit = None if limit == float('inf') else limit
             self._manager = manager
 
         def cancel(self):
             """Removes the callback from its original Observable"""
             self._manager.unobserve(self._event_type, self)
 
-    def __init__(self, supported_event_types=set(), scan_for_event_types=True):
+    class WeakHandle (Handle):
+        """Handle which doesn't keep its callback (or the object a bound
+        method belongs to) alive. Once the callback's owner is garbage
+        collected, the handle cancels itself.
         """
-        :param supported_event_types: Optional list of permitted `EventType`s
-        :param scan_for_event_types: Search through the class's attributes for
-                                     EventType objects
+
+        @property
+        def _callback(self):
+            owner = self._ref()
+            if owner is None:
+                # Collected, but the weakref callback hasn't run yet
+                return _ignore
+            elif self._function is None:
+                return owner
+            else:
+                return self._function.__get__(owner, type(owner))
+
+        @_callback.setter
+        def _callback(self, callback):
+            # Bound methods are created on the fly, so a weak reference to one
+            # would die immediately. Reference the object instead.
+            owner = getattr(callback, 'im_self', None)
+            if owner is None:
+                self._function = None
+                self._ref = weakref.ref(callback, self._on_owner_collected)
+            else:
+                self._function = callback.im_func
+                self._ref = weakref.ref(owner, self._on_owner_collected)
+
+        def _on_owner_collected(self, ref):
+            self.cancel()
+
+    def __init__(self, supported_event_types=frozenset(), scan_for_event_types=True):
+        """
+        :param supported_event_types: Optional list of permitted `EventType`s.
+                                      Pass a frozenset to share it between
+                                      instances instead of copying it.
+        :param scan_for_event_types: Permit the EventType objects defined on
+                                     the class
         :return:
         """
-        self._observer_handles = {}
-
-        self._supported_event_types = supported_event_types \
-            if type(supported_event_types) == set \
-            else set(supported_event_types)
+        if supported_event_types:
+            self._extra_event_types = supported_event_types \
+                if type(supported_event_types) == frozenset \
+                else frozenset(supported_event_types)
 
-        if scan_for_event_types:
-            self._supported_event_types |= _find_event_types(type(self)) 
+        if not scan_for_event_types:
+            self._class_event_types = frozenset()
 
-    @staticmethod
-    def _find_event_types(clazz):
-        return {
-            attr_value
-            for attr_name in dir(clazz)
-            for attr_value in [getattr(clazz, attr_name)]
-            if isinstance(attr_value, EventType)
-        }
+    def supports(self, event_type):
+        """Whether the event type may be observed or notified on this Observable"""
+        return event_type in self._class_event_types \
+            or event_type in self._extra_event_types
 
-    def observe(self, event_type, callback, limit=float('inf')):
+    def observe(self, event_type, callback, limit=float('inf'), weak=False):
         """Registers a callback
         :param callback: Function to call on notify() for corresponding
                          event_type
         :param event_type: Key designating the event's type.
         :param limit: Optional maximum number of times to execute callback.
                       By default, callbacks are immortal.
+        :param weak: Only hold a weak reference to the callback (or, for a
+                     bound method, to its object). The observer is dropped
+                     automatically when it's garbage collected, so this
+                     Observable won't keep it alive.
         :return: A Handle which may be used to cancel()'ed to remove
                  it from the Observable
         """
-        if event_type not in self._supported_event_types:
+        if not self.supports(event_type):
             raise KeyError('Event type {} is not supported by this Observable'.format(repr(event_type)))
-        elif 'matches_signature' in dir(event_type) and not event_type.matches_signature(callback):
+        elif isinstance(event_type, EventType) and not event_type.matches_signature(callback):
             raise TypeError('Callback {} ({} args) cannot be called by event type {} ({} args)'.format(
                 repr(callback), callback.func_code.co_argcount,
                 repr(event_type), event_type.prototype_argcount,
             ))
         else:
-            if not(event_type in self._observer_handles):
-                self._observer_handles[event_type] = []
+            if self._observer_handles is None:
+                self._observer_handles = {}
 
-            handle = Observable.Handle(callback, event_type, limit, self)
-            self._observer_handles[event_type].append(handle)
+            handle = (Observable.WeakHandle if weak else Observable.Handle)(callback, event_type, limit, self)
+            self._observer_handles[event_type] = \
+                self._observer_handles.get(event_type, ()) + (handle,)
             return handle
 
     def unobserve(self, event_type, handle):
         """Stop calling the Handle's callback for event_type
+
+        Unobserving a handle which has already been removed (e.g. because it
+        reached its limit) does nothing.
         :param handle:
         :param event_type:
         :return:
         """
-        self._observer_handles[event_type].remove(handle)
+        observers = self._observer_handles.get(event_type, ()) \
+            if self._observer_handles is not None \
+            else ()
+
+        if handle in observers:
+            self._set_observers(event_type, tuple(
+                listener
+                for listener in observers
+                if listener is not handle
+            ))
+
+    def _set_observers(self, event_type, observers):
+        if observers:
+            self._observer_handles[event_type] = observers
+        else:
+            # Cull childless event_types. A callback may have beaten us to it.
+            self._observer_handles.pop(event_type, None)
 
     # noinspection PyProtectedMember
-    def notify(self, event_type, *args, **kwargs):
+    def _notify_now(self, event_type, *args, **kwargs):
         """ Calls all observers with a corresponding event_type in the order they were registered
         :param event_type: Matches add():event_type
         :param args: Ordered arguments to pass to the callbacks
         :param kwargs: Named arguments to pass to the callbacks
         :return: None
         """
+        handles = self._observer_handles
+
+        if handles is None or event_type not in handles:
+            # Only events nobody listens to need validating; observe() has
+            # already checked the others
+            if event_type not in self._class_event_types \
+                    and event_type not in self._extra_event_types \
+                    and (self._class_event_types or self._extra_event_types):
+                raise KeyError('Event type {} is not supported by this Observable'.format(repr(event_type)))
+            return
+
+        observers = handles[event_type]
+
+        expired = False
+        for listener in observers:
+            limit = listener._limit
+            if limit is not None:
+                if limit <= 0:
+                    # Used up by a re-entrant notify() of the same event
+                    continue
+                # Decay it before the call, in case the callback re-enters
+                listener._limit = limit - 1
+                expired |= limit == 1
+            listener._callback(*args, **kwargs)
+
+        if expired:
+            # Cull expired callbacks, from the current observers in case a
+            # callback changed them
+            self._set_observers(event_type, tuple(
+                listener
+                for listener in self._observer_handles.get(event_type, ())
+                if listener._limit != 0
+            ))
 
-        if debug_events:
-            print('[Event] {}: args={} kwargs={}'.format(event_type, repr(args), repr(kwargs)))
+    def _notify_now_profiled(self, event_type, *args, **kwargs):
+        """Same as _notify_now(), but timing everything for the EventProfiler"""
+        profiler = _event_profiler
+        source_class = type(self)
+        timer = timeit.default_timer
+
+        profiler.begin_event(event_type)
+        start = timer()
+        try:
+            handles = self._observer_handles
+
+            if handles is None or event_type not in handles:
+                if event_type not in self._class_event_types \
+                        and event_type not in self._extra_event_types \
+                        and (self._class_event_types or self._extra_event_types):
+                    raise KeyError('Event type {} is not supported by this Observable'.format(repr(event_type)))
+                return
+
+            expired = False
+            for listener in handles[event_type]:
+                limit = listener._limit
+                if limit is not None:
+                    if limit <= 0:
+                        continue
+                    listener._limit = limit - 1
+                    expired |= limit == 1
+
+                callback = listener._callback
+                callback_start = timer()
+                callback(*args, **kwargs)
+                profiler.record_callback(source_class, event_type, callback, timer() - callback_start)
+
+            if expired:
+                self._set_observers(event_type, tuple(
+                    listener
+                    for listener in self._observer_handles.get(event_type, ())
+                    if listener._limit != 0
+                ))
+        finally:
+            profiler.end_event(event_type, timer() - start)
+
+    def _notify_deferred(self, event_type, *args, **kwargs):
+        """Queues coalescible events until the event queue is flushed, and
+        delivers everything else immediately
+        """
+        if event_type in _coalescible_event_types:
+            _event_queue.post(self, event_type, args, kwargs)
+        else:
+            self._dispatch(event_type, *args, **kwargs)
 
-        if self._supported_event_types and not(event_type in self._supported_event_types):
-            raise KeyError('Event type {} is not supported by this Observable'.format(repr(event_type)))
+    # Delivers events to observers. Swapped by set_event_profiler().
+    _dispatch = _notify_now
 
-        elif event_type in self._observer_handles:
-            observers = self._observer_handles[event_type]
+    # Broadcasts an event. Swapped by set_event_profiler() and
+    # set_event_queue(), so the common case pays for neither.
+    notify = _notify_now
 
-            # Call each listener and decay it
-            for listener in list(observers):
-                listener._callback(*args, **kwargs)
-                listener._limit -= 1
+class EventQueue (object):
+    """
+    Buffers broadcasts of coalescible event types (see CoalescingEventType)
+    until flush() is called, usually once per frame. Only the latest
+    broadcast of each event type by each Observable is delivered, so a burst
+    of mouse motion or a crowd of moving mobs costs a bounded amount of work
+    per frame.
+    """
 
-            # Cull expired callbacks
-            observers[:] = [
-                listener
-                for listener in observers
-                if listener._limit != 0
-            ]
+    def __init__(self, max_passes=8):
+        """
+        :param max_passes: Delivering queued events may queue more (e.g. a
+                           hover cascading through controllers). flush()
+                           keeps going for at most this many rounds, leaving
+                           the rest for the next frame.
+        """
+        self.max_passes = max_passes
+        self._pending = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def post(self, source, event_type, args, kwargs):
+        """Queue an event, replacing any earlier one from the same source"""
+        key = (source, event_type)
+        if key in self._pending:
+            # Deliver it in the position of its latest broadcast
+            del self._pending[key]
+        self._pending[key] = (args, kwargs)
+
+    def flush(self):
+        """Deliver every queued event"""
+        passes = 0
+        while self._pending and passes < self.max_passes:
+            pending, self._pending = self._pending, collections.OrderedDict()
+            for (source, event_type), (args, kwargs) in pending.iteritems():
+                source._dispatch(event_type, *args, **kwargs)
+            passes += 1
+
+class CoalescingEventType (EventType):
+    """
+    An EventType where only the latest broadcast per frame matters, such as
+    hovering or movement. When an EventQueue is installed with
+    set_event_queue(), these events are queued and coalesced instead of
+    being delivered immediately. Otherwise they behave like any EventType.
+
+    Usage::
+        class MyClass (Observable):
+            @CoalescingEventType
+            def MY_EVENT(param1, param2):
+                pass
+    """
+    def __init__(self, prototype_function):
+        super(CoalescingEventType, self).__init__(prototype_function)
+        _coalescible_event_types.add(self)
+
+# Every CoalescingEventType ever created
+_coalescible_event_types = set()
+
+# The installed EventQueue, if any
+_event_queue = None
+
+# The installed EventProfiler, if any
+_event_profiler = None
+
+def _install_notify():
+    """Point Observable.notify at the cheapest implementation for the current settings"""
+    dispatch = Observable.__dict__['_notify_now_profiled' if _event_profiler is not None else '_notify_now']
+    Observable._dispatch = dispatch
+    Observable.notify = Observable.__dict__['_notify_deferred'] \
+        if _event_queue is not None \
+        else dispatch
+
+def set_event_profiler(event_profiler):
+    """Collect statistics on every event broadcast. Profiling is kept out of
+    notify() entirely unless enabled.
+    :param event_profiler: An EventProfiler, or None to stop profiling
+    """
+    global _event_profiler
+    _event_profiler = event_profiler
+    _install_notify()
+
+def get_event_profiler():
+    """The installed EventProfiler, or None"""
+    return _event_profiler
+
+def set_event_queue(event_queue):
+    """Queue and coalesce CoalescingEventTypes until they're flushed, instead
+    of delivering them immediately
+    :param event_queue: An EventQueue, or None to go back to delivering
+                        every event immediately
+    """
+    global _event_queue
+    if _event_queue is not None:
+        _event_queue.flush()
+    _event_queue = event_queue
+    _install_notify()
+
+def flush_events():
+    """Deliver any queued events. Does nothing if no EventQueue is installed."""
+    if _event_queue is not None:
+        _event_queue.flush()
+
+def live_handle_counts():
+    """Diagnostic for listener leaks. This walks every object the garbage
+    collector knows about, so it's slow, but costs nothing until it's called.
+    :return: A dict of the number of observer handles registered on live
+             Observables, by Observable class, leaving out classes with none
+    """
+    # Don't count garbage that hasn't been collected yet
+    gc.collect()
+
+    counts = collections.Counter()
+    for obj in gc.get_objects():
+        if isinstance(obj, Observable) and obj._observer_handles:
+            counts[type(obj)] += sum(len(observers) for observers in obj._observer_handles.itervalues())
+    return dict(counts)
 
-            # Cull childless event_types
-            if len(observers) == 0:
-                del self._observer_handles[event_type]
+def _ignore(*args, **kwargs):
+    pass
@@ -0,0 +1,117 @@
+class OccupancyStream (object):
+    """
+    A zone-wide feed of tile occupancy changes.
+
+    Tile.occupant reports every change here as (mob, old_tile, new_tile):
+    (mob, None, tile) when a mob claims a tile and (mob, tile, None) when it
+    lets one go. A walking mob claims its destination before leaving its
+    origin, so it briefly holds both.
+
+    Subscribers may ask for every change, only the changes touching a
+    rectangle of tiles, or only the changes made by one mob. Rectangle
+    subscriptions are bucketed on a coarse grid, so a change only has to be
+    checked against the subscriptions near it.
+    """
+
+    # Width and height, in tiles, of the grid cells rectangle subscriptions
+    # are bucketed by
+    BUCKET_SIZE = 16
+
+    class Subscription (object):
+        """Handle for a subscribe()'d callback"""
+        def __init__(self, stream, callback, rect, mob):
+            self._stream = stream
+            self.callback = callback
+            self.rect = rect
+            self.mob = mob
+
+        def cancel(self):
+            """Stops calling the callback"""
+            # noinspection PyProtectedMember
+            self._stream._unsubscribe(self)
+
+        def contains(self, coords):
+            (x, y, width, height) = self.rect
+            return x <= coords[0] < x + width and y <= coords[1] < y + height
+
+    def __init__(self):
+        # Subscriptions are kept in tuples which are replaced rather than
+        # modified, so a callback may subscribe or cancel during report()
+        self._global = ()
+        self._by_mob = {}
+        self._by_bucket = {}
+
+    def subscribe(self, callback, rect=None, mob=None):
+        """Calls callback(mob, old_tile, new_tile) for occupancy changes
+        :param callback: Function to call for each change
+        :param rect: Optional (x, y, width, height) rectangle of tiles. Only
+                     changes to tiles inside it are reported.
+        :param mob: Optional mob. Only its changes are reported.
+        :return: A Subscription which may be cancel()'ed
+        """
+        if rect is not None:
+            rect = tuple(rect)
+        subscription = OccupancyStream.Subscription(self, callback, rect, mob)
+
+        if mob is not None:
+            self._by_mob[mob] = self._by_mob.get(mob, ()) + (subscription,)
+        elif rect is not None:
+            for bucket in self._buckets(rect):
+                self._by_bucket[bucket] = self._by_bucket.get(bucket, ()) + (subscription,)
+        else:
+            self._global += (subscription,)
+
+        return subscription
+
+    def report(self, mob, old_tile, new_tile):
+        """Broadcasts an occupancy change to the interested subscribers"""
+        for subscription in self._global:
+            subscription.callback(mob, old_tile, new_tile)
+
+        if self._by_mob:
+            for subscription in self._by_mob.get(mob, ()):
+                if subscription.rect is None \
+                        or (old_tile is not None and subscription.contains(old_tile.coords)) \
+                        or (new_tile is not None and subscription.contains(new_tile.coords)):
+                    subscription.callback(mob, old_tile, new_tile)
+
+        if self._by_bucket:
+            notified = ()
+            for tile in (old_tile, new_tile):
+                if tile is None:
+                    continue
+                (x, y) = tile.coords
+                bucket = (x // OccupancyStream.BUCKET_SIZE, y // OccupancyStream.BUCKET_SIZE)
+                for subscription in self._by_bucket.get(bucket, ()):
+                    if subscription not in notified and subscription.contains(tile.coords):
+                        notified += (subscription,)
+                        subscription.callback(mob, old_tile, new_tile)
+
+    def _unsubscribe(self, subscription):
+        if subscription.mob is not None:
+            self._by_mob[subscription.mob] = self._remove(self._by_mob, subscription.mob, subscription)
+            if not self._by_mob[subscription.mob]:
+                del self._by_mob[subscription.mob]
+        elif subscription.rect is not None:
+            for bucket in self._buckets(subscription.rect):
+                if bucket in self._by_bucket:
+                    self._by_bucket[bucket] = self._remove(self._by_bucket, bucket, subscription)
+                    if not self._by_bucket[bucket]:
+                        del self._by_bucket[bucket]
+        else:
+            self._global = tuple(s for s in self._global if s is not subscription)
+
+    @staticmethod
+    def _remove(subscriptions, key, subscription):
+        return tuple(s for s in subscriptions.get(key, ()) if s is not subscription)
+
+    @staticmethod
+    def _buckets(rect):
+        """Grid cells overlapped by an (x, y, width, height) rectangle"""
+        (x, y, width, height) = rect
+        size = OccupancyStream.BUCKET_SIZE
+        return [
+            (bx, by)
+            for bx in range(x // size, (x + max(width, 1) - 1) // size + 1)
+            for by in range(y // size, (y + max(height, 1) - 1) // size + 1)
+        ]
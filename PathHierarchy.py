@@ -0,0 +1,352 @@
+"""
+Hierarchical pathfinding (HPA*) for zones too big to search tile by tile.
+"""
+
+import heapq
+
+import numpy
+
+from FlowField import distance_field, distance_fields
+from pathfinding import astar
+
+class PathHierarchy (object):
+    """
+    An abstract graph of a zone's walls for quick long-distance path planning.
+
+    The zone is split into square clusters. Wherever the tiles on both sides
+    of a border between two clusters are walkable, there's a transition
+    between them, and the tiles at either end of each transition are the
+    graph's nodes. Every pair of nodes in a cluster which can reach each
+    other is joined by an edge costing the shortest distance between them
+    inside the cluster.
+
+    Planning a path searches the graph instead of the zone, which gives a
+    list of waypoints no more than a cluster or so apart. Each leg is only
+    searched in detail (see refine()) when a mob is ready to walk it, and
+    only the clusters it passes through are searched, so mobs (which the
+    graph ignores) can be walked around then.
+
+    The hierarchy watches Zone.TERRAIN_CHANGE, and when a tile's walkable
+    flag changes only the clusters on either side of it are rebuilt. Every
+    cluster needs building at first, which takes seconds on a big zone, so
+    build() does it a slice at a time as a JobScheduler job; whatever is
+    left to rebuild when a path is planned is done then. Paths are usually
+    within a few percent of the shortest, but aren't guaranteed to be.
+
+    Get one from Zone.path_hierarchy().
+    """
+
+    # Width and height, in tiles, of each cluster
+    CLUSTER_SIZE = 16
+
+    # Zones with at least this many tiles are better off searched hierarchically
+    MIN_AREA = 128 * 128
+
+    # Border openings longer than this get a transition at each end instead
+    # of one in the middle
+    MAX_SINGLE_TRANSITION = 6
+
+    # Borders to find the transitions of in each slice of build(). Each is
+    # quick; building a cluster's edges takes a slice of its own.
+    BORDERS_PER_SLICE = 32
+
+    @staticmethod
+    def suits(zone):
+        """Whether a zone is big enough to be worth searching hierarchically"""
+        return zone.dimensions[0] * zone.dimensions[1] >= PathHierarchy.MIN_AREA
+
+    def __init__(self, zone, diagonal=False, cluster_size=CLUSTER_SIZE):
+        """
+        :param zone: The zone
+        :param diagonal: Allow diagonal steps within clusters. Transitions
+                         between clusters are always straight.
+        :param cluster_size: Width and height of each cluster, in tiles
+        """
+        self.zone = zone
+        self.diagonal = diagonal
+        self.cluster_size = cluster_size
+
+        (width, height) = zone.dimensions
+        self._clusters = (
+            (width + cluster_size - 1) // cluster_size,
+            (height + cluster_size - 1) // cluster_size,
+        )
+
+        self._walkable = zone.tile_storage.walkable_mask()
+        # Transitions across each border, by the pair of clusters it's
+        # between, as pairs of node coordinates
+        self._borders = {}
+        # The nodes on the other side of each node's transitions
+        self._partners = {}
+        # Nodes of each cluster
+        self._nodes = {}
+        # (neighbour, cost) pairs of every node, both within its cluster and
+        # across its transitions
+        self._adjacency = {}
+        # Borders whose transitions need finding again, and clusters whose
+        # edges need rebuilding. Borders go first, as they move nodes.
+        self._stale_borders = set()
+        self._stale_clusters = set()
+        for cx in range(self._clusters[0]):
+            for cy in range(self._clusters[1]):
+                self._mark_stale((cx, cy))
+
+        self._terrain_handle = zone.observe(zone.TERRAIN_CHANGE, self._on_terrain_change)
+
+    def close(self):
+        """Stops watching the zone"""
+        self._terrain_handle.cancel()
+
+    @property
+    def node_count(self):
+        self._update()
+        return len(self._partners)
+
+    def cluster_of(self, coords):
+        return coords[0] // self.cluster_size, coords[1] // self.cluster_size
+
+    def cluster_rect(self, cluster):
+        """(x, y, width, height) of a cluster's tiles"""
+        (width, height) = self.zone.dimensions
+        (x, y) = (cluster[0] * self.cluster_size, cluster[1] * self.cluster_size)
+        return x, y, min(self.cluster_size, width - x), min(self.cluster_size, height - y)
+
+    def plan(self, start, goal):
+        """Plans a path through the abstract graph
+        :param start: x/y coordinates to start from
+        :param goal: x/y coordinates to reach
+        :return: Coordinates of the waypoints after start, ending with goal,
+                 or None if the goal can't be reached
+        """
+        self._update()
+        (start, goal) = (tuple(start), tuple(goal))
+        if start == goal:
+            return []
+        if not self._walkable[goal[1], goal[0]]:
+            return None
+
+        # Temporarily join the start and goal to their clusters' nodes
+        start_edges = self._distances_in_cluster(start, self._nodes_of(start) | {goal})
+        goal_edges = self._distances_in_cluster(goal, self._nodes_of(goal))
+
+        diagonal_cost = 1.5 if self.diagonal else 2.0
+        def heuristic(coords):
+            dx = abs(coords[0] - goal[0])
+            dy = abs(coords[1] - goal[1])
+            return (dx if dx < dy else dy) * (diagonal_cost - 1.0) + (dx if dx > dy else dy)
+
+        # Open list entries are (estimated total cost, estimated remaining
+        # cost, node), like pathfinding.astar()
+        adjacency = self._adjacency
+        start_h = heuristic(start)
+        open_list = [(start_h, start_h, start)]
+        costs = {start: 0.0}
+        parents = {start: None}
+        closed = set()
+        while open_list:
+            (_, _, node) = heapq.heappop(open_list)
+            if node == goal:
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+
+            neighbours = adjacency.get(node, ())
+            if node == start:
+                neighbours = start_edges.items() + list(neighbours)
+            if node in goal_edges:
+                neighbours = list(neighbours) + [(goal, goal_edges[node])]
+
+            node_cost = costs[node]
+            for (neighbour, edge_cost) in neighbours:
+                cost = node_cost + edge_cost
+                if cost < costs.get(neighbour, float('inf')):
+                    costs[neighbour] = cost
+                    parents[neighbour] = node
+                    h = heuristic(neighbour)
+                    heapq.heappush(open_list, (cost + h, h, neighbour))
+        else:
+            return None
+
+        waypoints = []
+        node = goal
+        while node != start:
+            waypoints.append(node)
+            node = parents[node]
+        waypoints.reverse()
+        return waypoints
+
+    def refine(self, start, waypoint, ignore=(), mobs=True):
+        """Finds the steps from a tile to a waypoint of a plan()'d path,
+        around walls and mobs, searching only the clusters they're in
+        :param start: x/y coordinates to start from
+        :param waypoint: x/y coordinates to reach; usually in the same or
+                         the next cluster
+        :param ignore: Mobs which shouldn't be considered in the way
+        :param mobs: Consider mobs in the way at all
+        :return: Coordinates of each step after start, or None if the
+                 waypoint can't be reached that way
+        """
+        clusters = [self.cluster_of(start), self.cluster_of(waypoint)]
+        rects = [self.cluster_rect(cluster) for cluster in clusters]
+        x0 = min(x for (x, _, _, _) in rects)
+        y0 = min(y for (_, y, _, _) in rects)
+        x1 = max(x + width for (x, _, width, _) in rects)
+        y1 = max(y + height for (_, y, _, height) in rects)
+
+        blocked = ~self._walkable[y0:y1, x0:x1]
+        for mob in self.zone.mob_index.in_rect(x0, y0, x1 - x0, y1 - y0) if mobs else ():
+            if mob not in ignore and mob.tile is not None:
+                (x, y) = mob.tile.coords
+                if x0 <= x < x1 and y0 <= y < y1:
+                    blocked[y - y0, x - x0] = True
+        blocked[waypoint[1] - y0, waypoint[0] - x0] = not self._walkable[waypoint[1], waypoint[0]]
+
+        steps = astar(blocked, (start[0] - x0, start[1] - y0), (waypoint[0] - x0, waypoint[1] - y0), self.diagonal)
+        return None if steps is None else [(x + x0, y + y0) for (x, y) in steps]
+
+    def find_path(self, start, goal, ignore=()):
+        """Plans and refines a whole path at once; see plan() and refine()
+        :return: Coordinates of each step after start, or None
+        """
+        waypoints = self.plan(start, goal)
+        if waypoints is None:
+            return None
+        path = []
+        for waypoint in waypoints:
+            steps = self.refine(path[-1] if path else tuple(start), waypoint, ignore)
+            if steps is None:
+                return None
+            path += steps
+        return path
+
+    def _nodes_of(self, coords):
+        """Nodes of the cluster a tile is in"""
+        return self._nodes.get(self.cluster_of(coords), set())
+
+    def _distances_in_cluster(self, coords, targets):
+        """Costs of the shortest paths within a tile's cluster from the tile
+        to each of `targets` it can reach"""
+        cluster = self.cluster_of(coords)
+        (x, y, width, height) = self.cluster_rect(cluster)
+        distances = distance_field(
+            ~self._walkable[y:y + height, x:x + width],
+            (coords[0] - x, coords[1] - y),
+            self.diagonal,
+        )
+        costs = {}
+        for target in targets:
+            if self.cluster_of(target) == cluster:
+                distance = distances[target[1] - y, target[0] - x]
+                if distance != numpy.inf and target != coords:
+                    costs[target] = float(distance)
+        return costs
+
+    def build(self):
+        """Brings the hierarchy up to date a slice at a time, e.g. as a
+        JobScheduler job, so that planning doesn't have to. Walls may change
+        while it runs; it finishes once nothing is left to rebuild.
+        """
+        while True:
+            if self._stale_borders:
+                for _ in range(min(PathHierarchy.BORDERS_PER_SLICE, len(self._stale_borders))):
+                    self._rebuild_border(self._stale_borders.pop())
+            elif self._stale_clusters:
+                self._build_edges(self._stale_clusters.pop())
+            else:
+                return
+            yield
+
+    def _update(self):
+        """Rebuilds whatever is stale, all at once"""
+        for _ in self.build():
+            pass
+
+    def _mark_stale(self, cluster):
+        """Marks a cluster, and the borders around it, for rebuilding"""
+        self._stale_clusters.add(cluster)
+        (cx, cy) = cluster
+        for (nx, ny) in ((cx + 1, cy), (cx, cy + 1), (cx - 1, cy), (cx, cy - 1)):
+            if 0 <= nx < self._clusters[0] and 0 <= ny < self._clusters[1]:
+                self._stale_borders.add(tuple(sorted([(cx, cy), (nx, ny)])))
+
+    def _rebuild_border(self, border):
+        """Finds the transitions across a border again. The clusters on both
+        sides of it get new nodes, so their edges need rebuilding too."""
+        for (a, b) in self._borders.pop(border, ()):
+            self._remove_transition(a, b)
+        transitions = self._find_transitions(*border)
+        for (a, b) in transitions:
+            self._add_transition(a, b)
+        self._borders[border] = transitions
+        self._stale_clusters.update(border)
+
+    def _find_transitions(self, cluster_a, cluster_b):
+        """Pairs of node coordinates across the border between two
+        neighbouring clusters. cluster_a is above or left of cluster_b."""
+        (x, y, width, height) = self.cluster_rect(cluster_a)
+        if cluster_a[1] == cluster_b[1]:
+            # Side by side: the border is the column x + width - 1 | x + width
+            edge = x + width - 1
+            open_pairs = self._walkable[y:y + height, edge] & self._walkable[y:y + height, edge + 1]
+            pair = lambda offset: ((edge, y + offset), (edge + 1, y + offset))
+        else:
+            # One above the other: the border is the row y + height - 1 | y + height
+            edge = y + height - 1
+            open_pairs = self._walkable[edge, x:x + width] & self._walkable[edge + 1, x:x + width]
+            pair = lambda offset: ((x + offset, edge), (x + offset, edge + 1))
+
+        # Runs of open pairs, as [start, end) offsets along the border
+        changes = numpy.diff(numpy.concatenate(([0], open_pairs.astype(numpy.int8), [0]))).nonzero()[0]
+        transitions = []
+        for (start, end) in zip(changes[::2], changes[1::2]):
+            if end - start < PathHierarchy.MAX_SINGLE_TRANSITION:
+                transitions.append(pair((start + end - 1) // 2))
+            else:
+                transitions += [pair(start), pair(end - 1)]
+        return transitions
+
+    def _add_transition(self, a, b):
+        for (node, partner) in ((a, b), (b, a)):
+            self._partners.setdefault(node, []).append(partner)
+            self._nodes.setdefault(self.cluster_of(node), set()).add(node)
+
+    def _remove_transition(self, a, b):
+        for (node, partner) in ((a, b), (b, a)):
+            partners = self._partners[node]
+            partners.remove(partner)
+            if not partners:
+                del self._partners[node]
+                self._adjacency.pop(node, None)
+                nodes = self._nodes[self.cluster_of(node)]
+                nodes.discard(node)
+                if not nodes:
+                    del self._nodes[self.cluster_of(node)]
+
+    def _build_edges(self, cluster):
+        """Finds the costs between every pair of a cluster's nodes, and
+        rebuilds their adjacency"""
+        nodes = sorted(self._nodes.get(cluster, ()))
+        (x, y, width, height) = self.cluster_rect(cluster)
+        distances = distance_fields(
+            ~self._walkable[y:y + height, x:x + width],
+            [(node_x - x, node_y - y) for (node_x, node_y) in nodes],
+            self.diagonal,
+        )
+        for (node, node_distances) in zip(nodes, distances):
+            costs = [(other, float(node_distances[other[1] - y, other[0] - x])) for other in nodes]
+            self._adjacency[node] = [
+                (other, cost) for (other, cost) in costs
+                if other != node and cost != numpy.inf
+            ] + [(partner, 1.0) for partner in self._partners[node]]
+
+    def _on_terrain_change(self, tile):
+        (x, y) = tile.coords
+        walkable = tile.walkable
+        if self._walkable[y, x] == walkable:
+            return
+        self._walkable[y, x] = walkable
+
+        # Rebuilding the tile's cluster also rebuilds the transitions of any
+        # border it's on, and the clusters on the other side
+        self._mark_stale(self.cluster_of((x, y)))
@@ -0,0 +1,159 @@
+"""
+Path searches run in a pool of worker processes, so that bursts of them
+don't stall the game.
+"""
+
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+import numpy
+
+from pathfinding import astar
+
+# The zone's walkability grid, in each worker process. See _init_worker().
+_worker_blocked = None
+
+def _init_worker(shared_blocked, dimensions):
+    global _worker_blocked
+    (width, height) = dimensions
+    _worker_blocked = numpy.frombuffer(shared_blocked, dtype=numpy.uint8).reshape(height, width)
+
+def _find_paths(requests):
+    """Runs a batch of (start, goal, diagonal) searches in a worker
+    :return: The path of each, as from pathfinding.astar()
+    """
+    blocked = _worker_blocked.astype(bool)
+    return [astar(blocked, start, goal, diagonal) for (start, goal, diagonal) in requests]
+
+class PathService (object):
+    """
+    Finds paths around a zone's walls in a pool of worker processes.
+
+    The zone's walkability is kept in shared memory, one byte per tile,
+    which the workers read directly; only coordinates go back and forth.
+    Requests made during a tick are sent to the workers in one batch the
+    next time the service polls, which it does every POLL_INTERVAL of zone
+    time while any are outstanding, and results are handed to the
+    requesters' callbacks on the first poll after they're ready. Callbacks
+    always run on the main thread, from the zone's timed event dispatcher.
+
+    Searches only avoid walls, not mobs; the directives walking the paths
+    deal with those as they come to them.
+
+    Start one with Zone.start_path_service().
+    """
+
+    # Zone time between checks for finished searches
+    POLL_INTERVAL = 1 / 60.0
+
+    class Request (object):
+        """Handle for a request()'ed path"""
+        def __init__(self, start, goal, diagonal, callback):
+            self.start = start
+            self.goal = goal
+            self.diagonal = diagonal
+            self.callback = callback
+
+        def cancel(self):
+            """Drops the result when it comes"""
+            self.callback = None
+
+        @property
+        def is_cancelled(self):
+            return self.callback is None
+
+    def __init__(self, zone, workers=None):
+        """
+        :param zone: The zone
+        :param workers: Number of worker processes. Defaults to the number
+                        of CPUs.
+        """
+        self.zone = zone
+        self.workers = workers or multiprocessing.cpu_count()
+
+        (width, height) = zone.dimensions
+        self._blocked = RawArray('B', width * height)
+        numpy.frombuffer(self._blocked, dtype=numpy.uint8)[:] = \
+            ~zone.tile_storage.walkable_mask().ravel()
+        self._pool = multiprocessing.Pool(self.workers, _init_worker, (self._blocked, zone.dimensions))
+
+        # Requests not sent to the workers yet, and (requests, AsyncResult)
+        # batches which have been
+        self._queued = []
+        self._running = []
+        self._poll_event = None
+
+        self._terrain_handle = zone.observe(zone.TERRAIN_CHANGE, self._on_terrain_change)
+
+    def close(self):
+        """Stops the workers. Outstanding requests are never answered."""
+        self._terrain_handle.cancel()
+        if self._poll_event is not None:
+            self._poll_event.cancel()
+            self._poll_event = None
+        self._pool.terminate()
+        self._pool.join()
+        self._queued = []
+        self._running = []
+
+    def __len__(self):
+        """Number of requests not answered yet"""
+        return len(self._queued) + sum(len(requests) for (requests, _) in self._running)
+
+    def request(self, start, goal, diagonal, callback):
+        """Asks for a path to be found
+        :param start: Tile or x/y coordinates to start from
+        :param goal: Tile or x/y coordinates to reach
+        :param diagonal: Allow diagonal moves
+        :param callback: Called as callback(path) on a later tick, where
+                         path lists the coordinates of each step after start,
+                         ending with goal, or is None if there's no way there
+        :return: A Request, which may be cancel()'ed
+        """
+        request = PathService.Request(
+            tuple(getattr(start, 'coords', start)),
+            tuple(getattr(goal, 'coords', goal)),
+            diagonal,
+            callback,
+        )
+        self._queued.append(request)
+        self._schedule_poll()
+        return request
+
+    def poll(self):
+        """Sends queued requests to the workers and delivers finished
+        results. Called regularly while there are outstanding requests."""
+        self._poll_event = None
+
+        running = []
+        for (requests, result) in self._running:
+            if not result.ready():
+                running.append((requests, result))
+                continue
+            for (request, path) in zip(requests, [path for batch in result.get() for path in batch]):
+                if not request.is_cancelled:
+                    (callback, request.callback) = (request.callback, None)
+                    callback(path)
+        self._running = running
+
+        queued = [request for request in self._queued if not request.is_cancelled]
+        self._queued = []
+        if queued:
+            # One batch per worker
+            size = (len(queued) + self.workers - 1) // self.workers
+            batches = [
+                [(request.start, request.goal, request.diagonal) for request in queued[i:i + size]]
+                for i in range(0, len(queued), size)
+            ]
+            self._running.append((queued, self._pool.map_async(_find_paths, batches, chunksize=1)))
+
+        if self._running or self._queued:
+            self._schedule_poll()
+
+    def _schedule_poll(self):
+        if self._poll_event is None:
+            self._poll_event = self.zone.timed_event_dispatcher.add(PathService.POLL_INTERVAL, self.poll)
+
+    def _on_terrain_change(self, tile):
+        (x, y) = tile.coords
+        self._blocked[y * self.zone.dimensions[0] + x] = 0 if tile.walkable else 1
@@ -0,0 +1,213 @@
+"""
+Patrol circuits compiled into paths once and shared by every mob walking them.
+"""
+
+import collections
+
+import numpy
+
+from pathfinding import astar
+from util import distance, removeAdjacentDuplicates
+
+class PatrolRoute (object):
+    """
+    The tiles of a patrol circuit: the paths around the walls from each
+    waypoint to the next, and from the last back to the first.
+
+    Paths are found once, ignoring mobs, so following the route is just a
+    matter of looking up the next tile. Mobs in the way are dealt with by
+    detour(), which only searches the few tiles around them.
+
+    Routes are shared; get them from Zone.patrol_routes.
+    """
+
+    # How many tiles ahead along the route a detour may rejoin it
+    DETOUR_LENGTH = 8
+
+    # Margin, in tiles, around a detour's ends within which it may wander
+    DETOUR_MARGIN = 2
+
+    def __init__(self, zone, waypoints, diagonal=False):
+        """
+        :param zone: The zone
+        :param waypoints: x/y coordinates of the waypoints, in order
+        :param diagonal: Allow diagonal steps
+        """
+        self.zone = zone
+        self.diagonal = diagonal
+
+        waypoints = removeAdjacentDuplicates([tuple(waypoint) for waypoint in waypoints])
+        if len(waypoints) > 1 and waypoints[0] == waypoints[-1]:
+            waypoints.pop()
+        self.waypoints = waypoints
+
+        # legs[i] runs from waypoints[i] to the next waypoint, both included,
+        # or is None if there's no way through
+        blocked = ~zone.tile_storage.walkable_mask()
+        self.legs = []
+        for (i, waypoint) in enumerate(waypoints):
+            following = waypoints[(i + 1) % len(waypoints)]
+            path = astar(blocked, waypoint, following, diagonal)
+            self.legs.append(None if path is None else [waypoint] + path)
+
+        # Where each tile first appears on the route, as (leg, index)
+        self._positions = {}
+        for (leg, path) in reversed(list(enumerate(self.legs))):
+            for (index, coords) in reversed(list(enumerate(path or ()))):
+                self._positions[coords] = (leg, index)
+
+        # Tiles beside each diagonal step, which must stay open for the step
+        # to be allowed (see astar())
+        self._corners = set()
+        for path in self.legs:
+            for ((x0, y0), (x1, y1)) in zip(path or (), (path or ())[1:]):
+                if x0 != x1 and y0 != y1:
+                    self._corners.update([(x0, y1), (x1, y0)])
+
+        # Cost of each leg, as astar() counts it, or None if there's no way
+        # through
+        self._costs = [
+            None if path is None else sum(
+                self._distance(a, b) for (a, b) in zip(path, path[1:]))
+            for path in self.legs
+        ]
+
+    def is_affected_by(self, coords, walkable):
+        """Whether a change to a tile's walkability may change the route
+        :param coords: x/y coordinates of the tile
+        :param walkable: Whether the tile is walkable now
+        """
+        if not walkable:
+            # Only a path through the tile, or cutting its corner, can be
+            # cut by it
+            coords = tuple(coords)
+            return coords in self._positions or coords in self._corners
+        # Opening a tile can make a way through where there was none, or a
+        # shortcut through it, or past its corner with a diagonal step from
+        # one of its sides to another. No path through a tile is shorter than
+        # the straight-line distances to it and on from it, so a leg at
+        # least that short already can't be bettered.
+        (x, y) = coords
+        via = [(x, y)]
+        if self.diagonal:
+            via += [(x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)]
+        return any(
+            cost is None or
+            any(self._distance(path[0], tile) + self._distance(tile, path[-1]) < cost for tile in via)
+            for (path, cost) in zip(self.legs, self._costs)
+        )
+
+    def _distance(self, a, b):
+        """Cost of the shortest conceivable path between two tiles, ignoring
+        walls: util.distance(), or dx + dy without diagonal steps"""
+        if self.diagonal:
+            return distance(a, b)
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def locate(self, coords, leg=None):
+        """Finds a tile on the route
+        :param coords: x/y coordinates of the tile
+        :param leg: Leg to look on first
+        :return: (leg, index) of the tile, or None if it isn't on the route
+        """
+        if leg is not None and self.legs[leg] is not None and coords in self.legs[leg]:
+            return leg, self.legs[leg].index(coords)
+        return self._positions.get(coords)
+
+    def detour(self, mob, leg, index):
+        """Finds a way around the mobs in the way of a mob on the route
+        :param mob: The mob
+        :param leg: Leg of the route the mob is on
+        :param index: How far along the leg the mob has got. The detour
+                      rejoins the route further along than this.
+        :return: (steps, index) where steps are the coordinates of each step
+                 after the mob's tile and index is where the last step is on
+                 the leg, or None if there's no way around for now
+        """
+        path = self.legs[leg]
+        here = mob.tile.coords
+        ahead = range(index + 2, min(index + 2 + PatrolRoute.DETOUR_LENGTH, len(path)))
+
+        (x0, y0, x1, y1) = (here[0], here[1], here[0] + 1, here[1] + 1)
+        for i in ahead:
+            (x, y) = path[i]
+            (x0, y0, x1, y1) = (min(x0, x), min(y0, y), max(x1, x + 1), max(y1, y + 1))
+        margin = PatrolRoute.DETOUR_MARGIN
+        (x0, y0, width, height) = self.zone.tiles.clip_rect(
+            x0 - margin, y0 - margin, x1 - x0 + 2 * margin, y1 - y0 + 2 * margin)
+
+        blocked = numpy.array(
+            [not tile.walkable for tile in self.zone.tiles.rect(x0, y0, width, height)], dtype=bool
+        ).reshape(height, width)
+        for other in self.zone.mob_index.in_rect(x0, y0, width, height):
+            if other is not mob and other.tile is not None:
+                (x, y) = other.tile.coords
+                if x0 <= x < x0 + width and y0 <= y < y0 + height:
+                    blocked[y - y0, x - x0] = True
+
+        # Rejoin at the first free tile past the ones in the way
+        for i in ahead:
+            (x, y) = path[i]
+            if not blocked[y - y0, x - x0] and (x, y) != here:
+                steps = astar(blocked, (here[0] - x0, here[1] - y0), (x - x0, y - y0), self.diagonal)
+                if steps is None:
+                    return None
+                return [(x + x0, y + y0) for (x, y) in steps], i
+        return None
+
+class PatrolRoutes (object):
+    """
+    A zone's cache of patrol routes, keyed by waypoints and whether diagonal
+    steps are allowed. The least recently used routes are dropped once
+    there are more than `max_routes`. When a tile's walkability changes,
+    the routes it may affect are dropped (see PatrolRoute.is_affected_by());
+    other terrain changes, e.g. to transparency, are ignored.
+    """
+
+    # Routes to keep per zone
+    MAX_ROUTES = 64
+
+    def __init__(self, zone, max_routes=MAX_ROUTES):
+        self._zone = zone
+        self._max_routes = max_routes
+        self._routes = collections.OrderedDict()
+        # Walkability of every tile, indexed [y, x], loaded with the first
+        # route, to tell which terrain changes are to walkability
+        self._walkable = None
+        zone.observe(zone.TERRAIN_CHANGE, self._on_terrain_change)
+
+    def __len__(self):
+        return len(self._routes)
+
+    def route(self, waypoints, diagonal=False):
+        """Gets the route around some waypoints, compiling it if necessary
+        :param waypoints: The waypoint tiles, or their x/y coordinates
+        :param diagonal: Allow diagonal steps
+        """
+        key = (tuple(tuple(getattr(waypoint, 'coords', waypoint)) for waypoint in waypoints), diagonal)
+        route = self._routes.pop(key, None)
+        if route is None:
+            if self._walkable is None:
+                self._walkable = self._zone.tile_storage.walkable_mask()
+            route = PatrolRoute(self._zone, key[0], diagonal)
+        self._routes[key] = route
+
+        while len(self._routes) > self._max_routes:
+            self._routes.popitem(last=False)
+        return route
+
+    def clear(self):
+        """Drops every cached route"""
+        self._routes.clear()
+
+    def _on_terrain_change(self, tile):
+        if self._walkable is None:
+            return
+        (x, y) = tile.coords
+        walkable = tile.walkable
+        if self._walkable[y, x] == walkable:
+            return
+        self._walkable[y, x] = walkable
+        for key in [key for (key, route) in self._routes.iteritems()
+                    if route.is_affected_by(tile.coords, walkable)]:
+            del self._routes[key]
@@ -20,6 +20,12 @@ class Tile (Observable):
     class OwnershipException (Exception):
         pass
 
+    # Terrain flags. Overridden per tile by assignment. Changes to walkable
+    # and transparent are reported to the zone (see Zone.TERRAIN_CHANGE).
+    _walkable = True
+    _transparent = True
+    seen = False
+
     def __init__(self, zone, coords, sprite=None):
         super(Tile, self).__init__()
 
@@ -53,22 +59,50 @@ class Tile (Observable):
             # Vacating tile (Mob -> None)
             else:
                 previous, self._occupant = self._occupant, None
+                self.zone.occupancy.report(previous, self, None)
                 self.notify(Tile.VACATE, self, previous)
         # Claiming tile (None -> Mob)
         else:
             self._occupant = occupant
+            self.zone.occupancy.report(occupant, None, self)
             self.notify(Tile.OCCUPY, self)
 
+    @property
+    def walkable(self):
+        return self._walkable
+
+    @walkable.setter
+    def walkable(self, walkable):
+        if walkable != self._walkable:
+            self._walkable = walkable
+            self.zone.report_terrain_change(self)
+
+    @property
+    def transparent(self):
+        return self._transparent
+
+    @transparent.setter
+    def transparent(self, transparent):
+        if transparent != self._transparent:
+            self._transparent = transparent
+            self.zone.report_terrain_change(self)
+
     @property
     def coords(self):
         return self._coords
 
     def get_relative_tile(self, rel_coords):
-        abs_coords = vec_add(self.coords, rel_coords)
-        if abs_coords in self.zone.tiles:
-            return self.zone.tiles[abs_coords]
+        x = self._coords[0] + rel_coords[0]
+        y = self._coords[1] + rel_coords[1]
+        (width, height) = self.zone.dimensions
+        if 0 <= x < width and 0 <= y < height:
+            return self.zone.tile_storage.tile_at(x, y)
         else:
             return None
 
+    def neighbours(self, diagonal=False):
+        """Lists the adjacent tiles inside the zone; see Zone.TilesDelegate.neighbours()"""
+        return self.zone.tiles.neighbours(self._coords, diagonal)
+
     def __repr__(self):
         return 'Tile(coords={}, occupant={}, ...)'.format(self.coords, self.occupant)
@@ -0,0 +1,600 @@
+"""
+Storage engines for a Zone's tiles.
+
+A zone asks its storage for tiles by coordinate and never looks at how they
+are kept. Three layouts are available:
+
+- ObjectTileStorage keeps a full Tile object for every tile. It's simple and
+  fast for small zones, but every tile is an Observable with its own
+  attribute dict, so it takes hundreds of bytes per tile.
+- ArrayTileStorage keeps tile data in NumPy arrays (occupant id, sprite id and
+  flags) and hands out lightweight Tile views on demand. A 1000x1000 zone
+  takes a few MB.
+- ChunkedTileStorage splits those arrays into square chunks which are loaded
+  from disk as they're needed and evicted again under a memory budget, so
+  zones can be far larger than memory.
+
+All three take (zone, dimensions) in their constructors, so any of them
+may be passed to Zone as its `tile_storage`.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy
+
+from Tile import Tile
+
+# Tile flag bits, as stored by ArrayTileStorage
+WALKABLE = 1
+TRANSPARENT = 2
+SEEN = 4
+
+DEFAULT_FLAGS = WALKABLE | TRANSPARENT
+
+SPRITE_ID_TYPE = numpy.uint16
+
+class ObjectTileStorage (object):
+    """Keeps a Tile object for every tile of the zone"""
+
+    def __init__(self, zone, dimensions):
+        self._dimensions = tuple(dimensions)
+        self._rows = [
+            [Tile(zone=zone, coords=(x, y)) for x in range(dimensions[0])]
+            for y in range(dimensions[1])
+        ]
+
+    def tile_at(self, x, y):
+        return self._rows[y][x]
+
+    def __iter__(self):
+        for row in self._rows:
+            for tile in row:
+                yield tile
+
+    def rect(self, x, y, width, height):
+        """Lists the tiles in a rectangle which lies inside the zone"""
+        return [tile for row in self._rows[y:y + height] for tile in row[x:x + width]]
+
+    def fill(self, sprite):
+        """Sets the sprite of every tile"""
+        for tile in self:
+            tile.sprite = sprite
+
+    def prefetch(self, x, y, width, height):
+        """Hint that the tiles in a rectangle will be needed soon. Every tile
+        is always in memory, so this does nothing."""
+
+    def trim(self):
+        """Frees what memory it can, e.g. while the zone is dormant. Every
+        tile is always in memory, so this does nothing."""
+
+    def walkable_mask(self):
+        """Boolean array, indexed [y, x], of the tiles mobs may walk on"""
+        return numpy.array([[tile.walkable for tile in row] for row in self._rows], dtype=bool)
+
+    def transparent_mask(self):
+        """Boolean array, indexed [y, x], of the tiles mobs can see through"""
+        return numpy.array([[tile.transparent for tile in row] for row in self._rows], dtype=bool)
+
+    def occupied_mask(self):
+        """Boolean array, indexed [y, x], of the tiles which have an occupant"""
+        return numpy.array([[tile.occupant is not None for tile in row] for row in self._rows], dtype=bool)
+
+class ArrayTile (Tile):
+    """
+    A view of one tile of an ArrayTileStorage.
+
+    Views are created on demand and reused for as long as anything refers to
+    them, so `zone.tiles[coords] is zone.tiles[coords]` holds while the tile
+    is in use. A view with observers is kept alive by its storage so that its
+    observers aren't lost.
+    """
+
+    def __init__(self, zone, coords, storage):
+        # Tile.__init__() would try to store a sprite and occupant, which
+        # live in the storage's arrays instead
+        super(Tile, self).__init__()
+
+        self.zone = zone
+        self._coords = coords
+        self._storage = storage
+
+    @property
+    def _occupant(self):
+        return self._storage.occupant_at(*self._coords)
+
+    @_occupant.setter
+    def _occupant(self, occupant):
+        # noinspection PyProtectedMember
+        self._storage._set_occupant(self, occupant)
+
+    @property
+    def sprite(self):
+        return self._storage.sprite_at(*self._coords)
+
+    @sprite.setter
+    def sprite(self, sprite):
+        self._storage.set_sprite(self._coords[0], self._coords[1], sprite)
+
+    @property
+    def walkable(self):
+        return self._storage.has_flag(self._coords[0], self._coords[1], WALKABLE)
+
+    @walkable.setter
+    def walkable(self, walkable):
+        if bool(walkable) != self.walkable:
+            self._storage.set_flag(self._coords[0], self._coords[1], WALKABLE, walkable)
+            self.zone.report_terrain_change(self)
+
+    @property
+    def transparent(self):
+        return self._storage.has_flag(self._coords[0], self._coords[1], TRANSPARENT)
+
+    @transparent.setter
+    def transparent(self, transparent):
+        if bool(transparent) != self.transparent:
+            self._storage.set_flag(self._coords[0], self._coords[1], TRANSPARENT, transparent)
+            self.zone.report_terrain_change(self)
+
+    @property
+    def seen(self):
+        return self._storage.has_flag(self._coords[0], self._coords[1], SEEN)
+
+    @seen.setter
+    def seen(self, seen):
+        self._storage.set_flag(self._coords[0], self._coords[1], SEEN, seen)
+
+    def observe(self, event_type, callback, limit=float('inf'), weak=False):
+        handle = super(ArrayTile, self).observe(event_type, callback, limit, weak)
+        # noinspection PyProtectedMember
+        self._storage._pinned[self._coords] = self
+        return handle
+
+    def _set_observers(self, event_type, observers):
+        super(ArrayTile, self)._set_observers(event_type, observers)
+        if not self._observer_handles:
+            # noinspection PyProtectedMember
+            self._storage._pinned.pop(self._coords, None)
+
+class _ViewRef (weakref.ref):
+    """Weak reference to a tile view which remembers the view's coordinates"""
+    __slots__ = ('coords',)
+
+class ArrayTileStorage (object):
+    """
+    Keeps tile data in NumPy arrays indexed [y, x]:
+
+    - occupant_ids: Index into a table of occupants, or 0 if unoccupied
+    - sprite_ids: Index into a table of sprites, or 0 for no sprite
+    - flags: WALKABLE, TRANSPARENT and SEEN bits
+
+    The arrays are public so that bulk operations (masks for pathfinding,
+    filling in terrain, etc.) can work on the whole zone at once.
+    """
+
+    def __init__(self, zone, dimensions):
+        self._zone = zone
+        self._dimensions = tuple(dimensions)
+        shape = (dimensions[1], dimensions[0])
+
+        self.occupant_ids = numpy.zeros(shape, dtype=numpy.int32)
+        self.sprite_ids = numpy.zeros(shape, dtype=SPRITE_ID_TYPE)
+        self.flags = numpy.full(shape, DEFAULT_FLAGS, dtype=numpy.uint8)
+
+        self._init_tables()
+
+    def _init_tables(self):
+        # Occupant table. A mob may occupy more than one tile (e.g. while
+        # walking between two), so each id counts the tiles referring to it.
+        self._occupants = [None]
+        self._occupant_refcounts = [0]
+        self._occupant_ids = {}
+        self._free_occupant_ids = []
+
+        # Sprite table. Sprites are never removed from it; zones only use a
+        # handful.
+        self._sprites = [None]
+        self._sprite_ids = {None: 0}
+
+        # Weak references to the tile views currently in use, and views which
+        # must stay in use because something is observing them.
+        # (WeakValueDictionary would do, but it's several times slower.)
+        self._views = {}
+        self._pinned = {}
+
+    def tile_at(self, x, y):
+        coords = (x, y)
+        ref = self._views.get(coords)
+        view = None if ref is None else ref()
+        if view is None:
+            if not (0 <= x < self._dimensions[0] and 0 <= y < self._dimensions[1]):
+                raise IndexError('Tile {} is out of bounds'.format(coords))
+            view = ArrayTile(self._zone, coords, self)
+            ref = self._views[coords] = _ViewRef(view, self._forget_view)
+            ref.coords = coords
+        return view
+
+    def __iter__(self):
+        for y in xrange(self._dimensions[1]):
+            for x in xrange(self._dimensions[0]):
+                yield self.tile_at(x, y)
+
+    def rect(self, x, y, width, height):
+        """Lists the tiles in a rectangle which lies inside the zone"""
+        tile_at = self.tile_at
+        return [tile_at(i, j) for j in xrange(y, y + height) for i in xrange(x, x + width)]
+
+    def fill(self, sprite):
+        """Sets the sprite of every tile"""
+        self.sprite_ids.fill(self._sprite_id(sprite))
+
+    def prefetch(self, x, y, width, height):
+        """Hint that the tiles in a rectangle will be needed soon. Every tile
+        is always in memory, so this does nothing."""
+
+    def trim(self):
+        """Frees what memory it can, e.g. while the zone is dormant. Every
+        tile is always in memory, so this does nothing."""
+
+    def walkable_mask(self):
+        """Boolean array, indexed [y, x], of the tiles mobs may walk on"""
+        return (self.flags & WALKABLE) != 0
+
+    def transparent_mask(self):
+        """Boolean array, indexed [y, x], of the tiles mobs can see through"""
+        return (self.flags & TRANSPARENT) != 0
+
+    def occupied_mask(self):
+        """Boolean array, indexed [y, x], of the tiles which have an occupant"""
+        return self.occupant_ids != 0
+
+    def occupant_at(self, x, y):
+        return self._occupants[self.occupant_ids[y, x]]
+
+    def sprite_at(self, x, y):
+        return self._sprites[self.sprite_ids[y, x]]
+
+    def set_sprite(self, x, y, sprite):
+        self.sprite_ids[y, x] = self._sprite_id(sprite)
+
+    def has_flag(self, x, y, flag):
+        return bool(self.flags[y, x] & flag)
+
+    def set_flag(self, x, y, flag, value):
+        if value:
+            self.flags[y, x] |= flag
+        else:
+            self.flags[y, x] &= ~flag & 0xff
+
+    def _forget_view(self, ref):
+        """Drops a collected view's entry, unless it has been replaced already"""
+        if self._views.get(ref.coords) is ref:
+            del self._views[ref.coords]
+
+    def _sprite_id(self, sprite):
+        sprite_id = self._sprite_ids.get(sprite)
+        if sprite_id is None:
+            sprite_id = self._sprite_ids[sprite] = len(self._sprites)
+            self._sprites.append(sprite)
+            assert sprite_id <= numpy.iinfo(SPRITE_ID_TYPE).max, 'Too many sprites in one zone'
+        return sprite_id
+
+    def _set_occupant(self, tile, occupant):
+        """Backs the Tile.occupant setter of the views"""
+        (x, y) = tile.coords
+        old_id = self.occupant_ids[y, x]
+
+        if self._occupants[old_id] is occupant:
+            return
+
+        if old_id:
+            self._release_occupant_id(old_id)
+
+        self.occupant_ids[y, x] = 0 if occupant is None else self._acquire_occupant_id(occupant)
+
+    def _acquire_occupant_id(self, occupant):
+        occupant_id = self._occupant_ids.get(occupant)
+        if occupant_id is None:
+            if self._free_occupant_ids:
+                occupant_id = self._free_occupant_ids.pop()
+                self._occupants[occupant_id] = occupant
+            else:
+                occupant_id = len(self._occupants)
+                self._occupants.append(occupant)
+                self._occupant_refcounts.append(0)
+            self._occupant_ids[occupant] = occupant_id
+        self._occupant_refcounts[occupant_id] += 1
+        return occupant_id
+
+    def _release_occupant_id(self, occupant_id):
+        self._occupant_refcounts[occupant_id] -= 1
+        if self._occupant_refcounts[occupant_id] == 0:
+            del self._occupant_ids[self._occupants[occupant_id]]
+            self._occupants[occupant_id] = None
+            self._free_occupant_ids.append(occupant_id)
+
+class _Chunk (object):
+    """The tile data of one chunk of a ChunkedTileStorage, indexed [y, x]"""
+    __slots__ = ('key', 'occupant_ids', 'sprite_ids', 'flags', 'occupied', 'dirty', 'last_used')
+
+    # Bytes of tile data per tile
+    BYTES_PER_TILE = 4 + 2 + 1
+
+    def __init__(self, key, size):
+        self.key = key
+        self.occupant_ids = numpy.zeros((size, size), dtype=numpy.int32)
+        self.sprite_ids = numpy.zeros((size, size), dtype=SPRITE_ID_TYPE)
+        self.flags = numpy.full((size, size), DEFAULT_FLAGS, dtype=numpy.uint8)
+        # Number of occupied tiles. Occupants can't be saved, so chunks with
+        # any are never evicted.
+        self.occupied = 0
+        self.dirty = False
+        self.last_used = 0
+
+class ChunkedTileStorage (ArrayTileStorage):
+    """
+    Keeps tile data in square chunks of NumPy arrays, which are loaded from
+    `directory` when a tile in them is first used and saved back (if
+    changed) when evicted to stay within `memory_budget`. Chunks which were
+    never saved start out blank, with the sprite last passed to fill().
+
+    Chunks are evicted least recently used first. Chunks holding an occupant
+    or a tile with observers stay in memory, so mobs, their walking actions
+    and the zone's timed events carry on across chunk boundaries.
+
+    Chunk files store sprites by their index in the storage's sprite table.
+    To reopen a directory in a later session, pass the same `sprites`, in the
+    same order (e.g. loaded from a list of names).
+    """
+
+    CHUNK_SIZE = 64
+    MEMORY_BUDGET = 64 * 2 ** 20
+
+    def __init__(self, zone, dimensions, directory=None, chunk_size=CHUNK_SIZE,
+                 memory_budget=MEMORY_BUDGET, sprites=()):
+        """
+        :param zone: The zone the tiles belong to
+        :param dimensions: Width and height of the zone, in tiles
+        :param directory: Where to keep chunk files. By default, a temporary
+                          directory which is deleted on exit.
+        :param chunk_size: Width and height of each chunk, in tiles
+        :param memory_budget: Approximate maximum bytes of tile data to keep
+                              loaded
+        :param sprites: Sprites which saved chunks refer to, in order
+        """
+        self._zone = zone
+        self._dimensions = tuple(dimensions)
+        self._init_tables()
+
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='zone-chunks-')
+            atexit.register(shutil.rmtree, directory, True)
+        self._directory = directory
+
+        self._chunk_size = chunk_size
+        self._max_chunks = max(4, memory_budget // (chunk_size ** 2 * _Chunk.BYTES_PER_TILE))
+        self._chunks = {}
+        self._clock = 0
+
+        for sprite in sprites:
+            self._sprite_id(sprite)
+
+        # Sprite of chunks which have never been saved. Chunks saved before
+        # the latest fill() are refilled as they're loaded.
+        self._fill_sprite_id = 0
+        self._fill_generation = 0
+        if os.path.exists(self._metadata_path()):
+            saved = numpy.load(self._metadata_path())
+            try:
+                self._fill_sprite_id = int(saved['fill_sprite_id'])
+                self._fill_generation = int(saved['fill_generation'])
+            finally:
+                saved.close()
+
+        self.loads = 0
+        self.saves = 0
+        self.evictions = 0
+
+        zone.occupancy.subscribe(self._on_occupancy_change)
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @property
+    def loaded_chunks(self):
+        return len(self._chunks)
+
+    def fill(self, sprite):
+        """Sets the sprite of every tile"""
+        self._fill_sprite_id = self._sprite_id(sprite)
+        self._fill_generation += 1
+        for chunk in self._chunks.itervalues():
+            chunk.sprite_ids.fill(self._fill_sprite_id)
+            chunk.dirty = True
+
+    def prefetch(self, x, y, width, height):
+        """Loads the chunks overlapping a rectangle, e.g. around the camera"""
+        size = self._chunk_size
+        (zone_width, zone_height) = self._dimensions
+        for cy in xrange(max(y, 0) // size, (min(y + height, zone_height) - 1) // size + 1):
+            for cx in xrange(max(x, 0) // size, (min(x + width, zone_width) - 1) // size + 1):
+                self._chunk(cx * size, cy * size)
+
+    def trim(self):
+        """Saves and unloads every chunk that may be evicted, e.g. while the
+        zone is dormant"""
+        self._evict(keep=None, target=0)
+
+    def save(self):
+        """Writes every changed chunk to disk"""
+        for chunk in self._chunks.itervalues():
+            if chunk.dirty:
+                self._save(chunk)
+        numpy.savez(self._metadata_path(),
+                    fill_sprite_id=self._fill_sprite_id,
+                    fill_generation=self._fill_generation)
+
+    def walkable_mask(self):
+        """Boolean array, indexed [y, x], of the tiles mobs may walk on.
+        This visits every chunk, so it's slow for huge zones."""
+        return self._assemble(lambda chunk: (chunk.flags & WALKABLE) != 0, bool)
+
+    def transparent_mask(self):
+        """Boolean array, indexed [y, x], of the tiles mobs can see through.
+        This visits every chunk, so it's slow for huge zones."""
+        return self._assemble(lambda chunk: (chunk.flags & TRANSPARENT) != 0, bool)
+
+    def occupied_mask(self):
+        """Boolean array, indexed [y, x], of the tiles which have an occupant"""
+        mask = numpy.zeros((self._dimensions[1], self._dimensions[0]), dtype=bool)
+        size = self._chunk_size
+        # Unloaded chunks can't have occupants
+        for chunk in self._chunks.values():
+            if chunk.occupied:
+                (cx, cy) = chunk.key
+                part = mask[cy * size:(cy + 1) * size, cx * size:(cx + 1) * size]
+                part[...] = chunk.occupant_ids[:part.shape[0], :part.shape[1]] != 0
+        return mask
+
+    def occupant_at(self, x, y):
+        size = self._chunk_size
+        return self._occupants[self._chunk(x, y).occupant_ids[y % size, x % size]]
+
+    def sprite_at(self, x, y):
+        size = self._chunk_size
+        return self._sprites[self._chunk(x, y).sprite_ids[y % size, x % size]]
+
+    def set_sprite(self, x, y, sprite):
+        size = self._chunk_size
+        chunk = self._chunk(x, y)
+        chunk.sprite_ids[y % size, x % size] = self._sprite_id(sprite)
+        chunk.dirty = True
+
+    def has_flag(self, x, y, flag):
+        size = self._chunk_size
+        return bool(self._chunk(x, y).flags[y % size, x % size] & flag)
+
+    def set_flag(self, x, y, flag, value):
+        size = self._chunk_size
+        chunk = self._chunk(x, y)
+        if value:
+            chunk.flags[y % size, x % size] |= flag
+        else:
+            chunk.flags[y % size, x % size] &= ~flag & 0xff
+        chunk.dirty = True
+
+    def _set_occupant(self, tile, occupant):
+        """Backs the Tile.occupant setter of the views"""
+        (x, y) = tile.coords
+        size = self._chunk_size
+        chunk = self._chunk(x, y)
+        old_id = chunk.occupant_ids[y % size, x % size]
+
+        if self._occupants[old_id] is occupant:
+            return
+
+        if old_id:
+            self._release_occupant_id(old_id)
+            chunk.occupied -= 1
+
+        if occupant is None:
+            chunk.occupant_ids[y % size, x % size] = 0
+        else:
+            chunk.occupant_ids[y % size, x % size] = self._acquire_occupant_id(occupant)
+            chunk.occupied += 1
+
+    def _on_occupancy_change(self, mob, old_tile, new_tile):
+        # Load the chunks a mob is about to walk into before it gets there
+        if new_tile is not None:
+            (x, y) = new_tile.coords
+            margin = self._chunk_size // 4
+            self.prefetch(x - margin, y - margin, 2 * margin + 1, 2 * margin + 1)
+
+    def _chunk(self, x, y):
+        """The chunk holding a tile, loading it if necessary"""
+        key = (x // self._chunk_size, y // self._chunk_size)
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk = self._load(key)
+        chunk.last_used = self._clock
+        self._clock += 1
+        return chunk
+
+    def _metadata_path(self):
+        return os.path.join(self._directory, 'storage.npz')
+
+    def _path(self, key):
+        return os.path.join(self._directory, 'chunk_{}_{}.npz'.format(*key))
+
+    def _load(self, key):
+        chunk = _Chunk(key, self._chunk_size)
+        path = self._path(key)
+
+        if os.path.exists(path):
+            saved = numpy.load(path)
+            try:
+                chunk.flags[...] = saved['flags']
+                if saved['generation'] >= self._fill_generation:
+                    chunk.sprite_ids[...] = saved['sprite_ids']
+                else:
+                    chunk.sprite_ids.fill(self._fill_sprite_id)
+                    chunk.dirty = True
+            finally:
+                saved.close()
+            self.loads += 1
+        else:
+            chunk.sprite_ids.fill(self._fill_sprite_id)
+            chunk.dirty = True
+
+        self._chunks[key] = chunk
+        if len(self._chunks) > self._max_chunks:
+            self._evict(keep=chunk)
+        return chunk
+
+    def _save(self, chunk):
+        numpy.savez(self._path(chunk.key),
+                    flags=chunk.flags,
+                    sprite_ids=chunk.sprite_ids,
+                    generation=self._fill_generation)
+        chunk.dirty = False
+        self.saves += 1
+
+    def _evict(self, keep, target=None):
+        """Unloads least recently used chunks until only `target` chunks (by
+        default, 3/4 of the budget) are loaded, or none may be evicted"""
+        size = self._chunk_size
+        pinned = set((x // size, y // size) for (x, y) in self._pinned)
+        candidates = sorted(
+            (chunk for chunk in self._chunks.itervalues()
+             if chunk is not keep and not chunk.occupied and chunk.key not in pinned),
+            key=lambda chunk: chunk.last_used,
+        )
+        if target is None:
+            target = self._max_chunks * 3 // 4
+        for chunk in candidates[:len(self._chunks) - target]:
+            if chunk.dirty:
+                self._save(chunk)
+            del self._chunks[chunk.key]
+            self.evictions += 1
+
+    def _assemble(self, chunk_to_array, dtype):
+        """Builds a whole-zone array out of a function of each chunk"""
+        (width, height) = self._dimensions
+        size = self._chunk_size
+        result = numpy.zeros((height, width), dtype=dtype)
+        for cy in xrange(-(-height // size)):
+            for cx in xrange(-(-width // size)):
+                part = result[cy * size:(cy + 1) * size, cx * size:(cx + 1) * size]
+                part[...] = chunk_to_array(self._chunk(cx * size, cy * size))[:part.shape[0], :part.shape[1]]
+        return result
+
+TILE_STORAGES = {
+    'object': ObjectTileStorage,
+    'array': ArrayTileStorage,
+    'chunked': ChunkedTileStorage,
+}
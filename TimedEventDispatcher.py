@@ -4,39 +4,39 @@ class TimedEventDispatcher (object):
     class TimedEvent:
         """Utility class storing event callbacks for TimedEventDispatcher"""
 
-        def __init__(self, period, on_complete):
+        def __init__(self, dispatcher, period, due_time, sequence, on_complete):
+            self._dispatcher = dispatcher
             self._period = period
-            self._time_remaining = period
+            self._due_time = due_time
+            self._sequence = sequence
             self.on_complete = on_complete
 
         def __cmp__(self, other):
-            """Compares TimedEvents by their time remaining"""
-            return cmp(self.time_remaining, other.time_remaining)
+            """Compares TimedEvents by when they come due"""
+            return cmp((self._due_time, self._sequence),
+                       (other._due_time, other._sequence))
 
         def __repr__(self):
-            return "TimedEventDispatcher.TimedEvent(period={}, _time_remaining={}, on_complete={})".format(
+            return "TimedEventDispatcher.TimedEvent(period={}, due_time={}, on_complete={})".format(
                 self._period,
-                self._time_remaining,
+                self._due_time,
                 self.on_complete
             )
 
         def cancel(self):
             """Prevent the event from executing"""
-            # We simply overwrite the callback with a no-op because mutating
-            # the TimedEventDispatcher's event queue is hard, and events are
-            # cleared out eventually.
-            self.on_complete = lambda *args: None
-
-        def age(self, time):
-            assert time <= self._time_remaining, \
-                'Tried to age a TimedEvent by {}, but it only had {} remaining'.format(
-                    time, self._time_remaining
-                )
-            self._time_remaining -= time
+            if self.on_complete is not None:
+                self.on_complete = None
+                self._dispatcher._on_cancel(self)
+
+        @property
+        def due_time(self):
+            """Absolute zone time at which the event fires"""
+            return self._due_time
 
         @property
         def time_remaining(self):
-            return self._time_remaining
+            return max(0.0, self._due_time - self._dispatcher.now)
 
         @property
         def period(self):
@@ -44,13 +44,44 @@ class TimedEventDispatcher (object):
 
         @property
         def progress(self):
-            return 1.0 - float(self.time_remaining) / self.period
+            return self.progress_at(self._dispatcher.now)
+
+        def progress_at(self, time):
+            """How far the timer will have run at a given zone time, from 0 to 1.0"""
+            return 1.0 - max(0.0, self._due_time - time) / self._period
+
+    # Don't bother compacting tiny queues; popping tombstones is cheap
+    COMPACT_MIN_SIZE = 64
 
     def __init__(self):
-        # The event queue is a minimum heap, giving O(1) access to the next
-        # event, O(log(n)) removal of the next event, and O(log(n)) insertion
-        # of new events
+        # The event queue is a minimum heap of (due_time, sequence, event)
+        # tuples, giving O(1) access to the next event, O(log(n)) removal of
+        # the next event, and O(log(n)) insertion of new events. Events are
+        # keyed by absolute due time, so advancing the clock never touches
+        # the events still waiting. The sequence number keeps events due at
+        # the same time in the order they were added.
         self._event_queue = []
+        self._now = 0.0
+        self._sequence = 0
+
+        # Cancelled events stay in the heap as tombstones until they are
+        # popped or the heap is compacted
+        self._cancelled_count = 0
+
+    def __len__(self):
+        """Number of events waiting to fire (not counting cancelled ones)"""
+        return len(self._event_queue) - self._cancelled_count
+
+    @property
+    def now(self):
+        """Monotonically increasing game time of this dispatcher"""
+        return self._now
+
+    @property
+    def next_due_time(self):
+        """Absolute time of the next event to fire, or None if nothing is waiting"""
+        self._discard_cancelled()
+        return self._event_queue[0][0] if self._event_queue else None
 
     def add(self, delay, callback):
         """
@@ -61,31 +92,71 @@ class TimedEventDispatcher (object):
                  longer valid.
         """
         assert delay > 0, 'Delay must be a positive number. Got {}'.format(repr(delay))
-        handle = TimedEventDispatcher.TimedEvent(delay, callback)
-        heapq.heappush(self._event_queue, handle)
+        due_time = self._now + delay
+        self._sequence += 1
+        handle = TimedEventDispatcher.TimedEvent(self, delay, due_time, self._sequence, callback)
+        heapq.heappush(self._event_queue, (due_time, self._sequence, handle))
         return handle
 
     def advanceBy(self, interval):
         """Advance game time by an interval of time, firing events as they become due
-          and aging the rest.
 
         :param interval: Amount of time to advance by
         :return: None
         """
+        self.advanceTo(self._now + interval)
 
-        # Pop and fire events in the order they come due
-        while len(self._event_queue) > 0 and \
-                self._event_queue[0].time_remaining <= interval:
-            next_event = heapq.heappop(self._event_queue)
+    def advanceTo(self, time):
+        """Advance game time to an absolute time, firing events as they become due
 
-            # Advance the game clock by the amount of time left on the next event
-            interval -= next_event.time_remaining
-            for event in self._event_queue:
-                event.age(next_event.time_remaining)
+        Events scheduled by callbacks fire during the same call if they come
+        due before `time`.
 
-            next_event.age(next_event.time_remaining)
-            next_event.on_complete()
+        :param time: Absolute game time to advance to
+        :return: None
+        """
+        queue = self._event_queue
 
-        # Age everything left by the remaining time
-        for event in self._event_queue:
-            event.age(interval)
+        # Pop and fire events in the order they come due
+        while queue and queue[0][0] <= time:
+            due_time, _, next_event = heapq.heappop(queue)
+            callback = next_event.on_complete
+
+            if callback is None:
+                self._cancelled_count -= 1
+                continue
+
+            self._now = due_time
+            next_event.on_complete = None
+            callback()
+
+        if time > self._now:
+            self._now = time
+
+    def _on_cancel(self, event):
+        """Bookkeeping for TimedEvent.cancel()"""
+        self._cancelled_count += 1
+
+        # Rebuild the heap once it is mostly tombstones, so cancelling lots of
+        # long timers (e.g. interrupted walks) doesn't leak memory
+        if self._cancelled_count > len(self._event_queue) // 2 \
+                and len(self._event_queue) >= TimedEventDispatcher.COMPACT_MIN_SIZE:
+            self._compact()
+
+    def _compact(self):
+        """Remove every cancelled event from the queue"""
+        # Rebuilt in place, since advanceTo() may be iterating over it
+        self._event_queue[:] = [
+            entry
+            for entry in self._event_queue
+            if entry[2].on_complete is not None
+        ]
+        heapq.heapify(self._event_queue)
+        self._cancelled_count = 0
+
+    def _discard_cancelled(self):
+        """Pop cancelled events off the top of the queue"""
+        queue = self._event_queue
+        while queue and queue[0][2].on_complete is None:
+            heapq.heappop(queue)
+            self._cancelled_count -= 1
@@ -0,0 +1,227 @@
+import heapq
+
+from TimedEventDispatcher import TimedEventDispatcher
+
+class TimingWheelEventDispatcher (TimedEventDispatcher):
+    """
+    Drop-in replacement for TimedEventDispatcher built on a hierarchical
+    timing wheel, for zones with very large numbers of short timers.
+
+    Time is divided into ticks of `resolution` game seconds. Level 0 of the
+    wheel has one slot per tick; each slot of level L covers `slots` slots of
+    level L - 1. Adding and cancelling an event are O(1): the event goes into
+    the slot covering its due time, and cancelling deletes it from there.
+    Events too far in the future for the top level wait in an overflow heap.
+
+    When a tick is reached its slot is emptied into a small heap of ready
+    events, and higher-level slots are cascaded down as their time comes.
+    Ready events fire in (due time, insertion order), so events fire in the
+    same order as they would with TimedEventDispatcher, including events
+    that share a slot.
+    """
+
+    def __init__(self, resolution=1 / 64.0, slots=256, levels=4):
+        """
+        :param resolution: Game time covered by one tick (i.e. one level-0 slot)
+        :param slots: Number of slots in each level of the wheel. Must be a
+                      power of two.
+        :param levels: Number of levels in the wheel
+        """
+        super(TimingWheelEventDispatcher, self).__init__()
+
+        assert slots > 1 and slots & (slots - 1) == 0, \
+            'Slot count must be a power of two. Got {}'.format(repr(slots))
+
+        self._resolution = float(resolution)
+        self._slots = slots
+        self._slot_bits = slots.bit_length() - 1
+        self._levels = levels
+
+        # Number of ticks spanned by one slot of each level
+        self._spans = [slots ** level for level in range(levels + 1)]
+
+        # Each slot maps sequence numbers to events. Slots are only allocated
+        # when something is scheduled into them.
+        self._wheels = [[None] * slots for _ in range(levels)]
+        self._level_counts = [0] * levels
+
+        # Events due beyond the top level of the wheel, as (due_time, sequence, event)
+        self._overflow = []
+
+        # Every event in ticks before this one has been moved to the ready heap
+        # (which is the inherited _event_queue)
+        self._tick = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def resolution(self):
+        return self._resolution
+
+    @property
+    def next_due_time(self):
+        self._discard_cancelled()
+        next_due = self._event_queue[0][0] if self._event_queue else None
+
+        # Each level's first occupied slot holds its earliest events. A
+        # higher level can still hold earlier events than a lower one while
+        # the current tick is on a slot boundary that hasn't been cascaded
+        # yet, so every level has to be looked at.
+        due_times = [] if next_due is None else [next_due]
+        for level in range(self._levels):
+            if self._level_counts[level] == 0:
+                continue
+            wheel = self._wheels[level]
+            for index in range(self._tick // self._spans[level] % self._slots, self._slots):
+                if wheel[index]:
+                    due_times.append(min(event._due_time for event in wheel[index].itervalues()))
+                    break
+
+        while self._overflow and self._overflow[0][2].on_complete is None:
+            heapq.heappop(self._overflow)
+        if self._overflow:
+            due_times.append(self._overflow[0][0])
+
+        return min(due_times) if due_times else None
+
+    def add(self, delay, callback):
+        assert delay > 0, 'Delay must be a positive number. Got {}'.format(repr(delay))
+        due_time = self._now + delay
+        self._sequence += 1
+        handle = TimedEventDispatcher.TimedEvent(self, delay, due_time, self._sequence, callback)
+        self._place(handle)
+        self._count += 1
+        return handle
+
+    def advanceTo(self, time):
+        ready = self._event_queue
+        last_tick = int(time // self._resolution)
+
+        while True:
+            # Fire whatever is ready, in the order it comes due
+            while ready and ready[0][0] <= time:
+                due_time, _, next_event = heapq.heappop(ready)
+                callback = next_event.on_complete
+
+                if callback is None:
+                    self._cancelled_count -= 1
+                    continue
+
+                self._now = due_time
+                self._count -= 1
+                next_event.on_complete = None
+                callback()
+
+            if self._tick > last_tick:
+                break
+
+            self._skip_empty_ticks(last_tick + 1)
+            if self._tick <= last_tick:
+                self._process_tick()
+
+        if time > self._now:
+            self._now = time
+
+    def _place(self, event):
+        """Put an event into the slot covering its due time"""
+        tick = int(event._due_time // self._resolution)
+
+        if tick < self._tick:
+            # Its slot has already gone by
+            event._slot = None
+            heapq.heappush(self._event_queue, (event._due_time, event._sequence, event))
+            return
+
+        # Use the lowest level whose parent slot contains both the current
+        # tick and the event, i.e. the level of the highest bit in which the
+        # two tick numbers differ
+        bits = self._slot_bits
+        level = max(0, ((tick ^ self._tick).bit_length() - 1) // bits)
+
+        if level < self._levels:
+            wheel = self._wheels[level]
+            index = (tick >> (bits * level)) & (self._slots - 1)
+            slot = wheel[index]
+            if slot is None:
+                slot = wheel[index] = {}
+            slot[event._sequence] = event
+            event._slot = slot
+            event._level = level
+            self._level_counts[level] += 1
+        else:
+            event._slot = self._overflow
+            heapq.heappush(self._overflow, (event._due_time, event._sequence, event))
+
+    def _process_tick(self):
+        """Move the events of the current tick into the ready heap"""
+        tick = self._tick
+
+        # Refill the wheel from the top down whenever a slot boundary is crossed
+        if tick % self._spans[self._levels] == 0:
+            self._cascade_overflow()
+        for level in range(self._levels - 1, 0, -1):
+            if tick % self._spans[level] == 0:
+                self._cascade(level, tick // self._spans[level] % self._slots)
+
+        index = tick % self._slots
+        slot = self._wheels[0][index]
+        if slot is not None:
+            self._wheels[0][index] = None
+            self._level_counts[0] -= len(slot)
+            ready = self._event_queue
+            for event in slot.itervalues():
+                event._slot = None
+                ready.append((event._due_time, event._sequence, event))
+            heapq.heapify(ready)
+
+        self._tick = tick + 1
+
+    def _cascade(self, level, index):
+        """Redistribute a slot's events into the levels below it"""
+        slot = self._wheels[level][index]
+        if slot is not None:
+            self._wheels[level][index] = None
+            self._level_counts[level] -= len(slot)
+            for event in slot.itervalues():
+                self._place(event)
+
+    def _cascade_overflow(self):
+        """Move overflow events which now fit in the wheel into it"""
+        top_span = self._spans[self._levels]
+        overflow = self._overflow
+        while overflow and int(overflow[0][0] // self._resolution) // top_span <= self._tick // top_span:
+            event = heapq.heappop(overflow)[2]
+            if event.on_complete is not None:
+                self._place(event)
+
+    def _skip_empty_ticks(self, end_tick):
+        """Jump over ticks that cannot contain any events, stopping at end_tick"""
+        level = next(
+            (level for level in range(self._levels) if self._level_counts[level] != 0),
+            self._levels if self._overflow else None
+        )
+
+        if level is None:
+            # Nothing is scheduled at all
+            self._tick = max(self._tick, end_tick)
+        elif level > 0:
+            # Levels below `level` are empty, so nothing can happen until the
+            # next boundary of a `level` slot
+            span = self._spans[level]
+            next_boundary = -(-self._tick // span) * span
+            self._tick = max(self._tick, min(next_boundary, end_tick))
+
+    def _on_cancel(self, event):
+        self._count -= 1
+        slot = event._slot
+
+        if slot is self._overflow:
+            # Discarded when it reaches the front of the overflow heap
+            pass
+        elif slot is not None:
+            del slot[event._sequence]
+            self._level_counts[event._level] -= 1
+        else:
+            super(TimingWheelEventDispatcher, self)._on_cancel(event)
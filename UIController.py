@@ -2,8 +2,12 @@ import pygame
 import pygame.locals
 
 from GameClock import GameClock
+from JobScheduler import JobScheduler
 from Observable import Observable, \
-    EventType
+    EventType, \
+    CoalescingEventType, \
+    flush_events, \
+    get_event_profiler
 from UIEventDispatchers import \
     KeyHoldEventDispatcher, \
     KeyPressEventDispatcher, \
@@ -27,7 +31,7 @@ class UIController (Observable):
         :param coord: x/y tuple of the mouse's screen location
         """
 
-    @EventType
+    @CoalescingEventType
     def ZONE_HOVER(coord):
         """Mouse is hovering over the zone
         :param coord: x/y tuple of the mouse's screen location
@@ -39,9 +43,24 @@ class UIController (Observable):
         :param direction: x/y tuple of direction to move
         """
 
+    @EventType
+    def NEXT_ZONE():
+        """The player asked to switch to the next zone"""
+
     def __init__(self,
                  view,
-                 framerate):
+                 framerate,
+                 step=None,
+                 max_steps=10,
+                 job_budget=4.0):
+        """
+        :param view: The UIView to render
+        :param framerate: Limit on rendering passes per second
+        :param step: Optional fixed game time step, see GameClock
+        :param max_steps: Most fixed steps to simulate per frame, see GameClock
+        :param job_budget: Milliseconds per frame to spend on long-running
+                           jobs, see JobScheduler
+        """
         super(UIController, self).__init__()
 
         self.view = view
@@ -49,7 +68,8 @@ class UIController (Observable):
         self._terminate_flag = True
 
         # Wiring
-        self.game_clock = GameClock(framerate)
+        self.game_clock = GameClock(framerate, step=step, max_steps=max_steps)
+        self.job_scheduler = JobScheduler(budget=job_budget)
 
         self.pygameEventDispatcher = PygameEventDispatcher()
         self.keyPressEventDispatcher = KeyPressEventDispatcher(self.pygameEventDispatcher)
@@ -63,6 +83,13 @@ class UIController (Observable):
         self.mouseEventDispatcher.observe(MouseEventDispatcher.CLICK, self._on_click)
         self.mouseEventDispatcher.observe(MouseEventDispatcher.MOVE, self._on_move)
 
+        self.keyPressEventDispatcher.observe(
+            (pygame.locals.KEYDOWN, pygame.locals.K_p),
+            self._on_dump_event_profile)
+        self.keyPressEventDispatcher.observe(
+            (pygame.locals.KEYDOWN, pygame.locals.K_TAB),
+            lambda *args, **kwargs: self.notify(UIController.NEXT_ZONE)
+        )
         self.keyPressEventDispatcher.observe(
             (pygame.locals.KEYDOWN, pygame.locals.K_SPACE),
             lambda *args, **kwargs: self.game_clock.toggle()
@@ -93,6 +120,16 @@ class UIController (Observable):
             self.pygameEventDispatcher.handleEvents(pygame.event.get())
             self.keyHoldEventDispatcher.processTasks()
 
+            # Slices of long-running work
+            self.job_scheduler.run_frame()
+
+            # Deliver coalesced events, if they're being queued
+            flush_events()
+
+    def _on_dump_event_profile(self, event):
+        if get_event_profiler() is not None:
+            get_event_profiler().dump()
+
     def _on_quit(self, event):
         self._terminate_flag = True
 
@@ -1,13 +1,13 @@
 import pygame.locals
 import re
 
-from Observable import Observable, EventType
+from Observable import Observable, EventType, CoalescingEventType
 
-PYGAME_KEY_CODES = {
+PYGAME_KEY_CODES = frozenset(
     pygame.locals.__dict__[key_name]
     for key_name in dir(pygame.locals)
     if re.match(r'^K_', key_name)
-}
+)
 
 class PygameEventDispatcher (Observable):
     """ Processes pygame events """
@@ -59,11 +59,11 @@ class KeyPressEventDispatcher (Observable):
 
     # Event types are tuples of the key direction and the key code.
     # :param event: Pygame event
-    EVENT_TYPES = {
+    EVENT_TYPES = frozenset(
         (key_direction, key_code)
         for key_direction in [pygame.locals.KEYDOWN, pygame.locals.KEYUP]
         for key_code in PYGAME_KEY_CODES
-    }
+    )
 
     def __init__(self, pygame_event_dispatcher=None):
         super(KeyPressEventDispatcher, self).\
@@ -149,7 +149,7 @@ class MouseEventDispatcher(Observable):
                        Primary = 1, Secondary = 2, Middle = 3, etc.
         """
 
-    @EventType
+    @CoalescingEventType
     def MOVE(pos, rel, buttons):
         """Fired when the mouse is clicked
         :param pos:     A tuple of the (x,y) location of the mouse
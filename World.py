@@ -0,0 +1,179 @@
+import collections
+import timeit
+
+from Observable import Observable, EventType
+
+class World (Observable):
+    """
+    Holds every zone of the game, simulating only the active ones.
+
+    Active zones (usually just the player's) have their timed event
+    dispatchers advanced with the world clock. Dormant zones are left alone,
+    and when one is activated again it catches up on the time it missed in
+    one batched pass (or in coarse steps), so CPU use scales with the number
+    of active zones. Zones may also be registered as builders, which aren't
+    called until the zone is first activated, and dormant zones are asked to
+    give back whatever tile memory they can (see ChunkedTileStorage).
+    """
+
+    CatchUp = collections.namedtuple('CatchUp', [
+        'name',          # Name of the zone that caught up
+        'game_time',     # Game time simulated
+        'dropped_time',  # Game time skipped because of max_catch_up
+        'wall_time',     # Real seconds the catch-up took
+        'events',        # Timed events which fired or were cancelled
+    ])
+
+    @EventType
+    def CATCH_UP(catch_up):
+        """A dormant zone was activated and brought up to date
+        :param catch_up: A World.CatchUp describing the work done
+        """
+
+    def __init__(self, catch_up_step=None, max_catch_up=None):
+        """
+        :param catch_up_step: Game time per step when catching up a dormant
+                              zone, or None to advance it in one pass.
+                              Timed events fire in the same order either way.
+        :param max_catch_up: Most game time to simulate when catching up,
+                             or None for no limit. Any more is skipped, like
+                             GameClock.dropped_time.
+        """
+        super(World, self).__init__()
+
+        self.catch_up_step = catch_up_step
+        self.max_catch_up = max_catch_up
+
+        self._now = 0.0
+        self._zones = {}
+        self._builders = {}
+        self._active = set()
+        # World time at which each dormant zone was last brought up to date
+        self._dormant_since = {}
+
+    @property
+    def now(self):
+        """Game time since the world was created"""
+        return self._now
+
+    @property
+    def names(self):
+        """Names of every zone, built or not"""
+        return sorted(set(self._zones) | set(self._builders))
+
+    @property
+    def active_zones(self):
+        return [self._zones[name] for name in sorted(self._active)]
+
+    def __contains__(self, name):
+        return name in self._zones or name in self._builders
+
+    def is_active(self, name):
+        return name in self._active
+
+    def is_built(self, name):
+        return name in self._zones
+
+    def add_zone(self, name, zone, active=False):
+        """Adds an existing zone to the world
+        :param name: Key to refer to the zone by
+        :param zone: The zone
+        :param active: Simulate the zone straight away
+        """
+        assert name not in self, 'There is already a zone named {}'.format(repr(name))
+        self._zones[name] = zone
+        if active:
+            self._active.add(name)
+        else:
+            self._dormant_since[name] = self._now
+
+    def add_zone_builder(self, name, builder):
+        """Adds a zone which isn't built until it is first activated
+        :param name: Key to refer to the zone by
+        :param builder: Function taking no arguments and returning the zone
+        """
+        assert name not in self, 'There is already a zone named {}'.format(repr(name))
+        self._builders[name] = builder
+
+    def zone(self, name):
+        """Gets a zone by name, building it if necessary. A newly built zone
+        is dormant until activated."""
+        if name not in self._zones:
+            self.add_zone(name, self._builders.pop(name)())
+        return self._zones[name]
+
+    def name_of(self, zone):
+        """Name of a built zone"""
+        for (name, candidate) in self._zones.iteritems():
+            if candidate is zone:
+                return name
+        raise KeyError(zone)
+
+    def activate(self, name):
+        """Starts simulating a zone, first catching it up on the time it spent dormant
+        :return: A World.CatchUp, or None if the zone was already active
+        """
+        if name in self._active:
+            return None
+
+        zone = self.zone(name)
+        catch_up = self._catch_up(name, zone)
+        del self._dormant_since[name]
+        self._active.add(name)
+
+        self.notify(World.CATCH_UP, catch_up)
+        return catch_up
+
+    def deactivate(self, name):
+        """Stops simulating a zone until it's activated again"""
+        if name in self._active:
+            self._active.remove(name)
+            self._dormant_since[name] = self._now
+            self._zones[name].tile_storage.trim()
+
+    def advanceBy(self, interval):
+        """Advances the world clock, and every active zone with it"""
+        self._now += interval
+        for name in self._active:
+            self._zones[name].timed_event_dispatcher.advanceBy(interval)
+
+    @property
+    def next_due_time(self):
+        """World time of the next timed event in any active zone, or None"""
+        due_times = []
+        for name in self._active:
+            dispatcher = self._zones[name].timed_event_dispatcher
+            next_due_time = dispatcher.next_due_time
+            if next_due_time is not None:
+                due_times.append(next_due_time - dispatcher.now + self._now)
+        return min(due_times) if due_times else None
+
+    def _catch_up(self, name, zone):
+        dispatcher = zone.timed_event_dispatcher
+        elapsed = self._now - self._dormant_since[name]
+        game_time = elapsed if self.max_catch_up is None else min(elapsed, self.max_catch_up)
+
+        # Every event gets a new sequence number when it's added, so the
+        # number of events handled is the number waiting beforehand plus
+        # the number added, minus the number still waiting afterwards
+        pending_before = len(dispatcher)
+        # noinspection PyProtectedMember
+        sequence_before = dispatcher._sequence
+        start = timeit.default_timer()
+
+        if self.catch_up_step is None:
+            dispatcher.advanceBy(game_time)
+        else:
+            target = dispatcher.now + game_time
+            while dispatcher.now + self.catch_up_step < target:
+                dispatcher.advanceBy(self.catch_up_step)
+            dispatcher.advanceTo(target)
+
+        return World.CatchUp(
+            name=name,
+            game_time=game_time,
+            dropped_time=elapsed - game_time,
+            wall_time=timeit.default_timer() - start,
+            # noinspection PyProtectedMember
+            events=pending_before + dispatcher._sequence - sequence_before - len(dispatcher),
+        )
@@ -1,7 +1,20 @@
+import numpy
+
+from FieldOfView import FieldOfView
+from FlowField import FlowFields
+from FogOfWar import FogOfWar
+from Mob import Mob
+from MobIndex import MobIndex
+from Observable import Observable, EventType
+from OccupancyStream import OccupancyStream
+from PathHierarchy import PathHierarchy
+from PathService import PathService
+from PatrolRoute import PatrolRoutes
 from Tile import Tile
+from TileStorage import ObjectTileStorage
 from TimedEventDispatcher import TimedEventDispatcher
 
-class Zone (object):
+class Zone (Observable):
     """
     A zone is a region of space and everything inside it.
     It (tentatively) contains:
@@ -12,6 +25,17 @@ class Zone (object):
     - Initial directives
     """
 
+    @EventType
+    def TERRAIN_CHANGE(tile):
+        """A tile's walkable or transparent flag changed
+        :param tile: The tile
+        """
+
+    # Relative coordinates of a tile's neighbours
+    ORTHOGONAL_OFFSETS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+    DIAGONAL_OFFSETS = ((1, -1), (1, 1), (-1, 1), (-1, -1))
+    ALL_OFFSETS = ORTHOGONAL_OFFSETS + DIAGONAL_OFFSETS
+
     class TilesDelegate (object):
         """Gives access to a Zone's tiles"""
         def __init__(self, zone):
@@ -25,7 +49,7 @@ class Zone (object):
             """
             (x, y) = coords
             # noinspection PyProtectedMember
-            return self._zone._tiles[y][x]
+            return self._zone._tile_storage.tile_at(x, y)
 
         def __contains__(self, coords_or_tile):
             """Checks whether a tile belongs to this model or a coordinate is in bounds
@@ -37,49 +61,125 @@ class Zone (object):
             :return: A boolean
             """
             if isinstance(coords_or_tile, Tile):
-                # Is a Tile
-                if coords_or_tile.coords in self:
-                    for tile in self:
-                        if tile is coords_or_tile:
-                            return True
-                    else:
-                        return False
-                else:
-                    return False
+                # Is a Tile. Only one tile object can exist for a coordinate
+                # at a time, so looking it up by coordinate is enough.
+                return coords_or_tile.zone is self._zone \
+                    and coords_or_tile.coords in self \
+                    and self[coords_or_tile.coords] is coords_or_tile
             else:
                 # Is a coordinate
                 (x, y) = coords_or_tile
                 return 0 <= x < self._zone.dimensions[0] \
                     and 0 <= y < self._zone.dimensions[1]
 
+        def rect(self, x, y, width, height):
+            """Lists the tiles in a rectangle, row by row, clipped to the zone"""
+            (x, y, width, height) = self.clip_rect(x, y, width, height)
+            # noinspection PyProtectedMember
+            return self._zone._tile_storage.rect(x, y, width, height) \
+                if width > 0 and height > 0 \
+                else []
+
+        def row(self, y):
+            """Lists the tiles in a row, from left to right"""
+            return self.rect(0, y, self._zone.dimensions[0], 1)
+
+        def neighbours(self, coords, diagonal=False):
+            """Lists the tiles next to a coordinate which are inside the zone
+            :param coords: x/y coordinate of the tile in the middle
+            :param diagonal: Include the four diagonal neighbours
+            """
+            (x, y) = coords
+            (width, height) = self._zone.dimensions
+            # noinspection PyProtectedMember
+            tile_at = self._zone._tile_storage.tile_at
+            return [
+                tile_at(x + dx, y + dy)
+                for (dx, dy) in (Zone.ALL_OFFSETS if diagonal else Zone.ORTHOGONAL_OFFSETS)
+                if 0 <= x + dx < width and 0 <= y + dy < height
+            ]
+
+        def coords_array(self, x=0, y=0, width=None, height=None):
+            """Coordinates of the tiles in a rectangle (by default the whole
+            zone), as an N x 2 NumPy array of x/y pairs in row-by-row order"""
+            (x, y, width, height) = self.clip_rect(
+                x, y,
+                self._zone.dimensions[0] if width is None else width,
+                self._zone.dimensions[1] if height is None else height,
+            )
+            ys, xs = numpy.mgrid[y:y + max(height, 0), x:x + max(width, 0)]
+            return numpy.column_stack((xs.ravel(), ys.ravel()))
+
+        def clip_rect(self, x, y, width, height):
+            """Trims an (x, y, width, height) rectangle to the zone's bounds"""
+            (zone_width, zone_height) = self._zone.dimensions
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + width, zone_width), min(y + height, zone_height)
+            return x0, y0, x1 - x0, y1 - y0
+
         def __iter__(self):
             """Iterates over every tile in the zone"""
             # noinspection PyProtectedMember
-            for row in self._zone._tiles:
-                for tile in row:
-                    yield tile
+            return iter(self._zone._tile_storage)
 
-    def __init__(self, dimensions):
+    def __init__(self, dimensions, timed_event_dispatcher=None, tile_storage=ObjectTileStorage):
+        """
+        :param dimensions: Width and height of the zone, in tiles
+        :param timed_event_dispatcher: Optional scheduler for the zone's timed
+                                       events, e.g. a TimingWheelEventDispatcher.
+                                       Defaults to a TimedEventDispatcher.
+        :param tile_storage: Storage engine class for the zone's tiles (see
+                             TileStorage), called with the zone and its
+                             dimensions. Large zones should use
+                             ArrayTileStorage.
+        """
+        super(Zone, self).__init__()
 
         self._dimensions = dimensions
         self._tileDelegate = Zone.TilesDelegate(self)
         self._mob_tiles = dict()
 
-        self._tiles = [
-            [Tile(zone=self, coords=(x,y)) for x in range(dimensions[0])]
-            for y in range(dimensions[1])
-        ]
+        # Mobs by location, kept up to date through their POSITION_CHANGE
+        # events, which the zone observes for as long as they're in it
+        self._mob_index = MobIndex()
+        self._mob_position_handles = dict()
+
+        # Every tile of the zone reports its occupancy changes here
+        self._occupancy = OccupancyStream()
+        self._occupancy.subscribe(self._on_occupancy_change)
 
-        self.timed_event_dispatcher = TimedEventDispatcher()
+        self._tile_storage = tile_storage(self, dimensions)
 
-        for tile in self.tiles:
-            tile.observe(Tile.OCCUPY, self._on_tile_occupy)
-            tile.observe(Tile.VACATE, self._on_tile_vacate)
+        # Shared paths toward popular goals, and around patrol circuits
+        self._flow_fields = FlowFields(self)
+        self._patrol_routes = PatrolRoutes(self)
+        # Abstract graphs for planning long paths, with and without
+        # diagonal steps, built when first needed
+        self._path_hierarchies = {}
+        # Worker processes for path searches, if started
+        self._path_service = None
+        # Cache of what can be seen from where
+        self._field_of_view = FieldOfView(self)
+        # What each faction has seen, and can see now
+        self._fog_of_war = FogOfWar(self)
+
+        self.timed_event_dispatcher = timed_event_dispatcher \
+            if timed_event_dispatcher is not None \
+            else TimedEventDispatcher()
 
     @property
     def tiles(self):
         return self._tileDelegate
 
+    @property
+    def tile_storage(self):
+        return self._tile_storage
+
+    @property
+    def occupancy(self):
+        """Stream of (mob, old_tile, new_tile) occupancy changes; see OccupancyStream"""
+        return self._occupancy
+
     @property
     def dimensions(self):
         return self._dimensions
@@ -88,17 +188,102 @@ class Zone (object):
     def mobs(self):
         return self._mob_tiles.keys()
 
-    def _on_tile_occupy(self, tile):
-        mob = tile.occupant
-        if mob in self._mob_tiles:
-            self._mob_tiles[mob].add(tile)
-        else:
-            self._mob_tiles[mob] = {tile}
-
-    def _on_tile_vacate(self, tile, mob):
-        self._mob_tiles[mob].remove(tile)
-        if len(self._mob_tiles[mob]) == 0:
-            del self._mob_tiles[mob]
+    def occupied_tiles(self):
+        """Lists (mob, set of tiles) pairs for every mob in the zone. A walking
+        mob holds both the tile it's leaving and the one it's entering."""
+        return self._mob_tiles.items()
+
+    @property
+    def mob_index(self):
+        """Spatial index of the zone's mobs by tile; see MobIndex"""
+        return self._mob_index
+
+    @property
+    def flow_fields(self):
+        """Cache of flow fields toward goal tiles; see FlowField"""
+        return self._flow_fields
+
+    @property
+    def patrol_routes(self):
+        """Cache of compiled patrol circuits; see PatrolRoute"""
+        return self._patrol_routes
+
+    @property
+    def field_of_view(self):
+        """Lines of sight, and cache of what mobs can see; see FieldOfView"""
+        return self._field_of_view
+
+    @property
+    def fog_of_war(self):
+        """Tiles each faction has seen, and can see now; see FogOfWar"""
+        return self._fog_of_war
+
+    @fog_of_war.setter
+    def fog_of_war(self, fog_of_war):
+        """Replaces the fog of war, e.g. with one loaded from a saved game"""
+        assert tuple(fog_of_war.dimensions) == tuple(self.dimensions), \
+            'Fog of war is {}, but the zone is {}'.format(fog_of_war.dimensions, self.dimensions)
+        fog_of_war.zone = self
+        self._fog_of_war = fog_of_war
+
+    def path_hierarchy(self, diagonal=False):
+        """Abstract graph of the zone's walls for planning long paths; see PathHierarchy
+        :param diagonal: Allow diagonal steps
+        """
+        if diagonal not in self._path_hierarchies:
+            self._path_hierarchies[diagonal] = PathHierarchy(self, diagonal)
+        return self._path_hierarchies[diagonal]
+
+    @property
+    def path_service(self):
+        """Pool of worker processes searching for paths, or None; see PathService"""
+        return self._path_service
+
+    def start_path_service(self, workers=None):
+        """Starts searching for mobs' paths in worker processes. Mob.walk_to()
+        then asks the service for a path and carries on with whatever the
+        mob was doing until it's found.
+        :param workers: Number of worker processes. Defaults to the number
+                        of CPUs.
+        :return: The PathService
+        """
+        if self._path_service is None:
+            self._path_service = PathService(self, workers)
+        return self._path_service
+
+    def stop_path_service(self):
+        """Stops the worker processes started by start_path_service()"""
+        if self._path_service is not None:
+            self._path_service.close()
+            self._path_service = None
+
+    def report_terrain_change(self, tile):
+        """Called by tiles when their terrain flags change"""
+        self.notify(Zone.TERRAIN_CHANGE, tile)
+
+    def _on_occupancy_change(self, mob, old_tile, new_tile):
+        if new_tile is not None:
+            if mob in self._mob_tiles:
+                self._mob_tiles[mob].add(new_tile)
+            else:
+                self._mob_tiles[mob] = {new_tile}
+                # Index the mob right away; POSITION_CHANGE may be deferred
+                self._mob_index.place(mob, new_tile.coords)
+                self._mob_position_handles[mob] = \
+                    mob.observe(Mob.POSITION_CHANGE, self._on_mob_position_change)
+
+        if old_tile is not None:
+            self._mob_tiles[mob].remove(old_tile)
+            if len(self._mob_tiles[mob]) == 0:
+                del self._mob_tiles[mob]
+                self._mob_index.remove(mob)
+                self._mob_position_handles.pop(mob).cancel()
+
+    def _on_mob_position_change(self, mob, old_tile):
+        # The event may have been deferred (see Observable.EventQueue), so go
+        # by where the mob is now
+        if mob in self._mob_tiles and mob.tile is not None and mob.tile.zone is self:
+            self._mob_index.place(mob, mob.tile.coords)
 
     # @property
     # def mobs(self):
@@ -1,8 +1,11 @@
 import pygame
 
 from GameClock import GameClock
+from JobScheduler import JobScheduler
 from Observable import Observable, \
-    EventType
+    EventType, \
+    CoalescingEventType
+from PathHierarchy import PathHierarchy
 from Tile import Tile
 from UIController import UIController
 
@@ -20,7 +23,7 @@ class ZoneController (Observable):
         :param tile: The tile that was clicked
         """
 
-    @EventType
+    @CoalescingEventType
     def HOVER_TILE(tile):
         """The mouse is hovering over a tile
         :param tile: The tile is being hovered over
@@ -32,23 +35,46 @@ class ZoneController (Observable):
         :param dt: Amount of time to advance by
         """
 
-    def __init__(self, ui_controller, zone, view, pc):
+    def __init__(self, ui_controller, zone, view, pc, skip_idle_time=False, world=None,
+                 faction=None, sight_radius=8):
+        """
+        :param ui_controller: Source of input and clock events
+        :param zone: The zone to control
+        :param view: The ZoneView showing the zone
+        :param pc: The player character
+        :param skip_idle_time: Jump straight to the zone's next timed event
+                               while the PC is idle and nothing moves on screen
+        :param world: Optional World the zone belongs to. Game time then
+                      advances the whole world instead of just the zone.
+        :param faction: Optional faction whose fog of war the PC lifts as it
+                        looks around; see FogOfWar
+        :param sight_radius: How far the PC can see, in tiles
+        """
         super(ZoneController, self).__init__()
 
         # Private variables
         self._ui_controller = None
         self._ui_controller_event_handles = []
+        # JobScheduler.Job building the zone's PathHierarchy, if it needs one
+        self._path_hierarchy_job = None
 
         # Public variables
         self.zone = zone
         self.view = view
         self.pc = pc
+        self.skip_idle_time = skip_idle_time
+        self.world = world
+        self.faction = faction
+        self.sight_radius = sight_radius
 
         # Public setters
         self.ui_controller = ui_controller
 
         self.observe(ZoneController.CLICK_TILE, self._on_click_tile)
 
+        self.update_fog_of_war()
+        self.build_path_hierarchy()
+
     @property
     def ui_controller(self):
         return self._ui_controller
@@ -59,8 +85,14 @@ class ZoneController (Observable):
         for handle in self._ui_controller_event_handles:
             handle.cancel()
 
+        if self._ui_controller is not None and self._ui_controller.game_clock.event_skipper is self:
+            self._ui_controller.game_clock.event_skipper = None
+
         self._ui_controller = ui_controller
 
+        if self._ui_controller is not None and self.skip_idle_time:
+            self._ui_controller.game_clock.event_skipper = self
+
         # Register listeners with new ui_controller object
         self._ui_controller_event_handles = [] \
             if self._ui_controller is None \
@@ -70,10 +102,76 @@ class ZoneController (Observable):
                 self.ui_controller.observe(UIController.ZONE_HOVER, self._on_zone_hover),
                 self.ui_controller.observe(UIController.MOVE, self._on_move),
                 self.ui_controller.game_clock.observe(GameClock.GAME_TIME_ADVANCE, self._on_game_time_advance),
+                self.ui_controller.game_clock.observe(GameClock.INTERPOLATE, self._on_interpolate),
             ]
 
     def _on_game_time_advance(self, dt):
-        self.zone.timed_event_dispatcher.advanceBy(dt)
+        if self.world is not None:
+            self.world.advanceBy(dt)
+        else:
+            self.zone.timed_event_dispatcher.advanceBy(dt)
+        self.update_fog_of_war()
+
+    def _on_interpolate(self, dt):
+        self.view.interpolation_time = dt
+
+    def build_path_hierarchy(self):
+        """Starts building the zone's PathHierarchy in the background, if
+        the PC's paths are planned on one, so the first click doesn't have
+        to. Any build for the previous zone is dropped."""
+        if self._path_hierarchy_job is not None:
+            self._path_hierarchy_job.cancel()
+            self._path_hierarchy_job = None
+        if self.ui_controller is not None and PathHierarchy.suits(self.zone):
+            self._path_hierarchy_job = self.ui_controller.job_scheduler.add(
+                self.zone.path_hierarchy().build(), JobScheduler.BACKGROUND)
+
+    def update_fog_of_war(self):
+        """Sets what the faction can see to what the PC can see"""
+        if self.faction is not None and self.pc.tile is not None:
+            view = self.zone.field_of_view.view(self.pc, self.sight_radius)
+            self.zone.fog_of_war.update(self.faction, [view])
+
+    @property
+    def is_idle(self):
+        """Whether the PC is standing still and no moving mob is on screen"""
+        return not self.pc.is_moving and not any(
+            mob.is_moving and self.view.is_on_screen(mob.tile.coords)
+            for mob in self.zone.mobs
+        )
+
+    def time_to_next_event(self):
+        """Game time until the zone's next timed event, if it's safe to skip
+        straight to it. See GameClock.event_skipper.
+        """
+        if not self.is_idle:
+            return None
+
+        clock = self.world if self.world is not None else self.zone.timed_event_dispatcher
+        next_due_time = clock.next_due_time
+        return None if next_due_time is None else next_due_time - clock.now
+
+    def enter_zone(self, name, pc=None):
+        """Switches to another zone of the world, making it the active one
+        :param name: Name of the zone in the world
+        :param pc: The player character in the new zone, if it's changing.
+                   Moving the PC between zones is up to the caller.
+        :return: The World.CatchUp of the new zone
+        """
+        old_name = self.world.name_of(self.zone)
+        catch_up = self.world.activate(name)
+        if old_name != name:
+            self.world.deactivate(old_name)
+
+        self.zone = self.world.zone(name)
+        self.view.zone = self.zone
+        self.view.hover_tile = None
+        if pc is not None:
+            self.pc = pc
+        self.update_fog_of_war()
+        self.build_path_hierarchy()
+
+        return catch_up
 
     def _on_primary_click(self, coord):
         thing = self.view.what_is_at(coord)
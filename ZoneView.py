@@ -6,7 +6,15 @@ from UIView import UIView
 class ZoneView (object):
     """Renders a zone and everything in it."""
 
-    def __init__(self, zone, ui_view, spriteSize=(32, 32)):
+    def __init__(self, zone, ui_view, spriteSize=(32, 32), faction=None):
+        """
+        :param zone: The zone to draw
+        :param ui_view: The UIView to draw it on
+        :param spriteSize: Width and height of a tile, in pixels
+        :param faction: Optional faction whose fog of war to draw. Tiles it
+                        hasn't seen are left blank, tiles it isn't looking
+                        at are dimmed, and mobs on them are hidden.
+        """
         self._zone = None
         self._ui_view = None
 
@@ -22,8 +30,16 @@ class ZoneView (object):
         self._tileClickHandlers = set()
 
         self.hover_tile = None
+
+        # Game time between the zone's last simulation step and now. Mobs are
+        # drawn where they will be this far into the next step.
+        self.interpolation_time = 0.0
         self.tile_hover_sprite = pygame.image.load('img/hilight.png')
 
+        self.faction = faction
+        self.fog_sprite = pygame.Surface(tuple(self.spriteSize))
+        self.fog_sprite.set_alpha(128)
+
     @property
     def zone(self):
         return self._zone
@@ -70,15 +86,50 @@ class ZoneView (object):
         else:
             return None
 
+    def is_on_screen(self, tile_coord):
+        """Whether any part of a tile is inside the window"""
+        top_left = numpy.array(tile_coord) * self.spriteSize - self.viewOffsetPx
+        return bool(numpy.all(top_left + self.spriteSize > 0)
+                    and numpy.all(top_left < self.ui_view.size))
+
+    @property
+    def visible_rect(self):
+        """(x, y, width, height) of the tiles which are at least partly inside the window"""
+        (x0, y0) = self.viewOffsetPx // self.spriteSize
+        (x1, y1) = -((-self.viewOffsetPx - self.ui_view.size) // self.spriteSize)
+        return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
     def screen_2_tile_coord(self, screenCoord):
         return (screenCoord - self.viewOffsetPx) / self.spriteSize
 
     def _on_render(self):
-        for tile in self.zone.tiles:
-            self.blit_world_sprite(tile.sprite, tile.coords)
+        (x, y, width, height) = self.visible_rect
+        # Have the tiles around the screen ready before scrolling gets there
+        self.zone.tile_storage.prefetch(x - width // 2, y - height // 2, width * 2, height * 2)
+        if self.faction is None:
+            for tile in self.zone.tiles.rect(x, y, width, height):
+                self.blit_world_sprite(tile.sprite, tile.coords)
+        else:
+            self._render_fogged_tiles(x, y, width, height)
 
-        for mob in self.zone.mobs:
-            self.blit_world_sprite(mob.sprite, mob.position)
+        # Mobs are indexed by the tile they occupy, but may be drawn up to a
+        # tile away from it while walking
+        render_time = self.zone.timed_event_dispatcher.now + self.interpolation_time
+        for mob in self.zone.mob_index.in_rect(x - 1, y - 1, width + 2, height + 2):
+            if self.faction is None or self.zone.fog_of_war.is_visible(self.faction, mob.tile.coords):
+                self.blit_world_sprite(mob.sprite, mob.position_at(render_time))
 
         if self.hover_tile is not None:
             self.blit_world_sprite(self.tile_hover_sprite, self.hover_tile.coords)
+
+    def _render_fogged_tiles(self, x, y, width, height):
+        """Draws the tiles in a rectangle which the faction has seen"""
+        (x, y, width, height) = self.zone.tiles.clip_rect(x, y, width, height)
+        fog_of_war = self.zone.fog_of_war
+        seen = fog_of_war.seen_mask(self.faction, x, y, width, height).ravel()
+        visible = fog_of_war.visible_mask(self.faction, x, y, width, height).ravel()
+        for (i, tile) in enumerate(self.zone.tiles.rect(x, y, width, height)):
+            if seen[i]:
+                self.blit_world_sprite(tile.sprite, tile.coords)
+                if not visible[i]:
+                    self.blit_world_sprite(self.fog_sprite, tile.coords)
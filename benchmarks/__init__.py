@@ -0,0 +1,22 @@
+"""
+Micro-benchmarks for the engine's hot paths.
+
+Run them from the repository root so the game modules are importable, e.g.::
+
+    python -m benchmarks.timed_events
+"""
+
+from __future__ import print_function
+
+import timeit
+
+def time_per_call(function, calls):
+    """Calls `function` `calls` times and returns the mean wall time per call, in seconds"""
+    start = timeit.default_timer()
+    for _ in xrange(calls):
+        function()
+    return (timeit.default_timer() - start) / calls
+
+def report(label, seconds, unit='tick'):
+    """Prints one line of benchmark results"""
+    print('{:<40} {:>12.3f} us/{}'.format(label, seconds * 1e6, unit))
@@ -0,0 +1,67 @@
+"""
+Cost of scrolling a camera across a zone much larger than memory with
+ChunkedTileStorage, and the memory it takes.
+"""
+
+from __future__ import print_function
+
+import argparse
+import functools
+import resource
+import shutil
+import tempfile
+import timeit
+
+from TileStorage import ChunkedTileStorage
+from Zone import Zone
+from benchmarks import report
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='100000x100000',
+                    help='Zone dimensions, e.g. 100000x100000')
+PARSER.add_argument('-v', '--view', type=resolution_pair, default='20x15',
+                    help='Tiles visible on screen')
+PARSER.add_argument('-f', '--frames', type=int, default=5000,
+                    help='Number of frames to scroll for, one tile per frame')
+PARSER.add_argument('-b', '--memory_budget', type=float, default=16,
+                    help='Memory budget for tile data, in MB')
+PARSER.add_argument('-c', '--chunk_size', type=int, default=ChunkedTileStorage.CHUNK_SIZE,
+                    help='Width and height of each chunk, in tiles')
+
+def main(args):
+    directory = tempfile.mkdtemp(prefix='chunk-benchmark-')
+    try:
+        zone = Zone(dimensions=args.size, tile_storage=functools.partial(
+            ChunkedTileStorage,
+            directory=directory,
+            chunk_size=args.chunk_size,
+            memory_budget=int(args.memory_budget * 2 ** 20),
+        ))
+        storage = zone.tile_storage
+        storage.fill('grass')
+        (width, height) = args.view
+
+        # Scroll diagonally, touching every visible tile like ZoneView does,
+        # and changing one so that evicted chunks have to be saved
+        frame_times = []
+        for frame in xrange(args.frames):
+            x, y = frame, frame // 2
+            start = timeit.default_timer()
+            storage.prefetch(x - width // 2, y - height // 2, width * 2, height * 2)
+            for tile in zone.tiles.rect(x, y, width, height):
+                tile.sprite
+            zone.tiles[(x, y)].sprite = 'footprint'
+            frame_times.append(timeit.default_timer() - start)
+
+        report('mean frame', sum(frame_times) / len(frame_times), 'frame')
+        report('slowest frame', max(frame_times), 'frame')
+        print('{} chunks loaded now, {} evicted, {} saved, {} read back'.format(
+            storage.loaded_chunks, storage.evictions, storage.saves, storage.loads))
+        # ru_maxrss is in kilobytes on Linux
+        print('Peak memory: {:.1f} MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+    finally:
+        shutil.rmtree(directory, True)
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,68 @@
+"""
+Cost of working out what observers scattered over a zone of rooms can see:
+every view from scratch, a tick where a tenth of them have moved, and a
+line of sight check from every observer to one target.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from TileStorage import ArrayTileStorage, DEFAULT_FLAGS, WALKABLE, TRANSPARENT
+from Zone import Zone
+from benchmarks import report
+from benchmarks.path_search import random_open_tile, rooms
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='200x200',
+                    help='Zone dimensions, e.g. 200x200')
+PARSER.add_argument('-r', '--radii', type=int, nargs='+', default=[8, 16, 32],
+                    help='Sight radii to compare')
+PARSER.add_argument('-o', '--observers', type=int, default=1000,
+                    help='Number of observers')
+PARSER.add_argument('-m', '--moving', type=float, default=0.1,
+                    help='Fraction of observers which move each tick')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the layout and observers')
+
+def main(args):
+    rng = random.Random(args.seed)
+    (width, height) = args.size
+    blocked = rooms(width, height, rng)
+    zone = Zone(dimensions=args.size, tile_storage=ArrayTileStorage)
+    zone.tile_storage.flags[blocked] = DEFAULT_FLAGS & ~(WALKABLE | TRANSPARENT)
+    fov = zone.field_of_view
+
+    observers = [random_open_tile(blocked, rng) for _ in range(args.observers)]
+    target = random_open_tile(blocked, rng)
+    for radius in args.radii:
+        fov.clear()
+        label = 'radius {}: '.format(radius)
+
+        start = timeit.default_timer()
+        views = fov.views(observers, radius)
+        report(label + 'every view', (timeit.default_timer() - start) / len(observers), 'observer')
+
+        # Some observers step to a neighbouring open tile
+        moved = list(observers)
+        for i in rng.sample(range(len(moved)), int(args.moving * len(moved))):
+            (x, y) = moved[i]
+            steps = [(x + dx, y + dy) for (dx, dy) in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                     if 0 <= x + dx < width and 0 <= y + dy < height and not blocked[y + dy, x + dx]]
+            if steps:
+                moved[i] = rng.choice(steps)
+        start = timeit.default_timer()
+        fov.views(moved, radius)
+        report(label + '{:.0%} moved'.format(args.moving), timeit.default_timer() - start, 'tick')
+
+        start = timeit.default_timer()
+        fov.lines_of_sight(observers, [target] * len(observers), radius)
+        report(label + 'line of sight to one target', timeit.default_timer() - start, 'tick')
+        print('{:<40} {:>12.1f} tiles visible per observer'.format(
+            '', sum(len(view) for view in views) / float(len(views))))
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
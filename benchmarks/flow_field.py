@@ -0,0 +1,80 @@
+"""
+Cost per mob of sending a crowd to one tile, with a shared flow field versus
+an A* search for each mob.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from Mob import Mob
+from TileStorage import ArrayTileStorage
+from Zone import Zone
+from benchmarks import report
+from benchmarks.path_search import LAYOUTS
+from pathfinding import find_path
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='200x200',
+                    help='Zone dimensions, e.g. 200x200')
+PARSER.add_argument('-l', '--layout', choices=[name for (name, _) in LAYOUTS], default='rooms',
+                    help='Wall layout')
+PARSER.add_argument('-m', '--followers', type=int, nargs='+', default=[1, 100, 10000],
+                    help='Numbers of mobs heading for the goal')
+PARSER.add_argument('-d', '--diagonal', action='store_true',
+                    help='Allow diagonal steps')
+PARSER.add_argument('--astar_sample', type=int, default=100,
+                    help='Most mobs to time A* searches for')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the layout and mob placement')
+
+def build_zone(args, rng):
+    (width, height) = args.size
+    blocked = dict(LAYOUTS)[args.layout](width, height, rng)
+    zone = Zone(dimensions=args.size, tile_storage=ArrayTileStorage)
+    for (y, x) in zip(*blocked.nonzero()):
+        zone.tiles[(x, y)].walkable = False
+    return zone, [(x, y) for (y, x) in zip(*(~blocked).nonzero())]
+
+def main(args):
+    rng = random.Random(args.seed)
+    for followers in args.followers:
+        (zone, open_tiles) = build_zone(args, rng)
+        coords = rng.sample(open_tiles, followers + 1)
+        goal = zone.tiles[coords.pop()]
+        mobs = [Mob(tile=zone.tiles[xy], sprite=None) for xy in coords]
+        label = '{} followers: '.format(followers)
+
+        # A* for each mob, timed on a sample
+        sample = mobs[:args.astar_sample]
+        start = timeit.default_timer()
+        for mob in sample:
+            find_path(mob.tile, goal, args.diagonal)
+        report(label + 'A* each', (timeit.default_timer() - start) / len(sample), 'mob')
+
+        # One flow field for everyone, including building it and taking
+        # each mob's first step
+        start = timeit.default_timer()
+        for mob in mobs:
+            mob.flow_to(goal, args.diagonal)
+        report(label + 'flow field', (timeit.default_timer() - start) / followers, 'mob')
+
+        # Looking up steps once the field is built
+        field = zone.flow_fields.field(goal, args.diagonal)
+        start = timeit.default_timer()
+        for mob in mobs:
+            field.next_step(mob.tile.coords)
+        report(label + 'next_step()', (timeit.default_timer() - start) / followers, 'mob')
+
+        # A second of walking, repairing the field as the crowd moves
+        builds = field.builds
+        start = timeit.default_timer()
+        zone.timed_event_dispatcher.advanceBy(1.0)
+        report(label + 'walk for 1 s', (timeit.default_timer() - start) / followers, 'mob')
+        print('{:<40} {:>12} rebuilds, {} repairs'.format('', field.builds - builds, field.repairs))
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,69 @@
+"""
+Cost of recording what observers have seen: merging their views into a
+packed FogOfWar layer versus setting the seen flag of each tile. Also how
+big the fog of war is pickled, checking that it comes back the same.
+"""
+
+from __future__ import print_function
+
+import argparse
+import pickle
+import random
+import timeit
+
+from TileStorage import ArrayTileStorage, DEFAULT_FLAGS, WALKABLE, TRANSPARENT
+from Zone import Zone
+from benchmarks import report
+from benchmarks.path_search import random_open_tile, rooms
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='1000x1000',
+                    help='Zone dimensions, e.g. 1000x1000')
+PARSER.add_argument('-r', '--radius', type=int, default=16,
+                    help='Sight radius')
+PARSER.add_argument('-o', '--observers', type=int, nargs='+', default=[1, 100, 1000],
+                    help='Numbers of observers to compare')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the layout and observers')
+
+def main(args):
+    rng = random.Random(args.seed)
+    (width, height) = args.size
+    blocked = rooms(width, height, rng)
+    zone = Zone(dimensions=args.size, tile_storage=ArrayTileStorage)
+    zone.tile_storage.flags[blocked] = DEFAULT_FLAGS & ~(WALKABLE | TRANSPARENT)
+    fog_of_war = zone.fog_of_war
+
+    for observers in args.observers:
+        views = zone.field_of_view.views([random_open_tile(blocked, rng) for _ in range(observers)], args.radius)
+        label = '{} observers: '.format(observers)
+
+        start = timeit.default_timer()
+        fog_of_war.update('player', views)
+        report(label + 'packed update', timeit.default_timer() - start, 'update')
+
+        start = timeit.default_timer()
+        for view in views:
+            for (x, y) in view.coords_array():
+                zone.tiles[(x, y)].seen = True
+        report(label + 'tile flags', timeit.default_timer() - start, 'update')
+
+    start = timeit.default_timer()
+    saved = pickle.dumps(fog_of_war, 2)
+    report('pickle', timeit.default_timer() - start, 'zone')
+    start = timeit.default_timer()
+    loaded = pickle.loads(saved)
+    report('unpickle', timeit.default_timer() - start, 'zone')
+    print('{:<40} {:>12} bytes pickled, for {} tiles'.format('', len(saved), width * height))
+
+    zone.fog_of_war = loaded
+    assert loaded.zone is zone
+    assert (loaded.seen_mask('player', 0, 0, width, height)
+            == fog_of_war.seen_mask('player', 0, 0, width, height)).all(), \
+        'Seen layer changed in pickling'
+    assert not loaded.visible_mask('player', 0, 0, width, height).any(), \
+        'Visible layer should be worked out again after loading'
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
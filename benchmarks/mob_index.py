@@ -0,0 +1,76 @@
+"""
+Cost of spatial queries on a crowded zone, using the zone's MobIndex versus
+scanning every mob.
+"""
+
+from __future__ import print_function
+
+import argparse
+import itertools
+import random
+
+from Mob import Mob
+from TileStorage import ArrayTileStorage
+from Zone import Zone
+from benchmarks import time_per_call, report
+from util import distance, resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='1000x1000',
+                    help='Zone dimensions, e.g. 1000x1000')
+PARSER.add_argument('-m', '--mobs', type=int, nargs='+', default=[10000, 50000],
+                    help='Numbers of mobs to benchmark')
+PARSER.add_argument('-c', '--calls', type=int, default=2000,
+                    help='Number of queries to time for each case')
+
+def main(args):
+    (width, height) = args.size
+    for mobs in args.mobs:
+        zone = Zone(dimensions=args.size, tile_storage=ArrayTileStorage)
+        for coords in random.sample(xrange(width * height), mobs):
+            Mob(tile=zone.tiles[(coords % width, coords // width)], sprite=None)
+
+        index = zone.mob_index
+        points = itertools.cycle([
+            (random.randrange(width), random.randrange(height))
+            for _ in range(1000)
+        ]).next
+        label = '{} mobs: '.format(mobs)
+
+        seconds = time_per_call(lambda: index.in_rect(*(points() + (20, 15))), args.calls)
+        report(label + 'in_rect() of one screen', seconds, 'query')
+
+        def scan_rect():
+            (x, y) = points()
+            return [
+                mob for mob in zone.mobs
+                for (mob_x, mob_y) in [mob.tile.coords]
+                if x <= mob_x < x + 20 and y <= mob_y < y + 15
+            ]
+        seconds = time_per_call(scan_rect, args.calls // 100)
+        report(label + 'scan for one screen', seconds, 'query')
+
+        seconds = time_per_call(lambda: index.within(points(), 10), args.calls)
+        report(label + 'within() 10 tiles', seconds, 'query')
+
+        def scan_within():
+            point = points()
+            return [mob for mob in zone.mobs if distance(point, mob.tile.coords) <= 10]
+        seconds = time_per_call(scan_within, args.calls // 100)
+        report(label + 'scan within 10 tiles', seconds, 'query')
+
+        seconds = time_per_call(lambda: index.nearest(points(), 5), args.calls)
+        report(label + 'nearest() 5', seconds, 'query')
+
+        # Moving a mob one tile, including the tile and index bookkeeping
+        walkers = itertools.cycle(random.sample(zone.mobs, 1000)).next
+        def step():
+            mob = walkers()
+            tile = mob.tile.get_relative_tile(random.choice([(0, 1), (0, -1), (1, 0), (-1, 0)]))
+            if tile is not None and tile.occupant is None:
+                mob.tile = tile
+        seconds = time_per_call(step, args.calls)
+        report(label + 'move one tile', seconds, 'move')
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,48 @@
+"""
+Cost of Observable.notify() with different numbers of observers.
+"""
+
+from __future__ import print_function
+
+import argparse
+
+from Observable import Observable, EventType
+from benchmarks import time_per_call, report
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-o', '--observers', type=int, nargs='+', default=[0, 1, 10, 100],
+                    help='Numbers of observers to benchmark')
+PARSER.add_argument('-c', '--calls', type=int, default=100000,
+                    help='Number of notify() calls to time for each case')
+
+class Subject (Observable):
+    @EventType
+    def CHANGE(subject, value):
+        """Something changed"""
+
+def callback(subject, value):
+    pass
+
+def main(args):
+    for observers in args.observers:
+        subject = Subject()
+        for _ in range(observers):
+            subject.observe(Subject.CHANGE, callback)
+        seconds = time_per_call(lambda: subject.notify(Subject.CHANGE, subject, 1), args.calls)
+        report('{} immortal observers'.format(observers), seconds, 'notify')
+
+    # One short-lived observer among many immortal ones, re-added as soon as
+    # it expires, like a WalkToAdjacentTileAction waiting on a tile
+    for observers in args.observers:
+        subject = Subject()
+        for _ in range(observers):
+            subject.observe(Subject.CHANGE, callback)
+
+        def notify_one_shot():
+            subject.observe(Subject.CHANGE, callback, limit=1)
+            subject.notify(Subject.CHANGE, subject, 1)
+        seconds = time_per_call(notify_one_shot, args.calls)
+        report('{} immortal + 1 one-shot observers'.format(observers), seconds, 'notify')
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,98 @@
+"""
+Latency of planning a path on a zone's PathHierarchy versus a flat A*
+search, and of keeping the hierarchy up to date as walls change. The
+hierarchy is built as the game does, in slices; the longest is how long
+building it holds up a frame.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from TileStorage import ArrayTileStorage, DEFAULT_FLAGS, WALKABLE
+from Zone import Zone
+from benchmarks import report
+from benchmarks.path_search import LAYOUTS, random_open_tile
+from pathfinding import astar
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--sizes', type=resolution_pair, nargs='+', default=[(200, 200), (1000, 1000)],
+                    help='Zone dimensions to benchmark, e.g. 1000x1000')
+PARSER.add_argument('-n', '--searches', type=int, default=10,
+                    help='Number of paths to time for each case')
+PARSER.add_argument('-d', '--diagonal', action='store_true',
+                    help='Allow diagonal steps')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the layouts and endpoints')
+
+def path_cost(start, path):
+    return sum(
+        1.5 if a[0] != b[0] and a[1] != b[1] else 1.0
+        for (a, b) in zip([start] + path, path)
+    )
+
+def main(args):
+    rng = random.Random(args.seed)
+    for (width, height) in args.sizes:
+        for (name, layout) in LAYOUTS:
+            blocked = layout(width, height, rng)
+            zone = Zone(dimensions=(width, height), tile_storage=ArrayTileStorage)
+            zone.tile_storage.flags[blocked] = DEFAULT_FLAGS & ~WALKABLE
+            label = '{}x{} {}: '.format(width, height, name)
+
+            start = timeit.default_timer()
+            hierarchy = zone.path_hierarchy(args.diagonal)
+            report(label + 'set up', timeit.default_timer() - start, 'zone')
+
+            ends = [timeit.default_timer()]
+            for _ in hierarchy.build():
+                ends.append(timeit.default_timer())
+            slices = [b - a for (a, b) in zip(ends, ends[1:])]
+            report(label + 'build ({} nodes)'.format(hierarchy.node_count), ends[-1] - ends[0], 'zone')
+            report(label + 'mean build slice', sum(slices) / len(slices), 'slice')
+            report(label + 'longest build slice', max(slices), 'slice')
+
+            endpoints = [
+                (random_open_tile(blocked, rng), random_open_tile(blocked, rng))
+                for _ in range(args.searches)
+            ]
+
+            # What a click costs: planning the route and the first leg
+            start = timeit.default_timer()
+            for (a, b) in endpoints:
+                waypoints = hierarchy.plan(a, b)
+                if waypoints:
+                    hierarchy.refine(a, waypoints[0])
+            report(label + 'plan + first leg', (timeit.default_timer() - start) / args.searches, 'path')
+
+            start = timeit.default_timer()
+            paths = [hierarchy.find_path(a, b) for (a, b) in endpoints]
+            report(label + 'plan + every leg', (timeit.default_timer() - start) / args.searches, 'path')
+
+            start = timeit.default_timer()
+            flat_paths = [astar(blocked, a, b, args.diagonal) for (a, b) in endpoints]
+            report(label + 'flat A*', (timeit.default_timer() - start) / args.searches, 'path')
+
+            ratios = [
+                path_cost(a, path) / path_cost(a, flat_path)
+                for ((a, _), path, flat_path) in zip(endpoints, paths, flat_paths)
+                if path and flat_path
+            ]
+            if ratios:
+                print('{:<40} {:>12.3f} x shortest (mean), {:.3f} (worst)'.format(
+                    '', sum(ratios) / len(ratios), max(ratios)))
+
+            # Knocking down or putting up a wall, then planning again
+            start = timeit.default_timer()
+            for (a, b) in endpoints:
+                tile = zone.tiles[random_open_tile(blocked, rng)]
+                for walkable in (False, True):
+                    tile.walkable = walkable
+                    hierarchy.plan(a, b)
+            report(label + 'wall change + plan', (timeit.default_timer() - start) / args.searches / 2, 'change')
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
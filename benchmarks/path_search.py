@@ -0,0 +1,96 @@
+"""
+Cost of A* searches across open fields, mazes and room layouts.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+import numpy
+
+from pathfinding import astar
+from benchmarks import report
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--sizes', type=resolution_pair, nargs='+', default=[(100, 100), (1000, 1000)],
+                    help='Grid dimensions to benchmark, e.g. 100x100')
+PARSER.add_argument('-n', '--searches', type=int, default=5,
+                    help='Number of searches to time for each case')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the layouts and endpoints')
+
+def open_field(width, height, rng):
+    """No walls at all"""
+    return numpy.zeros((height, width), dtype=bool)
+
+def maze(width, height, rng):
+    """A perfect maze (exactly one route between any two cells), carved by a
+    randomized depth-first search on every other tile"""
+    blocked = numpy.ones((height, width), dtype=bool)
+    cells_x, cells_y = (width - 1) // 2, (height - 1) // 2
+    start = (0, 0)
+    blocked[1, 1] = False
+    visited = {start}
+    stack = [start]
+    while stack:
+        (cx, cy) = stack[-1]
+        choices = [
+            (cx + dx, cy + dy)
+            for (dx, dy) in ((0, -1), (1, 0), (0, 1), (-1, 0))
+            if 0 <= cx + dx < cells_x and 0 <= cy + dy < cells_y and (cx + dx, cy + dy) not in visited
+        ]
+        if not choices:
+            stack.pop()
+            continue
+        (nx, ny) = choices[rng.randrange(len(choices))]
+        visited.add((nx, ny))
+        blocked[2 * ny + 1, 2 * nx + 1] = False
+        blocked[cy + ny + 1, cx + nx + 1] = False
+        stack.append((nx, ny))
+    return blocked
+
+def rooms(width, height, rng, room_size=10):
+    """A grid of rooms with one-tile walls, each wall with a door in a random spot"""
+    blocked = numpy.zeros((height, width), dtype=bool)
+    blocked[::room_size, :] = True
+    blocked[:, ::room_size] = True
+    for y in range(0, height, room_size):
+        for x in range(0, width, room_size):
+            # A door in the top and left walls of each room
+            if x + 1 < width:
+                blocked[y, min(x + 1 + rng.randrange(room_size - 1), width - 1)] = False
+            if y + 1 < height:
+                blocked[min(y + 1 + rng.randrange(room_size - 1), height - 1), x] = False
+    return blocked
+
+LAYOUTS = [('open', open_field), ('maze', maze), ('rooms', rooms)]
+
+def random_open_tile(blocked, rng):
+    (height, width) = blocked.shape
+    while True:
+        (x, y) = (rng.randrange(width), rng.randrange(height))
+        if not blocked[y, x]:
+            return x, y
+
+def main(args):
+    rng = random.Random(args.seed)
+    for (width, height) in args.sizes:
+        for (name, layout) in LAYOUTS:
+            blocked = layout(width, height, rng)
+            for diagonal in (False, True):
+                endpoints = [
+                    (random_open_tile(blocked, rng), random_open_tile(blocked, rng))
+                    for _ in range(args.searches)
+                ]
+                start = timeit.default_timer()
+                lengths = [len(astar(blocked, a, b, diagonal) or ()) for (a, b) in endpoints]
+                seconds = (timeit.default_timer() - start) / args.searches
+                report('{}x{} {} {}-way ({:.0f} steps)'.format(
+                    width, height, name, 8 if diagonal else 4, sum(lengths) / float(len(lengths))
+                ), seconds, 'path')
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,69 @@
+"""
+A burst of path requests answered inline, one A* search after another,
+versus handed to a PathService's worker processes: the total time to
+answer them all and the longest the main thread is held up in one tick.
+"""
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import random
+import timeit
+
+from TileStorage import ArrayTileStorage, DEFAULT_FLAGS, WALKABLE
+from Zone import Zone
+from benchmarks import report
+from benchmarks.path_search import random_open_tile, rooms
+from pathfinding import astar
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='200x200',
+                    help='Zone dimensions, e.g. 200x200')
+PARSER.add_argument('-n', '--requests', type=int, default=200,
+                    help='Paths requested in the burst')
+PARSER.add_argument('-w', '--workers', type=int, nargs='+',
+                    default=sorted({1, 4, multiprocessing.cpu_count()}),
+                    help='Numbers of worker processes to try')
+PARSER.add_argument('-d', '--diagonal', action='store_true',
+                    help='Allow diagonal steps')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the layout and requests')
+
+def main(args):
+    rng = random.Random(args.seed)
+    (width, height) = args.size
+    blocked = rooms(width, height, rng)
+    pairs = [(random_open_tile(blocked, rng), random_open_tile(blocked, rng)) for _ in range(args.requests)]
+
+    start = timeit.default_timer()
+    for (a, b) in pairs:
+        astar(blocked, a, b, args.diagonal)
+    inline = timeit.default_timer() - start
+    report('inline: total', inline, 'burst')
+    report('inline: longest tick', inline, 'tick')
+
+    for workers in args.workers:
+        zone = Zone(dimensions=args.size, tile_storage=ArrayTileStorage)
+        zone.tile_storage.flags[blocked] = DEFAULT_FLAGS & ~WALKABLE
+        service = zone.start_path_service(workers)
+        label = '{} workers: '.format(workers)
+
+        answered = []
+        start = timeit.default_timer()
+        for (a, b) in pairs:
+            service.request(a, b, args.diagonal, answered.append)
+        longest = timeit.default_timer() - start
+        while len(answered) < len(pairs):
+            tick = timeit.default_timer()
+            zone.timed_event_dispatcher.advanceBy(1 / 60.0)
+            longest = max(longest, timeit.default_timer() - tick)
+        total = timeit.default_timer() - start
+        zone.stop_path_service()
+
+        report(label + 'total', total, 'burst')
+        report(label + 'longest tick', longest, 'tick')
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
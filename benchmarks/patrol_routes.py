@@ -0,0 +1,81 @@
+"""
+Cost per step of guards patrolling one circuit along its compiled
+PatrolRoute, including the walk actions and events, versus the cost of an
+A* search per step.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from Mob import Mob
+from TileStorage import ArrayTileStorage, DEFAULT_FLAGS, WALKABLE
+from Zone import Zone
+from benchmarks import report
+from benchmarks.path_search import rooms
+from pathfinding import find_path
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='200x200',
+                    help='Zone dimensions, e.g. 200x200')
+PARSER.add_argument('-g', '--guards', type=int, nargs='+', default=[10, 100, 500],
+                    help='Numbers of guards on the circuit')
+PARSER.add_argument('-D', '--duration', type=float, default=10.0,
+                    help='Game seconds to patrol for')
+PARSER.add_argument('-d', '--diagonal', action='store_true',
+                    help='Allow diagonal steps')
+PARSER.add_argument('--astar_sample', type=int, default=50,
+                    help='Most guards to time A* searches for')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the layout and guard placement')
+
+def main(args):
+    rng = random.Random(args.seed)
+    (width, height) = args.size
+    blocked = rooms(width, height, rng)
+    # A waypoint in the middle of each corner room
+    waypoints = [(5, 5), (width - 5, 5), (width - 5, height - 5), (5, height - 5)]
+    for guards in args.guards:
+        zone = Zone(dimensions=args.size, tile_storage=ArrayTileStorage)
+        zone.tile_storage.flags[blocked] = DEFAULT_FLAGS & ~WALKABLE
+        label = '{} guards: '.format(guards)
+
+        start = timeit.default_timer()
+        route = zone.patrol_routes.route(waypoints, args.diagonal)
+        report(label + 'compile route', timeit.default_timer() - start, 'route')
+
+        # Guards spread out along the route, half of them going round the
+        # other way
+        tiles = sorted({coords for path in route.legs for coords in path})
+        mobs = []
+        for (i, coords) in enumerate(rng.sample(tiles, min(guards, len(tiles)))):
+            mob = Mob(tile=zone.tiles[coords], sprite=None)
+            mob.patrol([zone.tiles[waypoint] for waypoint in (waypoints if i % 2 else waypoints[::-1])],
+                       args.diagonal)
+            mobs.append(mob)
+
+        steps = 0
+        seconds = 0.0
+        last_tiles = [mob.tile for mob in mobs]
+        for _ in range(int(args.duration * 60)):
+            start = timeit.default_timer()
+            zone.timed_event_dispatcher.advanceBy(1 / 60.0)
+            seconds += timeit.default_timer() - start
+            tiles = [mob.tile for mob in mobs]
+            steps += sum(tile is not last for (tile, last) in zip(tiles, last_tiles))
+            last_tiles = tiles
+        report(label + 'patrol', seconds / max(steps, 1), 'step')
+
+        sample = mobs[:args.astar_sample]
+        start = timeit.default_timer()
+        for mob in sample:
+            find_path(mob.tile, mob.walk_directive.current_destination, args.diagonal)
+        report(label + 'A* step', (timeit.default_timer() - start) / len(sample), 'step')
+        print('{:<40} {:>12.1f} steps/s per guard, of {:.1f} at full speed'.format(
+            '', steps / args.duration / len(mobs), mobs[0].speed))
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
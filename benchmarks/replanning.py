@@ -0,0 +1,102 @@
+"""
+Cost of keeping a path up to date while a crowd moves through a corridor,
+with an incremental D* Lite planner per mob versus a from-scratch A* search
+every step.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from DStarLite import DStarLite
+from Mob import Mob
+from Zone import Zone
+from benchmarks import report
+from pathfinding import find_path
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='100x60',
+                    help='Zone dimensions, e.g. 100x60')
+PARSER.add_argument('-c', '--crowds', type=int, nargs='+', default=[0, 50, 200],
+                    help='Numbers of mobs milling back and forth through the corridor')
+PARSER.add_argument('-w', '--walkers', type=int, default=20,
+                    help='Number of mobs whose paths are timed')
+PARSER.add_argument('-t', '--steps', type=int, default=50,
+                    help='Steps each timed mob takes')
+PARSER.add_argument('-d', '--diagonal', action='store_true',
+                    help='Allow diagonal steps')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for mob placement')
+
+def build_zone(size):
+    """Two halls joined by a three tile wide corridor across the middle third"""
+    (width, height) = size
+    zone = Zone(dimensions=size)
+    door = height // 2
+    for x in range(width // 3, 2 * width // 3):
+        for y in range(height):
+            if not door - 1 <= y <= door + 1:
+                zone.tiles[(x, y)].walkable = False
+    (west, east) = ([], [])
+    for tile in zone.tiles:
+        if tile.walkable:
+            (west if tile.coords[0] < width // 3 else east if tile.coords[0] >= 2 * width // 3 else []).append(tile)
+    return zone, west, east
+
+def main(args):
+    rng = random.Random(args.seed)
+    for crowd in args.crowds:
+        (zone, west, east) = build_zone(args.size)
+        free_west = rng.sample(west, crowd + args.walkers)
+        free_east = rng.sample(east, crowd + args.walkers)
+        for i in range(crowd):
+            # Half the crowd starts on each side and paces to the other
+            (here, there) = (free_west, free_east) if i % 2 else (free_east, free_west)
+            mob = Mob(tile=here[i], sprite=None)
+            mob.patrol([there[i], here[i]], args.diagonal)
+        walkers = [
+            (Mob(tile=free_west[crowd + i], sprite=None), free_east[crowd + i])
+            for i in range(args.walkers)
+        ]
+        # Let the crowd fill the corridor
+        zone.timed_event_dispatcher.advanceBy(zone.dimensions[0] / 3 / 5.0)
+        label = '{} in the crowd: '.format(crowd)
+
+        start = timeit.default_timer()
+        planners = [DStarLite(mob, goal, args.diagonal) for (mob, goal) in walkers]
+        steps = [planner.next_step() for planner in planners]
+        report(label + 'D* Lite first plan', (timeit.default_timer() - start) / args.walkers, 'mob')
+        expansions = sum(planner.expansions for planner in planners)
+
+        (incremental, scratch) = (0.0, 0.0)
+        for _ in range(args.steps):
+            # Everyone who can takes the step they planned, then the crowd
+            # moves on a tick
+            for ((mob, _), step) in zip(walkers, steps):
+                if step is not None and zone.tiles[step].occupant is None:
+                    mob.tile = zone.tiles[step]
+            zone.timed_event_dispatcher.advanceBy(0.2)
+
+            start = timeit.default_timer()
+            steps = [planner.next_step() for planner in planners]
+            incremental += timeit.default_timer() - start
+
+            start = timeit.default_timer()
+            for (mob, goal) in walkers:
+                find_path(mob.tile, goal, args.diagonal)
+            scratch += timeit.default_timer() - start
+
+        samples = args.walkers * args.steps
+        report(label + 'D* Lite repair', incremental / samples, 'step')
+        report(label + 'A* from scratch', scratch / samples, 'step')
+        print('{:<40} {:>12.1f} nodes expanded/step, {:.0f} for the first plan'.format(
+            '', (sum(planner.expansions for planner in planners) - expansions) / float(samples),
+            expansions / float(args.walkers)))
+        for planner in planners:
+            planner.close()
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
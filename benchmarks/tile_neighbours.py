@@ -0,0 +1,58 @@
+"""
+Cost of looking up a tile's neighbours and checking tile membership on a
+large zone, with each tile storage layout.
+"""
+
+from __future__ import print_function
+
+import argparse
+import itertools
+import random
+
+from TileStorage import TILE_STORAGES
+from Zone import Zone
+from benchmarks import time_per_call, report
+from util import resolution_pair
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='1000x1000',
+                    help='Zone dimensions, e.g. 1000x1000')
+PARSER.add_argument('-l', '--tile_storage', choices=sorted(TILE_STORAGES), nargs='+',
+                    default=['array'],
+                    help='Tile storage layouts to compare. "object" takes a long time to build at 1000x1000.')
+PARSER.add_argument('-c', '--calls', type=int, default=100000,
+                    help='Number of lookups to time for each case')
+
+DIRECTIONS = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+
+def main(args):
+    (width, height) = args.size
+    for name in args.tile_storage:
+        zone = Zone(dimensions=args.size, tile_storage=TILE_STORAGES[name])
+
+        # Keep the sampled tiles alive, like the tiles mobs stand on
+        tiles = [
+            zone.tiles[(random.randrange(width), random.randrange(height))]
+            for _ in range(1000)
+        ]
+        samples = itertools.cycle(tiles).next
+
+        seconds = time_per_call(
+            lambda: [tile.get_relative_tile(direction) for tile in [samples()] for direction in DIRECTIONS],
+            args.calls)
+        report('{} get_relative_tile() x4'.format(name), seconds, 'tile')
+
+        seconds = time_per_call(lambda: samples().neighbours(), args.calls)
+        report('{} neighbours()'.format(name), seconds, 'tile')
+
+        seconds = time_per_call(lambda: samples().neighbours(diagonal=True), args.calls)
+        report('{} neighbours(diagonal=True)'.format(name), seconds, 'tile')
+
+        seconds = time_per_call(lambda: samples() in zone.tiles, args.calls)
+        report('{} tile in zone.tiles'.format(name), seconds, 'call')
+
+        seconds = time_per_call(lambda: zone.tiles.rect(500, 500, 20, 15), args.calls // 100)
+        report('{} rect() of one screen'.format(name), seconds, 'call')
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,89 @@
+"""
+Frame times while a JobScheduler catches dormant zones up in the background,
+a game second per slice, and an urgent path search comes in every frame,
+versus doing all the catching up in one go.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from JobScheduler import JobScheduler
+from benchmarks import report
+from benchmarks.path_search import random_open_tile, rooms
+from pathfinding import astar
+from util import resolution_pair
+from zones import ZONES
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-z', '--zone', choices=sorted(ZONES), default='demo',
+                    help='Zone to catch up')
+PARSER.add_argument('-n', '--zones', type=int, default=20,
+                    help='Number of dormant zones to catch up')
+PARSER.add_argument('-D', '--duration', type=float, default=30.0,
+                    help='Game seconds each zone spent dormant')
+PARSER.add_argument('-b', '--budgets', type=float, nargs='+', default=[2.0, 4.0, 8.0],
+                    help='Per-frame budgets to compare, in milliseconds')
+PARSER.add_argument('-s', '--size', type=resolution_pair, default='50x50',
+                    help='Dimensions of the map the urgent paths are searched on')
+PARSER.add_argument('--seed', type=int, default=0,
+                    help='Random seed for the path searches')
+
+def catch_up(zone, duration):
+    """Job advancing a zone's clock a game second at a time"""
+    dispatcher = zone.timed_event_dispatcher
+    target = dispatcher.now + duration
+    while dispatcher.now + 1.0 < target:
+        dispatcher.advanceBy(1.0)
+        yield
+    dispatcher.advanceTo(target)
+
+def search(blocked, start, goal, paths):
+    """Job finding one path"""
+    paths.append(astar(blocked, start, goal))
+    yield
+
+def build_zones(args):
+    return [ZONES[args.zone](load_sprite=lambda name: name)[0] for _ in range(args.zones)]
+
+def main(args):
+    rng = random.Random(args.seed)
+    (width, height) = args.size
+    blocked = rooms(width, height, rng)
+
+    zones = build_zones(args)
+    start = timeit.default_timer()
+    for zone in zones:
+        zone.timed_event_dispatcher.advanceBy(args.duration)
+    report('all at once', timeit.default_timer() - start, 'frame')
+
+    for budget in args.budgets:
+        zones = build_zones(args)
+        scheduler = JobScheduler(budget=budget)
+        background = [scheduler.add(catch_up(zone, args.duration), JobScheduler.BACKGROUND) for zone in zones]
+        label = '{} ms budget: '.format(budget)
+
+        frames = 0
+        late = 0
+        while not all(job.is_done for job in background):
+            paths = []
+            urgent = scheduler.add(
+                search(blocked, random_open_tile(blocked, rng), random_open_tile(blocked, rng), paths),
+                JobScheduler.URGENT)
+            scheduler.run_frame()
+            frames += 1
+            # Urgent searches should never be left for the next frame
+            if not paths:
+                late += 1
+            urgent.cancel()
+
+        report(label + 'mean frame', scheduler.busy_time / scheduler.frames, 'frame')
+        report(label + 'longest frame', scheduler.longest_frame, 'frame')
+        report(label + 'mean overrun', scheduler.overrun_time / max(scheduler.overruns, 1), 'overrun')
+        print('{:<40} {:>12} frames to catch up, {} over budget, {} urgent searches late'.format(
+            '', frames, scheduler.overruns, late))
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
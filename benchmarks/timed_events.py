@@ -0,0 +1,106 @@
+"""
+Per-tick cost of the timed event dispatchers with large numbers of pending events.
+
+Every event reschedules itself when it fires, like a walking mob does, so the
+queue stays the same size throughout the run.
+
+Before timing anything, each dispatcher is checked against
+TimedEventDispatcher on small random schedules: the same events must fire
+in the same order, and next_due_time must agree throughout.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+
+from TimedEventDispatcher import TimedEventDispatcher
+from TimingWheelEventDispatcher import TimingWheelEventDispatcher
+from benchmarks import time_per_call, report
+
+DISPATCHERS = {
+    'heap': TimedEventDispatcher,
+    'wheel': TimingWheelEventDispatcher,
+}
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-d', '--dispatchers', choices=sorted(DISPATCHERS), nargs='+', default=['heap', 'wheel'],
+                    help='Dispatcher implementations to compare')
+PARSER.add_argument('-n', '--pending', type=int, nargs='+', default=[10000, 100000, 1000000],
+                    help='Numbers of pending events to benchmark')
+PARSER.add_argument('-t', '--ticks', type=int, default=600,
+                    help='Number of ticks to time at each size')
+PARSER.add_argument('--tick_length', type=float, default=1 / 60.0,
+                    help='Game time per tick')
+PARSER.add_argument('--max_delay', type=float, default=10.0,
+                    help='Events are scheduled up to this far in the future')
+PARSER.add_argument('--cancel_ratio', type=float, default=0.1,
+                    help='Fraction of fired events which also cancel another event')
+
+def populate(dispatcher, pending, max_delay, cancel_ratio):
+    rng = random.Random(pending)
+    handles = []
+
+    def reschedule():
+        handles[rng.randrange(len(handles))] = \
+            dispatcher.add(rng.uniform(0.01, max_delay), reschedule)
+
+        # Interrupted walks cancel their timer and start a new one
+        if rng.random() < cancel_ratio:
+            index = rng.randrange(len(handles))
+            handles[index].cancel()
+            handles[index] = dispatcher.add(rng.uniform(0.01, max_delay), reschedule)
+
+    for _ in xrange(pending):
+        handles.append(dispatcher.add(rng.uniform(0.01, max_delay), reschedule))
+
+def check(make_dispatcher, rounds=200):
+    """Runs the same random adds, cancels and advances on a dispatcher and
+    on a TimedEventDispatcher, raising AssertionError if they disagree"""
+    def scripted(dispatcher, log):
+        # An event due sooner than one in a higher level of a timing wheel,
+        # added while the wheel sits on a slot boundary it hasn't cascaded
+        dispatcher.add(5.5, lambda: log.append('first'))
+        dispatcher.advanceTo(3.9)
+        dispatcher.add(3.0, lambda: log.append('second'))
+
+    scripts = [(scripted, None)] + [(None, seed) for seed in range(rounds)]
+    for (script, seed) in scripts:
+        runs = []
+        for dispatcher in (TimedEventDispatcher(), make_dispatcher()):
+            rng = random.Random(seed)
+            (log, due_times, handles) = ([], [], [])
+            if script is not None:
+                script(dispatcher, log)
+                due_times.append(dispatcher.next_due_time)
+            else:
+                for i in range(rng.randrange(1, 40)):
+                    operation = rng.random()
+                    if operation < 0.5:
+                        handles.append(dispatcher.add(rng.uniform(0.01, 20.0), lambda i=i: log.append(i)))
+                    elif operation < 0.6 and handles:
+                        handles[rng.randrange(len(handles))].cancel()
+                    else:
+                        dispatcher.advanceBy(rng.uniform(0.0, 5.0))
+                    due_times.append(dispatcher.next_due_time)
+            dispatcher.advanceBy(100.0)
+            runs.append((log, due_times))
+        assert runs[0] == runs[1], 'Dispatchers disagree on schedule {}: {} vs {}'.format(
+            'scripted' if script is not None else seed, runs[0], runs[1])
+
+def main(args):
+    for name in args.dispatchers:
+        check(DISPATCHERS[name])
+    # A small wheel too, so that schedules cross several levels and overflow
+    check(lambda: TimingWheelEventDispatcher(resolution=1.0, slots=4, levels=2))
+
+    for pending in args.pending:
+        for name in args.dispatchers:
+            dispatcher = DISPATCHERS[name]()
+            populate(dispatcher, pending, args.max_delay, args.cancel_ratio)
+
+            seconds = time_per_call(lambda: dispatcher.advanceBy(args.tick_length), args.ticks)
+            report('{}: {:,} pending events'.format(name, pending), seconds)
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
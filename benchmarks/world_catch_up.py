@@ -0,0 +1,59 @@
+"""
+Cost of keeping many zones up to date: simulating every zone at full rate
+versus leaving them dormant in a World and catching them up when entered.
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from World import World
+from benchmarks import report
+from zones import ZONES
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-z', '--zone', choices=sorted(ZONES), default='demo',
+                    help='Zone to fill the world with')
+PARSER.add_argument('-n', '--zones', type=int, default=50,
+                    help='Number of zones in the world')
+PARSER.add_argument('-D', '--duration', type=float, default=60.0,
+                    help='Game seconds the zones spend dormant')
+PARSER.add_argument('-r', '--step_rate', type=int, default=60,
+                    help='Steps per game second when simulating at full rate')
+PARSER.add_argument('--catch_up_steps', type=float, nargs='+', default=[0, 1.0],
+                    help='Catch-up step sizes to compare, in game seconds; 0 means one pass')
+
+def build_world(args, catch_up_step=None):
+    world = World(catch_up_step=catch_up_step)
+    for n in range(args.zones):
+        world.add_zone(n, ZONES[args.zone](load_sprite=lambda name: name)[0])
+    return world
+
+def main(args):
+    step = 1.0 / args.step_rate
+    steps = int(args.duration * args.step_rate)
+
+    # Everything active, advanced by the game clock every step
+    world = build_world(args)
+    for name in world.names:
+        world.activate(name)
+    start = timeit.default_timer()
+    for _ in xrange(steps):
+        world.advanceBy(step)
+    report('{} zones at full rate'.format(args.zones),
+           (timeit.default_timer() - start) / args.zones, 'zone')
+
+    # Everything dormant, caught up when entered
+    for catch_up_step in args.catch_up_steps:
+        world = build_world(args, catch_up_step or None)
+        world.advanceBy(args.duration)
+        catch_ups = [world.activate(name) for name in world.names]
+        report('catch up {} in {}'.format(
+                   args.duration, 'one pass' if not catch_up_step else '{} s steps'.format(catch_up_step)),
+               sum(catch_up.wall_time for catch_up in catch_ups) / args.zones, 'zone')
+        print('{:<40} {:>12.1f} events/zone'.format(
+            '', sum(catch_up.events for catch_up in catch_ups) / float(args.zones)))
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
@@ -0,0 +1,59 @@
+"""
+Time and memory needed to create empty zones of various sizes, with each
+tile storage layout.
+
+Each zone is built in a fresh child process so that its peak memory use can
+be measured on its own.
+"""
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import resource
+import timeit
+
+from TileStorage import TILE_STORAGES
+from util import resolution_pair
+from Zone import Zone
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-s', '--sizes', type=resolution_pair, nargs='+',
+                    default=[(20, 15), (100, 100), (300, 300), (1000, 1000)],
+                    help='Zone dimensions to benchmark, e.g. 100x100')
+PARSER.add_argument('-l', '--tile_storage', choices=sorted(TILE_STORAGES), nargs='+',
+                    default=sorted(TILE_STORAGES),
+                    help='Tile storage layouts to compare')
+
+def measure(dimensions, tile_storage):
+    """Builds a zone and returns (seconds, peak memory growth in bytes)"""
+    # ru_maxrss is in kilobytes on Linux
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = timeit.default_timer()
+
+    zone = Zone(dimensions=dimensions, tile_storage=TILE_STORAGES[tile_storage])
+    zone.tile_storage.fill('tile')
+
+    seconds = timeit.default_timer() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return seconds, (rss_after - rss_before) * 1024
+
+def main(args):
+    for dimensions in args.sizes:
+        for tile_storage in args.tile_storage:
+            pool = multiprocessing.Pool(processes=1)
+            try:
+                seconds, memory = pool.apply(measure, (dimensions, tile_storage))
+            finally:
+                pool.terminate()
+
+            print('{:>12} {:>8} {:>10,} tiles {:>10.3f} s {:>10.1f} MB'.format(
+                '{}x{}'.format(*dimensions),
+                tile_storage,
+                dimensions[0] * dimensions[1],
+                seconds,
+                memory / 1e6,
+            ))
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
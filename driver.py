@@ -11,74 +11,109 @@ Architecture paradigms:
 from __future__ import print_function
 
 import argparse
+import atexit
 import pygame
 
 import Observable
 
-from Mob import Mob
+from EventProfiler import EventProfiler
 from UIController import UIController
 from UIView import UIView
 from util import resolution_pair
-from Zone import Zone
+from World import World
 from ZoneController import ZoneController
 from ZoneView import ZoneView
+from zones import TILE_STORAGES, TIMED_EVENT_DISPATCHERS, ZONES
 
 PARSER = argparse.ArgumentParser()
 PARSER.add_argument('-s', '--screen_size', type=resolution_pair, default='640x480',
                     help='Window dimensions')
 PARSER.add_argument('-f', '--framerate', type=int, default=60,
                     help='Limit rendering passes per second')
-PARSER.add_argument('-d', '--debug', type=bool, default=False,
-                    help='Log message broadcasts for debugging')
+PARSER.add_argument('-r', '--step_rate', type=int, default=60,
+                    help='Fixed simulation steps per game second, or 0 to step once per frame')
+PARSER.add_argument('--max_steps', type=int, default=10,
+                    help='Most simulation steps to catch up on per frame')
+PARSER.add_argument('-j', '--job_budget', type=float, default=4.0,
+                    help='Milliseconds per frame to spend on long-running jobs')
+PARSER.add_argument('-F', '--fog_of_war', type=int, default=0,
+                    help='Hide what the PC hasn\'t seen, and can\'t see within this many tiles; 0 to show everything')
+PARSER.add_argument('-k', '--skip_idle_time', action='store_true',
+                    help='Fast-forward to the next event while the PC is idle and nothing moves on screen')
+PARSER.add_argument('-z', '--zone', choices=sorted(ZONES), default='demo',
+                    help='Zone to play in')
+PARSER.add_argument('-t', '--timed_events', choices=sorted(TIMED_EVENT_DISPATCHERS), default='heap',
+                    help='Scheduler for timed events. "wheel" scales better with many mobs')
+PARSER.add_argument('-l', '--tile_storage', choices=sorted(TILE_STORAGES), default='object',
+                    help='Storage layout for tiles. "array" is much smaller for large zones')
+PARSER.add_argument('-c', '--coalesce_events', action='store_true',
+                    help='Deliver hover and movement events once per frame, keeping only the latest')
+PARSER.add_argument('-p', '--profile_events', action='store_true',
+                    help='Profile event broadcasts. Press P to print the profile; it is also printed on exit.')
+PARSER.add_argument('-w', '--world_zones', type=int, default=1,
+                    help='Number of copies of the zone in the world. Press Tab to switch between them; '
+                         'the others stay dormant and catch up when entered.')
 ARGS = PARSER.parse_args()
 
 # Settings
 
 WINDOW_CAPTION = 'Game Title Here'
-Observable.debug_events = ARGS.debug
+if ARGS.profile_events:
+    Observable.set_event_profiler(EventProfiler())
+    atexit.register(Observable.get_event_profiler().dump)
+if ARGS.coalesce_events:
+    Observable.set_event_queue(Observable.EventQueue())
 
 # Model
-zone = Zone(dimensions=(20,15))
-
-grass_sprite = pygame.image.load('img/tile.png')
-for tile in zone.tiles:
-    tile.sprite = grass_sprite
-
-stick_fig_sprite = pygame.image.load('img/stickfig.png')
-pc = Mob(tile=zone.tiles[(4, 2)], sprite=stick_fig_sprite)
-
-guard = Mob(tile=zone.tiles[(5, 4)], sprite=stick_fig_sprite)
-guard.patrol([
-    zone.tiles[coord]
-    for coord in [(5,5), (15,5), (10,10), (5,10)]
-])
-
-def tiles_box(x_bounds, y_bounds):
-    return [
-        zone.tiles[(x, y)]
-        for x in ([x_bounds] if type(x_bounds) is int else range(x_bounds[0], x_bounds[1] + 1))
-        for y in ([y_bounds] if type(y_bounds) is int else range(y_bounds[0], y_bounds[1] + 1))
-    ]
-
-wall_sprite = pygame.image.load('img/wall.png')
-(wid, hgt) = zone.dimensions
-wall_tiles = tiles_box((0, wid-1), 0) + \
-             tiles_box((0, wid-1), hgt - 1) + \
-             tiles_box(0, (1, hgt - 2)) + \
-             tiles_box(wid - 1, (1, hgt - 2)) + \
-             tiles_box((6, 9), (6, 9)) + \
-             tiles_box(4, (6, 9)) + \
-             tiles_box((3, 5), 3)
-for tile in wall_tiles:
-    Mob(tile=tile, sprite=wall_sprite)
+sprites = {}
+def load_sprite(name):
+    if name not in sprites:
+        sprites[name] = pygame.image.load('img/{}.png'.format(name))
+    return sprites[name]
+
+# Zones are built when they're first entered. Each one has its own PC.
+pcs = {}
+def zone_builder(name):
+    def build():
+        zone, pcs[name] = ZONES[ARGS.zone](
+            load_sprite=load_sprite,
+            timed_event_dispatcher=TIMED_EVENT_DISPATCHERS[ARGS.timed_events](),
+            tile_storage=TILE_STORAGES[ARGS.tile_storage])
+        return zone
+    return build
+
+world = World()
+zone_names = ['{} {}'.format(ARGS.zone, n + 1) for n in range(ARGS.world_zones)]
+for zone_name in zone_names:
+    world.add_zone_builder(zone_name, zone_builder(zone_name))
+world.observe(World.CATCH_UP, lambda catch_up: print(
+    'Entered {}: caught up {:.1f} game s ({} events) in {:.1f} ms'.format(
+        catch_up.name, catch_up.game_time, catch_up.events, catch_up.wall_time * 1000)))
+
+world.activate(zone_names[0])
+zone, pc = world.zone(zone_names[0]), pcs[zone_names[0]]
 
 # View
 ui_view = UIView(size=ARGS.screen_size, caption=WINDOW_CAPTION)
-zone_view = ZoneView(zone=zone, ui_view=ui_view)
+faction = 'player' if ARGS.fog_of_war else None
+zone_view = ZoneView(zone=zone, ui_view=ui_view, faction=faction)
 
 # Controller
-ui_controller = UIController(view=ui_view, framerate=ARGS.framerate)
-zone_controller = ZoneController(zone=zone, view=zone_view, ui_controller=ui_controller, pc=pc)
+ui_controller = UIController(view=ui_view,
+                             framerate=ARGS.framerate,
+                             step=1.0 / ARGS.step_rate if ARGS.step_rate else None,
+                             max_steps=ARGS.max_steps,
+                             job_budget=ARGS.job_budget)
+zone_controller = ZoneController(zone=zone, view=zone_view, ui_controller=ui_controller, pc=pc,
+                                 skip_idle_time=ARGS.skip_idle_time, world=world,
+                                 faction=faction, sight_radius=ARGS.fog_of_war)
+
+def enter_next_zone():
+    index = zone_names.index(world.name_of(zone_controller.zone))
+    next_name = zone_names[(index + 1) % len(zone_names)]
+    world.zone(next_name)
+    zone_controller.enter_zone(next_name, pcs[next_name])
+ui_controller.observe(UIController.NEXT_ZONE, enter_next_zone)
 
 # Run
 ui_controller.run()
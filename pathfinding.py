@@ -0,0 +1,137 @@
+"""
+Grid pathfinding.
+
+Moves are to one of the 4 (or, optionally, 8) neighbouring tiles. Moving
+diagonally costs 1.5 and moving straight costs 1, the same as util.distance(),
+which is also the search heuristic.
+"""
+
+import heapq
+
+import numpy
+
+# Relative coordinates of a tile's neighbours, with the cost of moving there.
+# Diagonal moves come last so that, all else being equal, paths prefer
+# straight moves.
+ORTHOGONAL_MOVES = ((0, -1, 1.0), (1, 0, 1.0), (0, 1, 1.0), (-1, 0, 1.0))
+DIAGONAL_MOVES = ((1, -1, 1.5), (1, 1, 1.5), (-1, 1, 1.5), (-1, -1, 1.5))
+
+def astar(blocked, start, goal, diagonal=False):
+    """Finds a shortest path between two tiles with the A* algorithm
+    :param blocked: Boolean NumPy array, indexed [y, x], of impassable tiles.
+                    The start tile is never considered blocked.
+    :param start: x/y coordinates to search from
+    :param goal: x/y coordinates to search for
+    :param diagonal: Allow diagonal moves. Corners can't be cut, i.e. both
+                     tiles beside a diagonal move must be open.
+    :return: A list of the coordinates of each step after `start`, ending
+             with `goal`, or None if the goal can't be reached
+    """
+    (height, width) = blocked.shape
+    if start == goal:
+        return []
+    if not (0 <= goal[0] < width and 0 <= goal[1] < height) or blocked[goal[1], goal[0]]:
+        return None
+
+    # Work on a flat grid with a blocked border around it, so that
+    # neighbours never need bounds checks. Cell (x, y) is at (y + 1) * stride + x + 1.
+    stride = width + 2
+    padded = numpy.ones((height + 2, stride), dtype=numpy.uint8)
+    padded[1:-1, 1:-1] = blocked
+    grid = bytearray(padded.tobytes())
+
+    start_cell = (start[1] + 1) * stride + start[0] + 1
+    goal_cell = (goal[1] + 1) * stride + goal[0] + 1
+    grid[start_cell] = 0
+    (goal_x, goal_y) = goal
+
+    moves = [(dy * stride + dx, cost, None) for (dx, dy, cost) in ORTHOGONAL_MOVES]
+    if diagonal:
+        # Each diagonal move also needs the two straight moves beside it to be open
+        moves += [
+            (dy * stride + dx, cost, (dx, dy * stride))
+            for (dx, dy, cost) in DIAGONAL_MOVES
+        ]
+
+    # util.distance(), inlined because this is the inner loop. Without
+    # diagonal moves a diagonal costs two straight moves instead of 1.5, so
+    # it comes down to dx + dy.
+    diagonal_cost = 1.5 if diagonal else 2.0
+    def heuristic(cell):
+        dx = abs(cell % stride - 1 - goal_x)
+        dy = abs(cell // stride - 1 - goal_y)
+        return (dx if dx < dy else dy) * (diagonal_cost - 1.0) + (dx if dx > dy else dy)
+
+    # Open list entries are (estimated total cost, estimated remaining cost, cell).
+    # Breaking ties on the remaining cost favours cells closer to the goal,
+    # which keeps searches across open ground narrow.
+    start_h = heuristic(start_cell)
+    open_list = [(start_h, start_h, start_cell)]
+    costs = {start_cell: 0.0}
+    parents = {start_cell: None}
+    closed = set()
+
+    while open_list:
+        (_, _, cell) = heapq.heappop(open_list)
+        if cell == goal_cell:
+            break
+        if cell in closed:
+            continue
+        closed.add(cell)
+        cell_cost = costs[cell]
+
+        for (offset, move_cost, corners) in moves:
+            neighbour = cell + offset
+            if grid[neighbour] or neighbour in closed:
+                continue
+            if corners is not None and (grid[cell + corners[0]] or grid[cell + corners[1]]):
+                continue
+            cost = cell_cost + move_cost
+            if cost < costs.get(neighbour, float('inf')):
+                costs[neighbour] = cost
+                parents[neighbour] = cell
+                h = heuristic(neighbour)
+                heapq.heappush(open_list, (cost + h, h, neighbour))
+    else:
+        return None
+
+    path = []
+    cell = goal_cell
+    while cell != start_cell:
+        path.append((cell % stride - 1, cell // stride - 1))
+        cell = parents[cell]
+    path.reverse()
+    return path
+
+def blocked_grid(zone, ignore=()):
+    """Boolean NumPy array, indexed [y, x], of the tiles of a zone which can't
+    be walked through: unwalkable terrain and tiles with an occupant
+    :param zone: The zone
+    :param ignore: Mobs whose tiles shouldn't count as blocked
+    """
+    blocked = ~zone.tile_storage.walkable_mask()
+    for (mob, tiles) in zone.occupied_tiles():
+        if mob not in ignore:
+            for tile in tiles:
+                blocked[tile.coords[1], tile.coords[0]] = True
+    return blocked
+
+def find_path(from_tile, to_tile, diagonal=False):
+    """Finds a shortest path between two tiles of a zone, around walls and mobs
+
+    The destination may be occupied (the walker can wait for it to clear),
+    but it must be walkable.
+
+    :param from_tile: The starting tile
+    :param to_tile: The goal tile
+    :param diagonal: Allow diagonal moves
+    :return: A list of the tiles to step through after from_tile, ending with
+             to_tile, or None if there's no way there
+    """
+    assert from_tile.zone is to_tile.zone, \
+        'Tiles are in different zones'
+
+    zone = from_tile.zone
+    blocked = blocked_grid(zone, ignore=(from_tile.occupant, to_tile.occupant))
+    coords = astar(blocked, from_tile.coords, to_tile.coords, diagonal)
+    return None if coords is None else [zone.tiles[step] for step in coords]
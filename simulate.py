@@ -0,0 +1,113 @@
+"""
+Runs a zone without any window or rendering, as fast as possible or at a
+fixed multiple of real time. Useful for soak tests, AI tuning and running
+zones server-side.
+
+Zones come from the same definitions as the interactive driver, so anything
+observed here also happens in the game.
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+import timeit
+
+import Observable
+
+from EventProfiler import EventProfiler
+from zones import TILE_STORAGES, TIMED_EVENT_DISPATCHERS, ZONES
+
+PARSER = argparse.ArgumentParser()
+PARSER.add_argument('-z', '--zone', choices=sorted(ZONES), default='demo',
+                    help='Zone to simulate')
+PARSER.add_argument('-t', '--timed_events', choices=sorted(TIMED_EVENT_DISPATCHERS), default='heap',
+                    help='Scheduler for timed events')
+PARSER.add_argument('-l', '--tile_storage', choices=sorted(TILE_STORAGES), default='object',
+                    help='Storage layout for tiles. "array" is much smaller for large zones')
+PARSER.add_argument('-D', '--duration', type=float, default=600.0,
+                    help='Game seconds to simulate')
+PARSER.add_argument('-r', '--step_rate', type=int, default=60,
+                    help='Simulation steps per game second')
+PARSER.add_argument('-x', '--speed', type=float, default=0,
+                    help='Limit to this many game seconds per real second, or 0 to run flat out')
+PARSER.add_argument('-k', '--skip_events', action='store_true',
+                    help='Jump straight from one timed event to the next instead of taking fixed steps')
+PARSER.add_argument('-p', '--profile_events', action='store_true',
+                    help='Profile event broadcasts and print the profile at the end')
+PARSER.add_argument('--handles', action='store_true',
+                    help='Print live observer handle counts at the end, to spot listener leaks')
+PARSER.add_argument('-i', '--report_interval', type=float, default=0,
+                    help='Print progress every this many game seconds, or 0 to only print a summary')
+
+def simulate(dispatcher, duration, step, skip_events=False, speed=0, report_interval=0):
+    """Advances a timed event dispatcher by a fixed step until `duration` game seconds have passed
+    :param dispatcher: The zone's timed event dispatcher
+    :param duration: Game seconds to simulate
+    :param step: Game seconds per simulation step
+    :param skip_events: Advance straight to each event as it comes due
+                        instead of stepping. Nothing is drawn, so no
+                        intermediate states need to be visited.
+    :param speed: Optional limit on game seconds per real second
+    :param report_interval: Optional game seconds between progress reports
+    :return: Wall-clock seconds spent
+    """
+    start_time = dispatcher.now
+    end_time = start_time + duration
+    next_report = start_time + report_interval
+    wall_start = timeit.default_timer()
+
+    while dispatcher.now < end_time:
+        next_time = dispatcher.now + step
+        if skip_events:
+            next_due_time = dispatcher.next_due_time
+            next_time = end_time if next_due_time is None else max(next_due_time, dispatcher.now)
+        dispatcher.advanceTo(min(next_time, end_time))
+
+        if speed:
+            ahead = (dispatcher.now - start_time) / speed - (timeit.default_timer() - wall_start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+        if report_interval and dispatcher.now >= next_report:
+            report(dispatcher.now - start_time, timeit.default_timer() - wall_start, len(dispatcher))
+            next_report += report_interval
+
+    return timeit.default_timer() - wall_start
+
+def report(game_seconds, wall_seconds, pending_events):
+    print('{:10.1f} game s in {:8.3f} wall s ({:10.1f}x real time), {} events pending'.format(
+        game_seconds,
+        wall_seconds,
+        game_seconds / wall_seconds if wall_seconds else float('inf'),
+        pending_events,
+    ))
+
+def main(args):
+    if args.profile_events:
+        Observable.set_event_profiler(EventProfiler())
+
+    zone, pc = ZONES[args.zone](
+        load_sprite=lambda name: name,
+        timed_event_dispatcher=TIMED_EVENT_DISPATCHERS[args.timed_events](),
+        tile_storage=TILE_STORAGES[args.tile_storage])
+    dispatcher = zone.timed_event_dispatcher
+
+    wall_seconds = simulate(dispatcher,
+                            duration=args.duration,
+                            step=1.0 / args.step_rate,
+                            skip_events=args.skip_events,
+                            speed=args.speed,
+                            report_interval=args.report_interval)
+    report(args.duration, wall_seconds, len(dispatcher))
+
+    if args.profile_events:
+        print('')
+        Observable.get_event_profiler().dump()
+
+    if args.handles:
+        for clazz, count in sorted(Observable.live_handle_counts().items(), key=lambda item: -item[1]):
+            print('{:>8} {}'.format(count, clazz.__name__))
+
+if __name__ == '__main__':
+    main(PARSER.parse_args())
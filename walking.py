@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 
-import itertools
-
 from Observable import Observable, \
     EventType
+from DStarLite import DStarLite
+from PathHierarchy import PathHierarchy
 from Tile import Tile
 from util import *
 
@@ -21,7 +21,7 @@ ActionState.COMPLETE = ActionState('COMPLETE')
 ActionState.CANCEL = ActionState('CANCEL')
 ActionState.COOL_DOWN = ActionState('COOL_DOWN', { ActionState.COMPLETE })
 ActionState.WARM_UP = ActionState('WARM_UP', { ActionState.COOL_DOWN, ActionState.CANCEL })
-ActionState.WARM_UP = ActionState('PRECOND_WAIT', { ActionState.WARM_UP, ActionState.CANCEL })
+ActionState.PRECOND_WAIT = ActionState('PRECOND_WAIT', { ActionState.WARM_UP, ActionState.CANCEL })
 ActionState.NOT_STARTED = ActionState('NOT_STARTED', { ActionState.PRECOND_WAIT, ActionState.WARM_UP, ActionState.CANCEL })
 
 class Action (Observable):
@@ -37,14 +37,24 @@ class Action (Observable):
     ownership of the old tile and takes ownership of the new.
     """
 
+    @EventType
+    def DONE(success):
+        """The action has finished
+        :param success: True if the action completed, False if it was canceled
+        """
+
+    # Every action fires an event when it enters each state
+    STATES = frozenset({
+        ActionState.NOT_STARTED,
+        ActionState.PRECOND_WAIT,
+        ActionState.WARM_UP,
+        ActionState.COOL_DOWN,
+        ActionState.CANCEL,
+        ActionState.COMPLETE
+    })
+
     def __init__(self):
-        super(self, Action).__init__({
-            ActionState.NOT_STARTED,
-            ActionState.WARM_UP,
-            ActionState.COOL_DOWN,
-            ActionState.CANCEL,
-            ActionState.COMPLETE
-        })
+        super(Action, self).__init__(Action.STATES)
         self._state = ActionState.NOT_STARTED
 
     @property
@@ -59,7 +69,7 @@ class Action (Observable):
         else:
             raise TypeError('Cannot transition from state {!r} to state {!r}'.format(self.state, state))
 
-class WalkToAdjacentTileAction (Observable):
+class WalkToAdjacentTileAction (Action):
 
     def __init__(self,
                  mob,
@@ -89,12 +99,12 @@ class WalkToAdjacentTileAction (Observable):
         self.observe(ActionState.WARM_UP, self._on_warm_up)
         self.observe(ActionState.COOL_DOWN, self._on_cool_down)
         self.observe(ActionState.CANCEL, self._on_cancel)
-        self.observe(ActionState.COMPLETE, self._on_complet)
+        self.observe(ActionState.COMPLETE, self._on_complete)
 
         if self.dest_tile.occupant is None:
             self._on_tile_vacate()
         else:
-            self.tile_event = self.dest_tile.observe(Tile.VACATE, self._on_tile_vacate, limit=1)
+            self.tile_event = self.dest_tile.observe(Tile.VACATE, self._on_tile_vacate, limit=1, weak=True)
             self.state = ActionState.PRECOND_WAIT
 
     def cancel(self):
@@ -103,27 +113,36 @@ class WalkToAdjacentTileAction (Observable):
             # Cancellation is idempotent
             pass
         elif self.state.is_cancelable:
-            self._cancel()
+            self.state = ActionState.CANCEL
         else:
             raise RuntimeError('Too late to cancel the action')
 
     _progress_by_state = {
-        ActionState.NOT_STARTED: lambda self: 0.0,
-        ActionState.PRECOND_WAIT: lambda self: 0.0,
-        ActionState.CANCEL: lambda self: 0.0,
-        ActionState.WARM_UP: lambda self: self.timer_event.progress / 2.0,
-        ActionState.COOL_DOWN: lambda self: self.timer_event.progress / 2.0 + 0.5,
-        ActionState.COMPLETE: lambda self: 1.0,
+        ActionState.NOT_STARTED: lambda self, time: 0.0,
+        ActionState.PRECOND_WAIT: lambda self, time: 0.0,
+        ActionState.CANCEL: lambda self, time: 0.0,
+        ActionState.WARM_UP: lambda self, time: self.timer_event.progress_at(time) / 2.0,
+        ActionState.COOL_DOWN: lambda self, time: self.timer_event.progress_at(time) / 2.0 + 0.5,
+        ActionState.COMPLETE: lambda self, time: 1.0,
     }
 
     @property
     def progress(self):
         """How close the action is to completion as a number increasing from 0 to 1.0"""
-        return WalkToAdjacentTileAction._progress_by_state[self.state](self)
+        return self.progress_at(self.timed_event_dispatcher.now)
+
+    def progress_at(self, time):
+        """How close the action will be to completion at a given zone time,
+        assuming it stays in its current state
+        """
+        return WalkToAdjacentTileAction._progress_by_state[self.state](self, time)
 
     @property
     def current_position(self):
-        return vec_interpolate(self.source_tile.coords, self.dest_tile.coords, self.progress)
+        return self.position_at(self.timed_event_dispatcher.now)
+
+    def position_at(self, time):
+        return vec_interpolate(self.source_tile.coords, self.dest_tile.coords, self.progress_at(time))
 
     @property
     def timer_event(self):
@@ -155,7 +174,7 @@ class WalkToAdjacentTileAction (Observable):
         self.state = ActionState.WARM_UP
 
     def _on_warm_up(self, *args):
-        self.tile_event = self.dest_tile.observe(Tile.OCCUPY, self._on_tile_stolen, limit=1)
+        self.tile_event = self.dest_tile.observe(Tile.OCCUPY, self._on_tile_stolen, limit=1, weak=True)
         self.timer_event = self.timed_event_dispatcher.add(self.warmup_time, self._on_warmup_done)
         #self._mobSpeedEvent = self.mob.observe(Mob.SPEED_CHANGE, self._on_mob_speed_change)
 
@@ -163,11 +182,13 @@ class WalkToAdjacentTileAction (Observable):
         """Callback for the destination tile becoming occupied before the mob can reach it"""
         self.state = ActionState.CANCEL
 
-    def _on_cancel(self):
+    def _on_cancel(self, *args):
         self.timer_event = None
         self.tile_event = None
         #self.mobSpeedEvent = None
 
+        self.notify(Action.DONE, False)
+
     def _on_warmup_done(self):
         """Callback for the warmup event's completion"""
         assert self.dest_tile.occupant is None, \
@@ -187,41 +208,23 @@ class WalkToAdjacentTileAction (Observable):
     def _on_cooldown_done(self, *args):
         self.state = ActionState.COMPLETE
 
-    def _on_complete(self):
+    def _on_complete(self, *args):
         self.timer_event = None
         self.tile_event = None
         #self.mobSpeedEvent = None
 
-        self.state = ActionState.COMPLETE
-
-def find_path(from_tile, to_tile):
-    """Braindead pathfinder which picks the most direct route
-
-    :param from_tile: The starting tile
-    :param to_tile: The goal tile
-    :return: An adjacent or diagonal tile to navigate to first
-    """
-    assert from_tile.zone is to_tile.zone, \
-        'Tiles are in different zones'
-
-    from_coord = from_tile.coords
-    to_coord = to_tile.coords
-
-    #direction = sign(vec_subtract(to_coord, from_coord))
-    direction = (sign(to_coord[0] - from_coord[0]), 0) \
-                if to_coord[0] != from_coord[0] else \
-                (0, sign(to_coord[1] - from_coord[1]))
-
-    return from_tile.get_relative_tile(direction)
+        self.notify(Action.DONE, True)
 
 class WalkToAdjacentTileDirective(object):
     """Trivial iterator navigating a mob one tile in any direction"""
     def __init__(self, mob, direction):
         assert is_adjacent_vector(direction)
 
-        # May be None if @ edge of zone
+        # May be None if @ edge of zone or there's a wall in the way
         self.mob = mob
         self.destination = mob.tile.get_relative_tile(direction)
+        if self.destination is not None and not self.destination.walkable:
+            self.destination = None
     def __iter__(self):
         return self
     def next(self):
@@ -230,25 +233,188 @@ class WalkToAdjacentTileDirective(object):
         else:
             return self.destination
 
-class WalkToDestinationDirective(object):
+class PathDirective (object):
+    """
+    Base class for directives which walk a mob along a planned path.
+
+    On most zones each leg is planned with a DStarLite planner, which is
+    kept for as long as the mob heads for the same tile and repaired
+    whenever walls or mobs near the path move.
+
+    On big zones (see PathHierarchy.suits()) the route is planned on the
+    zone's PathHierarchy instead, as a list of waypoints, and only the leg
+    to the next waypoint is searched in detail at a time. That is planned
+    again if the mob strays from it or its next step is blocked.
+
+    A path found beforehand, e.g. by a PathService, may be given instead.
+    It's followed until it's blocked or the mob strays from it, and the
+    rest of the way is planned as above.
+    """
+
+    # How many steps along a given path to look for somewhere next to the
+    # mob to join it, if the mob has moved since the path was found
+    JOIN_DISTANCE = 8
+
+    def __init__(self, mob, diagonal=False, path=None):
+        """
+        :param mob: The mob to navigate
+        :param diagonal: Allow diagonal steps
+        :param path: Optional coordinates of the steps to the first goal,
+                     as from pathfinding.astar()
+        """
+        self.mob = mob
+        self.diagonal = diagonal
+        self._goal = None
+        # The given path, with the next step last
+        self._given_path = None if path is None else [tuple(step) for step in reversed(path)]
+        # Incremental planner toward the goal, on zones too small for a
+        # PathHierarchy
+        self._planner = None
+        # Upcoming steps, with the next one last
+        self._path = []
+        # Upcoming waypoints when planning hierarchically, with the next one
+        # last, or None if there's no plan
+        self._waypoints = None
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        """Stops watching the zone for changes to the path. Called by the
+        mob when the directive is replaced."""
+        if self._planner is not None:
+            self._planner.close()
+            self._planner = None
+
+    def _step_toward(self, goal):
+        """Picks the next tile on the way to a goal
+        :raises StopIteration: If the goal can't be reached
+        """
+        if goal is not self._goal:
+            if self._goal is not None:
+                self._given_path = None
+            self.close()
+            self._goal = goal
+            self._path = []
+            self._waypoints = None
+
+        if self._given_path:
+            step = self._follow_given_path()
+            if step is not None:
+                return step
+            self._given_path = None
+
+        if not PathHierarchy.suits(goal.zone):
+            if self._planner is None:
+                self._planner = DStarLite(self.mob, goal, self.diagonal)
+            step = self._planner.next_step()
+            if step is None:
+                self.close()
+                raise StopIteration()
+            return goal.zone.tiles[step]
+
+        # Forget the step just taken
+        if self._path and self._path[-1] is self.mob.tile:
+            self._path.pop()
+
+        if not self._path or not self._can_step_to(self._path[-1]):
+            path = self._find_path(goal)
+            if path is not None:
+                self._path = path[::-1]
+                if not self._path:
+                    # Already at the goal
+                    raise StopIteration()
+            elif self._path and self._is_next_to(self._path[-1]) and self._path[-1].walkable:
+                # Boxed in for now; wait for the planned step to clear
+                pass
+            else:
+                raise StopIteration()
+
+        return self._path[-1]
+
+    def _follow_given_path(self):
+        """Picks the next step along the given path, or None if the mob
+        can't take it"""
+        here = self.mob.tile.coords
+        path = self._given_path
+        # Catch up with the mob, which may have moved on since the path was
+        # found, at the furthest step along it can get to
+        for index in range(max(len(path) - PathDirective.JOIN_DISTANCE, 0), len(path)):
+            if path[index] == here:
+                del path[index:]
+                break
+            if self._is_next_to(self.mob.tile.zone.tiles[path[index]]):
+                del path[index + 1:]
+                break
+        else:
+            return None
+        if not path:
+            return None
+        tile = self.mob.tile.zone.tiles[path[-1]]
+        return tile if self._can_step_to(tile) else None
+
+    def _find_path(self, goal):
+        """Plans the route to the goal hierarchically, if there's no plan
+        yet, and finds the tiles to step through to the next waypoint"""
+        zone = goal.zone
+        hierarchy = zone.path_hierarchy(self.diagonal)
+        here = self.mob.tile.coords
+        for attempt in (0, 1):
+            if self._waypoints is None or attempt:
+                waypoints = hierarchy.plan(here, goal.coords)
+                self._waypoints = None if waypoints is None else waypoints[::-1]
+            if not self._waypoints:
+                return None
+
+            while self._waypoints and self._waypoints[-1] == here:
+                self._waypoints.pop()
+            if not self._waypoints:
+                return None
+            steps = hierarchy.refine(here, self._waypoints[-1], ignore=(self.mob,))
+            if steps is None:
+                # Mobs are in the way. Walk up to them and wait.
+                steps = hierarchy.refine(here, self._waypoints[-1], mobs=False)
+            if steps is not None:
+                return [zone.tiles[step] for step in steps]
+            # Walls are in the way; plan the rest of the way again
+        return None
+
+    def _is_next_to(self, tile):
+        (dx, dy) = vec_subtract(tile.coords, self.mob.tile.coords)
+        return is_adjacent_vector((dx, dy)) \
+            or (self.diagonal and abs(dx) == 1 and abs(dy) == 1)
+
+    def _can_step_to(self, tile):
+        return self._is_next_to(tile) \
+            and tile.walkable \
+            and (tile.occupant is None or tile.occupant is self.mob or tile is self._goal)
+
+class WalkToDestinationDirective (PathDirective):
     """Iterator which navigates a mob to a given point"""
-    def __init__(self, mob, tile):
+    def __init__(self, mob, tile, diagonal=False, path=None):
         assert mob.tile.zone is tile.zone, \
             'Can only walk between tiles on the same map'
 
-        self.mob = mob
+        super(WalkToDestinationDirective, self).__init__(mob, diagonal, path)
         self.tile = tile
-    def __iter__(self):
-        return self
     def next(self):
         if self.mob.tile is self.tile:
             raise StopIteration()
         else:
-            return find_path(self.mob.tile, self.tile)
+            return self._step_toward(self.tile)
 
-class PatrolDestinationsDirective(object):
-    """Iterator which navigates a mob between a cycle of points ad infinitum"""
-    def __init__(self, mob, tile_list):
+class PatrolDestinationsDirective (PathDirective):
+    """
+    Iterator which navigates a mob between a cycle of points ad infinitum.
+
+    The circuit is followed along the zone's shared PatrolRoute for it, so
+    guards walking the same waypoints share one set of paths and each step
+    is a lookup. A mob in the way is walked around with a short detour
+    which rejoins the route a few tiles further on; if there's none, the
+    guard waits. A guard which isn't on the route, e.g. when it starts
+    patrolling, walks to the next waypoint the usual way first.
+    """
+    def __init__(self, mob, tile_list, diagonal=False):
         assert all_true([
                 mob.tile.zone is tile.zone
                 for tile in tile_list
@@ -257,13 +423,156 @@ class PatrolDestinationsDirective(object):
         assert len(removeAdjacentDuplicates(tile_list)) > 0, \
             'More than one unique destination is required'
 
-        self.mob = mob
+        super(PatrolDestinationsDirective, self).__init__(mob, diagonal)
         self.tile_list = tile_list
-        self.destination_iter = itertools.cycle(self.tile_list)
-        self.current_destination = self.mob.tile
+        self.current_destination = self.tile_list[0]
+        self._waypoint_coords = [tile.coords for tile in tile_list]
+
+        # Where the mob is on the route: the route, which leg it's on (or
+        # None if it isn't on the route) and how far along the leg
+        self._route = None
+        self._leg = None
+        self._index = 0
+        # Upcoming steps of a detour around mobs, with the next one last,
+        # and where on the leg the detour comes out
+        self._detour = []
+        self._rejoin = None
+
+    def next(self):
+        here = self.mob.tile
+        zone = here.zone
+        route = zone.patrol_routes.route(self._waypoint_coords, self.diagonal)
+        if route is not self._route:
+            # New, or compiled again after the walls changed
+            self._route = route
+            self._leg = None
+        if self._leg is not None:
+            self._track(here.coords)
+        if self._leg is None:
+            self._join(route.locate(here.coords, self._approached_leg()))
+        if self._leg is None:
+            # Off the route; make for the next waypoint
+            return self._step_toward(self.current_destination)
+        self.close()
+
+        if self._detour:
+            tile = zone.tiles[self._detour[-1]]
+        else:
+            tile = zone.tiles[route.legs[self._leg][self._index + 1]]
+        occupant = tile.occupant
+        if occupant is None or occupant is self.mob:
+            return tile
+        if occupant.destination is not None and occupant.destination is not here:
+            # Walking on; follow it
+            return tile
+
+        detour = route.detour(self.mob, self._leg, self._index)
+        if detour is not None:
+            (steps, self._rejoin) = detour
+            self._detour = steps[::-1]
+            return zone.tiles[self._detour[-1]]
+        if occupant.destination is here:
+            # Head to head. Neither will ever get by unless one makes way.
+            aside = self._step_aside()
+            if aside is not None:
+                return aside
+        # No way around; wait for the tile to clear
+        return tile
+
+    def _step_aside(self):
+        """Picks a free tile next to the mob to get out of the way in,
+        preferably off the route"""
+        free = [
+            tile
+            for tile in self.mob.tile.zone.tiles.neighbours(self.mob.tile.coords)
+            if tile.walkable and tile.occupant is None
+        ]
+        free.sort(key=lambda tile: self._route.locate(tile.coords) is not None)
+        return free[0] if free else None
+
+    def _approached_leg(self):
+        """The leg ending at the waypoint being headed for"""
+        waypoints = self._route.waypoints
+        return (waypoints.index(self.current_destination.coords) - 1) % len(waypoints)
+
+    def _join(self, position):
+        """Puts the mob at a (leg, index) position on the route, or takes
+        it off the route if the position is None
+        :raises StopIteration: If the route can't be walked
+        """
+        self._detour = []
+        if position is None:
+            self._leg = None
+            return
+        (self._leg, self._index) = position
+
+        # Move on from the ends of legs
+        route = self._route
+        for _ in route.legs:
+            path = route.legs[self._leg]
+            if path is None:
+                raise StopIteration()
+            if self._index < len(path) - 1:
+                break
+            (self._leg, self._index) = ((self._leg + 1) % len(route.legs), 0)
+        else:
+            # Every leg is a single tile
+            raise StopIteration()
+        self.current_destination = self.mob.tile.zone.tiles[path[-1]]
+
+    def _track(self, coords):
+        """Follows the mob's progress along the route since the last step"""
+        path = self._route.legs[self._leg]
+        if self._detour:
+            if coords == self._detour[-1]:
+                self._detour.pop()
+                if not self._detour:
+                    self._join((self._leg, self._rejoin))
+        elif coords == path[self._index + 1]:
+            self._join((self._leg, self._index + 1))
+        elif coords != path[self._index]:
+            # Lost track, e.g. pushed off the route
+            self._join(self._route.locate(coords, self._leg))
+
+class FlowFieldDirective (object):
+    """
+    Iterator which navigates a mob to a given point along the zone's shared
+    flow field toward it (see FlowField), so mobs heading for the same tile
+    share one search between them. If the best step is taken by another
+    mob, the next best one which still gets closer is used instead.
+    """
+    def __init__(self, mob, tile, diagonal=False):
+        assert mob.tile.zone is tile.zone, \
+            'Can only walk between tiles on the same map'
+
+        self.mob = mob
+        self.tile = tile
+        self.diagonal = diagonal
+        self._field = None
+    @property
+    def flow_key(self):
+        """Key of the flow field being followed"""
+        return self.tile.coords, self.diagonal
     def __iter__(self):
         return self
     def next(self):
-        if self.mob.tile is self.current_destination:
-            self.current_destination = self.destination_iter.next()
-        return find_path(self.mob.tile, self.current_destination)
+        here = self.mob.tile
+        if here is self.tile:
+            raise StopIteration()
+
+        zone = here.zone
+        field = zone.flow_fields.field(self.tile, self.diagonal)
+        if field is not self._field:
+            field.follow(self.mob)
+            self._field = field
+        step = field.next_step(here.coords)
+        if step is None:
+            raise StopIteration()
+
+        tile = zone.tiles[step]
+        if tile.occupant is not None and tile is not self.tile:
+            for other_step in field.steps(here.coords):
+                other_tile = zone.tiles[other_step]
+                if other_tile.occupant is None:
+                    return other_tile
+        return tile
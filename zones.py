@@ -0,0 +1,67 @@
+"""
+Zone definitions shared by the interactive driver and the headless simulator,
+so that simulation results carry over between them.
+
+Zone builders take a `load_sprite` function which maps a sprite name (e.g.
+'wall') to whatever the caller wants to store on tiles and mobs. The driver
+loads images with pygame; the headless simulator just keeps the names.
+"""
+
+from Mob import Mob
+from TileStorage import ObjectTileStorage, TILE_STORAGES
+from TimedEventDispatcher import TimedEventDispatcher
+from TimingWheelEventDispatcher import TimingWheelEventDispatcher
+from Zone import Zone
+
+TIMED_EVENT_DISPATCHERS = {
+    'heap': TimedEventDispatcher,
+    'wheel': TimingWheelEventDispatcher,
+}
+
+def tiles_box(zone, x_bounds, y_bounds):
+    """Lists the tiles in a rectangle, given inclusive (min, max) bounds or a single row/column on each axis"""
+    return [
+        zone.tiles[(x, y)]
+        for x in ([x_bounds] if type(x_bounds) is int else range(x_bounds[0], x_bounds[1] + 1))
+        for y in ([y_bounds] if type(y_bounds) is int else range(y_bounds[0], y_bounds[1] + 1))
+    ]
+
+def build_demo_zone(load_sprite, timed_event_dispatcher=None, tile_storage=ObjectTileStorage):
+    """The walled test zone with a patrolling guard
+    :param load_sprite: Function mapping a sprite name to a sprite
+    :param timed_event_dispatcher: Optional scheduler for the zone (see Zone)
+    :param tile_storage: Optional storage engine for the zone's tiles (see Zone)
+    :return: A (zone, player character) tuple
+    """
+    zone = Zone(dimensions=(20,15), timed_event_dispatcher=timed_event_dispatcher, tile_storage=tile_storage)
+
+    zone.tile_storage.fill(load_sprite('tile'))
+
+    stick_fig_sprite = load_sprite('stickfig')
+    pc = Mob(tile=zone.tiles[(4, 2)], sprite=stick_fig_sprite)
+
+    guard = Mob(tile=zone.tiles[(5, 4)], sprite=stick_fig_sprite)
+    guard.patrol([
+        zone.tiles[coord]
+        for coord in [(5,5), (15,5), (10,10), (5,10)]
+    ])
+
+    wall_sprite = load_sprite('wall')
+    (wid, hgt) = zone.dimensions
+    wall_tiles = tiles_box(zone, (0, wid-1), 0) + \
+                 tiles_box(zone, (0, wid-1), hgt - 1) + \
+                 tiles_box(zone, 0, (1, hgt - 2)) + \
+                 tiles_box(zone, wid - 1, (1, hgt - 2)) + \
+                 tiles_box(zone, (6, 9), (6, 9)) + \
+                 tiles_box(zone, 4, (6, 9)) + \
+                 tiles_box(zone, (3, 5), 3)
+    for tile in wall_tiles:
+        tile.sprite = wall_sprite
+        tile.walkable = False
+        tile.transparent = False
+
+    return zone, pc
+
+ZONES = {
+    'demo': build_demo_zone,
+}